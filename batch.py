@@ -0,0 +1,190 @@
+"""Run a file of `inspect` and `query` commands against one loaded `NEODatabase`.
+
+Each non-blank line of a batch file is one command, exactly as it would be
+given to `main.py` after the data file options. Lines starting with `#` are
+comments:
+
+    # reports.txt
+    inspect --verbose --name Eros
+    query --start-date 2020-01-01 --hazardous --limit 0 --outfile hazardous.csv
+    query --start-date 2020-01-01 --max-distance 0.01 --limit 0 --outfile close.json.gz
+
+    $ python3 main.py batch reports.txt
+
+The data files are loaded once, and the commands are independent, so they run
+in parallel on a pool of threads. The exception is a set of commands that
+write the same output file: those run one after another, in the order of the
+file. What each command prints (such as results without an `--outfile`) is
+collected while it runs, and printed in the order of the file.
+
+At the end, a summary table of each command's latency and the number of rows
+it scanned and returned is printed to stderr.
+"""
+import collections
+import io
+import pathlib
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from daemon import ThreadLocalStream
+
+
+# The number of commands run at a time.
+WORKERS = 4
+# The subcommands that can be run in a batch.
+COMMANDS = ('inspect', 'query')
+# The width of the command column of the summary table.
+SUMMARY_COMMAND_WIDTH = 48
+
+# A command of a batch file: its line number, its text and its parsed arguments.
+Command = collections.namedtuple('Command', 'number line args')
+# The outcome of a command: what it printed, how long it took, how many rows
+# it scanned and returned, and any error that stopped it.
+Outcome = collections.namedtuple('Outcome', 'command stdout stderr seconds stats error')
+
+
+def read_commands(batch_file, parser):
+    """Parse the commands in a batch file.
+
+    Lines that aren't `inspect` or `query` commands, or that can't be parsed,
+    are reported and skipped; so are queries with `--batch`.
+
+    :param batch_file: A path to the batch file.
+    :param parser: The top-level parser of the script.
+    :return: A tuple of a list of `Command`s and the number of skipped lines.
+    """
+    commands = []
+    skipped = 0
+    with open(batch_file) as infile:
+        for number, line in enumerate(infile, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            args = _parse(line, parser)
+            if args is None or getattr(args, 'batch', None):
+                print(f"{batch_file}:{number}: skipping invalid command.", file=sys.stderr)
+                skipped += 1
+                continue
+            commands.append(Command(number, line, args))
+    return commands, skipped
+
+
+def _parse(line, parser):
+    """Parse one command, returning None if it's invalid."""
+    try:
+        argv = shlex.split(line)
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return None
+    if not argv or argv[0] not in COMMANDS:
+        return None
+    try:
+        return parser.parse_args(argv)
+    except SystemExit:
+        # `parse_args` has already printed the problem
+        return None
+
+
+def run_batch(database, commands, run, workers=WORKERS):
+    """Run commands in parallel, printing their output in order and then a summary.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param commands: A list of `Command`s.
+    :param run: A function to run a command, given the database, the parsed
+    arguments and a dictionary in which to count rows.
+    :param workers: The number of commands to run at a time.
+    :return: A list of the `Outcome`s of the commands, in order.
+    """
+    start = time.perf_counter()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = ThreadLocalStream(stdout), ThreadLocalStream(stderr)
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            # commands that write the same file run in order, as one task
+            futures = {}
+            for chain in _chains(commands):
+                future = executor.submit(_run_chain, run, database, chain)
+                for position, command in enumerate(chain):
+                    futures[command.number] = (future, position)
+            outcomes = []
+            for command in commands:
+                future, position = futures[command.number]
+                outcome = future.result()[position]
+                stdout.write(outcome.stdout)
+                stdout.flush()
+                stderr.write(outcome.stderr)
+                outcomes.append(outcome)
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    print(format_summary(outcomes, time.perf_counter() - start), file=sys.stderr)
+    return outcomes
+
+
+def _chains(commands):
+    """Group commands that write the same output file, keeping the order of the file.
+
+    :param commands: A list of `Command`s.
+    :return: A list of lists of `Command`s.
+    """
+    chains = collections.OrderedDict()
+    for command in commands:
+        outfile = getattr(command.args, 'outfile', None)
+        key = pathlib.Path(outfile).resolve() if outfile else command.number
+        chains.setdefault(key, []).append(command)
+    return list(chains.values())
+
+
+def _run_chain(run, database, chain):
+    """Run a list of commands one after another on the current thread.
+
+    :return: A list of their `Outcome`s.
+    """
+    return [_run_command(run, database, command) for command in chain]
+
+
+def _run_command(run, database, command):
+    """Run one command, collecting what it prints and counting the rows.
+
+    :return: The `Outcome` of the command.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    stats = collections.Counter()
+    error = None
+    sys.stdout.redirect(stdout)
+    sys.stderr.redirect(stderr)
+    start = time.perf_counter()
+    try:
+        run(database, command.args, stats)
+    except Exception as err:
+        error = err
+        print(f"Unable to run line {command.number}: {err}", file=sys.stderr)
+    finally:
+        seconds = time.perf_counter() - start
+        sys.stdout.redirect(None)
+        sys.stderr.redirect(None)
+    return Outcome(command, stdout.getvalue(), stderr.getvalue(), seconds, stats, error)
+
+
+def format_summary(outcomes, seconds):
+    """Format a table of the latency and row counts of each command.
+
+    :param outcomes: A list of `Outcome`s.
+    :param seconds: The wall time of the whole batch.
+    :return: The table, as a string.
+    """
+    width = SUMMARY_COMMAND_WIDTH
+    lines = [f"{'line':>5}  {'command':<{width}}  {'seconds':>8}  {'scanned':>10}  "
+             f"{'returned':>10}  status"]
+    for outcome in outcomes:
+        text = outcome.command.line
+        if len(text) > width:
+            text = text[:width - 3] + '...'
+        status = 'ok' if outcome.error is None else f"error: {outcome.error}"
+        lines.append(f"{outcome.command.number:>5}  {text:<{width}}  {outcome.seconds:>8.3f}  "
+                     f"{outcome.stats['scanned']:>10,}  {outcome.stats['returned']:>10,}  {status}")
+    failed = sum(outcome.error is not None for outcome in outcomes)
+    lines.append(f"Ran {len(outcomes)} commands in {seconds:.3f} s"
+                 + (f", {failed} failed." if failed else "."))
+    return '\n'.join(lines)
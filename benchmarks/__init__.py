@@ -0,0 +1,10 @@
+"""Microbenchmarks for the NEO database, its filters and its writers.
+
+Each module in this package is a script. To run one from the project root, run:
+
+    $ python3 -m benchmarks.bench_filters
+
+By default the benchmarks use the small test data set in `tests/`, repeated
+until it's about the size of the full data set; pass `--neofile` and
+`--cadfile` to use other data files.
+"""
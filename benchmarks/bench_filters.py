@@ -0,0 +1,67 @@
+"""Compare the per-filter query path with a `CompiledQuery` and, when NumPy is
+installed, with block-at-a-time vectorized evaluation.
+
+Every strategy scans the same index ranges - those planned for the query - so
+only the evaluation of the filters is compared, and the rates are reported per
+close approach scanned.
+
+    $ python3 -m benchmarks.bench_filters
+"""
+import datetime
+
+from benchmarks.common import make_parser, load_database, best_of, report
+from filters import create_filters
+
+
+# A few representative filter sets, from selective to permissive.
+CRITERIA = {
+    'date range + distance': dict(start_date=datetime.date(2020, 3, 1),
+                                  end_date=datetime.date(2020, 5, 31),
+                                  distance_max=0.2),
+    'all bounds + hazardous': dict(distance_min=0.05, distance_max=0.5,
+                                   velocity_min=5, velocity_max=25,
+                                   diameter_min=0.1, diameter_max=1.5,
+                                   hazardous=False),
+    'velocity only': dict(velocity_min=10),
+}
+
+
+def consume(database, plan):
+    """Execute a planned query to completion and return the number of matches."""
+    return sum(1 for _ in database.execute(plan))
+
+
+def consume_per_filter(plan, filters):
+    """Scan the ranges of a plan with one call per filter per approach, and count the matches."""
+    approaches = plan.snapshot.approaches
+    return sum(1 for start, stop in plan.ranges for approach in approaches[start:stop]
+               if all(filter(approach) for filter in filters))
+
+
+def main():
+    """Run the benchmark."""
+    args = make_parser("Benchmark compiled and vectorized filters against "
+                       "per-filter evaluation.").parse_args()
+    database = load_database(args)
+    print(f"{len(database.plan().snapshot.approaches):,} close approaches")
+
+    for name, criteria in CRITERIA.items():
+        filters = create_filters(**criteria)
+        plan = database.plan(filters)
+        compiled_plan = database.plan(create_filters(compiled=True, **criteria))
+        assert compiled_plan.ranges == plan.ranges, "compiled and per-filter ranges differ"
+        rows = sum(stop - start for start, stop in plan.ranges)
+        print(f"\n{name} ({plan.access_path}, {rows:,} scanned)")
+        plain, expected = best_of(args.repeat, consume_per_filter, plan, filters)
+        compiled, received = best_of(args.repeat, consume, database, compiled_plan)
+        assert expected == received, "compiled and per-filter results differ"
+        report('per-filter', plain, rows)
+        report('compiled', compiled, rows, baseline=plain)
+        if plan.vectorized:
+            vectorized, received = best_of(args.repeat, consume, database, plan)
+            assert expected == received, "vectorized and per-filter results differ"
+            report('vectorized', vectorized, rows, baseline=plain)
+
+
+if __name__ == '__main__':
+    main()
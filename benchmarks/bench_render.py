@@ -0,0 +1,41 @@
+"""Compare printing close approaches one `print` at a time with `write.render`.
+
+    $ python3 -m benchmarks.bench_render --rows 1000000
+
+The output goes to `os.devnull`, so that only formatting and writing is
+measured, as when piping an unlimited query to another tool.
+"""
+import contextlib
+import os
+
+from benchmarks.common import make_parser, load_database, best_of, report
+from write import render
+
+
+def print_each(approaches, stream):
+    """Print each close approach with its own call to `print`, like `main.query` used to."""
+    with contextlib.redirect_stdout(stream):
+        for approach in approaches:
+            print(approach)
+
+
+def main():
+    """Run the benchmark."""
+    args = make_parser("Benchmark printing close approaches one at a time "
+                       "against rendering them in chunks.").parse_args()
+    database = load_database(args)
+    approaches = list(database.query())
+    rows = len(approaches)
+    print(f"Rendering {rows:,} close approaches, best of {args.repeat}:")
+
+    with open(os.devnull, 'w') as devnull:
+        baseline, _ = best_of(args.repeat, print_each, approaches, devnull)
+        report('print per row', baseline, rows)
+        seconds, _ = best_of(args.repeat, render, approaches, devnull)
+        report('render, sentences', seconds, rows, baseline)
+        seconds, _ = best_of(args.repeat, render, approaches, devnull, True)
+        report('render, tsv', seconds, rows, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compare the writers with straightforward implementations: the streaming
+JSON writer with one that builds the whole output first, and the CSV writer
+with one that writes a `serialize()` dictionary per row.
+
+    $ python3 -m benchmarks.bench_write --rows 3000000
+
+Besides wall time, the peak memory allocated while writing JSON is measured
+(with `tracemalloc`, in a separate run since tracing slows everything down).
+"""
+import csv
+import json
+import math
+import pathlib
+import tempfile
+import tracemalloc
+
+from benchmarks.common import make_parser, load_database, best_of, report
+from write import write_to_csv, write_to_json
+
+
+def write_to_csv_with_dicts(results, filename):
+    """Write results to CSV by flattening the serialized dictionaries of each row."""
+    fieldnames = ('datetime_utc', 'distance_au', 'velocity_km_s', 'designation', 'name',
+                  'diameter_km', 'potentially_hazardous')
+    with open(filename, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for result in results:
+            data = result.serialize()
+            neo = data.pop('neo')
+            data.update(neo)
+            writer.writerow(data)
+
+
+def write_to_json_eagerly(results, filename):
+    """Write results to JSON by serializing all of them before writing a byte."""
+    data = [result.serialize() for result in results]
+    for row in data:
+        try:
+            diameter = float(row['neo']['diameter_km'])
+            row['neo']['diameter_km'] = diameter if not math.isnan(diameter) else float('nan')
+        except ValueError:
+            row['neo']['diameter_km'] = float('nan')
+        row['neo']['potentially_hazardous'] = (
+                row['neo']['potentially_hazardous'].strip().lower() == 'true'
+        )
+    with open(filename, 'w') as file:
+        json.dump(data, file)
+
+
+def export(database, writer, path):
+    """Write every close approach in a database to a file with a writer."""
+    writer(database.query(), path)
+
+
+def peak_memory(function, *args):
+    """Return the peak memory in bytes allocated by a call to a function."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    """Run the benchmark."""
+    args = make_parser("Benchmark the CSV and JSON writers against straightforward "
+                       "implementations.", rows=2000000).parse_args()
+    database = load_database(args)
+    rows = len(database._snapshot.approaches)
+    print(f"Writing {rows:,} close approaches, best of {args.repeat}:")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dicts_path = pathlib.Path(tmpdir) / 'dicts.csv'
+        rows_path = pathlib.Path(tmpdir) / 'rows.csv'
+        baseline, _ = best_of(args.repeat, export, database, write_to_csv_with_dicts, dicts_path)
+        report('csv, dict per row', baseline, rows)
+        seconds, _ = best_of(args.repeat, export, database, write_to_csv, rows_path)
+        report('csv, row tuples', seconds, rows, baseline)
+        if dicts_path.read_bytes() != rows_path.read_bytes():
+            raise SystemExit("The CSV output differs from the output with dictionaries.")
+
+        eager_path = pathlib.Path(tmpdir) / 'eager.json'
+        streaming_path = pathlib.Path(tmpdir) / 'streaming.json'
+        baseline, _ = best_of(args.repeat, export, database, write_to_json_eagerly, eager_path)
+        report('json, eager', baseline, rows)
+        seconds, _ = best_of(args.repeat, export, database, write_to_json, streaming_path)
+        report('json, streaming', seconds, rows, baseline)
+        if eager_path.read_bytes() != streaming_path.read_bytes():
+            raise SystemExit("The streaming JSON output differs from the eager output.")
+
+        for label, function, path in (('json, eager', write_to_json_eagerly, eager_path),
+                                      ('json, streaming', write_to_json, streaming_path)):
+            peak = peak_memory(export, database, function, path)
+            print(f"{label:<32} peak memory {peak / 2 ** 20:10.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
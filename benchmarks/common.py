@@ -0,0 +1,79 @@
+"""Shared helpers for the benchmark scripts."""
+import argparse
+import copy
+import pathlib
+import time
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+
+
+TESTS_ROOT = pathlib.Path(__file__).parent.parent.resolve() / 'tests'
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def make_parser(description, rows=400000):
+    """Create an ArgumentParser with the options shared by every benchmark.
+
+    :param description: A description of the benchmark.
+    :param rows: The default number of close approaches to benchmark with.
+    :return: An `argparse.ArgumentParser`.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--neofile', default=TEST_NEO_FILE, type=pathlib.Path,
+                        help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', default=TEST_CAD_FILE, type=pathlib.Path,
+                        help="Path to JSON file of close approach data.")
+    parser.add_argument('--rows', default=rows, type=int,
+                        help="Repeat the close approaches until there are this many.")
+    parser.add_argument('--repeat', default=3, type=int,
+                        help="Report the best of this many runs.")
+    return parser
+
+
+def load_database(args):
+    """Load an `NEODatabase` with (at least) `args.rows` close approaches.
+
+    :param args: The parsed arguments of a benchmark.
+    :return: An `NEODatabase`.
+    """
+    approaches = load_approaches(args.cadfile)
+    copies = [approaches]
+    total = len(approaches)
+    while total < args.rows:
+        copies.append([copy.copy(approach) for approach in approaches])
+        total += len(approaches)
+    return NEODatabase(load_neos(args.neofile), [a for chunk in copies for a in chunk][:max(args.rows, 1)])
+
+
+def best_of(repeat, function, *args):
+    """Run a function a few times and return the fastest wall time.
+
+    The function is run once more before the timed runs, so that one-off work,
+    such as building caches, isn't timed.
+
+    :param repeat: The number of timed runs.
+    :param function: The function to call.
+    :param args: The arguments to call the function with.
+    :return: A tuple of the fastest time in seconds and the last return value.
+    """
+    function(*args)
+    best, value = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def report(label, seconds, rows, baseline=None):
+    """Print one line of benchmark results.
+
+    :param label: What was measured.
+    :param seconds: The wall time in seconds.
+    :param rows: The number of rows processed.
+    :param baseline: The wall time of the baseline, to report a speedup.
+    """
+    speedup = f"  ({baseline / seconds:.2f}x)" if baseline else ''
+    print(f"{label:<32} {seconds * 1000:10.1f} ms  {rows / seconds:14,.0f} rows/s{speedup}")
@@ -0,0 +1,362 @@
+"""Run `inspect` and `query` commands on a warm `NEODatabase` in a background daemon.
+
+Loading the data files takes seconds, which every invocation of `main.py` pays
+again. The `daemon` subcommand loads them once and then waits for commands on
+a Unix socket:
+
+    $ python3 main.py daemon &
+    $ python3 main.py query --date 2020-01-01   # answered by the daemon
+
+Whenever a daemon is listening, `main.py inspect` and `main.py query` forward
+their command line to it with `forward`, and relay what it prints, so the
+output is unchanged. If no daemon is running - or it was started with other
+data files, or they changed since - the command runs locally as usual.
+
+Requests and responses are exchanged over the socket as follows. The client
+sends one JSON line with the command-line arguments, its working directory and
+the encoding of its stdout. The daemon answers with a sequence of frames, each
+a channel byte and a 4-byte length followed by that many bytes: first ACCEPT
+(or REFUSE, with a reason), then any number of STDOUT and STDERR frames, and
+finally EXIT, with the exit status.
+
+The socket is only accessible to the user who started the daemon: it's
+created in the user's runtime directory (`$XDG_RUNTIME_DIR`) or in a private
+directory of the temporary directory, and clients only connect to a socket
+they own that no one else can access.
+
+Each connection is served on its own thread, against a consistent snapshot of
+the database. While the daemon runs, `sys.stdout` and `sys.stderr` are
+replaced by proxies that write to the connection of the current thread, so
+the commands print exactly as they would locally.
+"""
+import io
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+
+from extract import file_signature
+
+
+# A directory that only the current user can access, and the socket in it on
+# which the daemon listens, unless another one is given.
+_PRIVATE_DIR = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(
+    tempfile.gettempdir(), f"neo-daemon-{getattr(os, 'getuid', lambda: 0)()}")
+SOCKET_PATH = pathlib.Path(os.environ.get('NEO_DAEMON_SOCKET')
+                           or os.path.join(_PRIVATE_DIR, 'neo-daemon.sock'))
+# The number of seconds to wait for a daemon to accept a command, before
+# running it locally instead.
+HANDSHAKE_TIMEOUT = 5
+# The number of bytes of output buffered by the daemon before sending a frame.
+OUTPUT_BUFFER_SIZE = 2 ** 16
+
+# The header of each frame (channel, length) and the channels.
+FRAME = struct.Struct('>BI')
+EXIT, STDOUT, STDERR, ACCEPT, REFUSE = range(5)
+
+
+class NEODaemon:
+    """Run `inspect` and `query` commands sent over a Unix socket.
+
+    Like the `NEOShell`, this parses each command with the same parser as the
+    command line, and runs it against a database that's already loaded.
+    """
+
+    def __init__(self, database, parser, run, data_files):
+        """Create a new `NEODaemon`.
+
+        Creating this object doesn't start the daemon - for that, use `.serve()`.
+
+        :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+        :param parser: The top-level parser of the script.
+        :param run: A function to run a command, given the database and the parsed arguments.
+        :param data_files: The paths of the NEO and close approach files the database was loaded from.
+        """
+        self.db = database
+        self.parser = parser
+        self.run = run
+        self.data_files = {file_signature(path) for path in data_files}
+        self.server = None
+
+    def serve(self, path=SOCKET_PATH):
+        """Run commands sent to a Unix socket until interrupted or terminated.
+
+        :param path: The path of the Unix socket on which to listen.
+        :return: Whether the daemon started - it doesn't if another one is
+        already listening on the same socket.
+        """
+        path = str(path)
+        os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            if not _is_private(path):
+                print(f"{path} belongs to another user, or others can access it.", file=sys.stderr)
+                return False
+            connection = _connect(path)
+            if connection is not None:
+                connection.close()
+                print(f"An NEO daemon is already listening on {path}.", file=sys.stderr)
+                return False
+            os.remove(path)  # left behind by a daemon that didn't exit cleanly
+
+        # Create the socket without access for anyone else, so that no one can
+        # connect to it before it's restricted.
+        umask = os.umask(0o077)
+        try:
+            self.server = server = socketserver.ThreadingUnixStreamServer(path, _CommandHandler)
+        finally:
+            os.umask(umask)
+        server.daemon_threads = True
+        server.neo_daemon = self
+        os.chmod(path, 0o600)
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = ThreadLocalStream(stdout), ThreadLocalStream(stderr)
+        print(f"NEO daemon listening on {path} - press Ctrl-C to stop.", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            server.server_close()
+            os.remove(path)
+        return True
+
+    def stop(self):
+        """Stop serving, from another thread."""
+        self.server.shutdown()
+
+    def handle(self, connection, request):
+        """Run one command, sending its output and exit status over a connection.
+
+        :param connection: The connected `socket.socket`.
+        :param request: The decoded request from the client.
+        """
+        try:
+            args = self.parser.parse_args(request['argv'])
+        except SystemExit:
+            # the client already parsed these, so this daemon must be out of date
+            _send(connection, REFUSE, b"Unable to parse the command.")
+            return
+        cwd = pathlib.Path(request['cwd'])
+        data_files = {file_signature(cwd / args.neofile), file_signature(cwd / args.cadfile)}
+        if data_files != self.data_files:
+            _send(connection, REFUSE, b"The data files differ from those loaded.")
+            return
+        if getattr(args, 'outfile', None):
+            args.outfile = cwd / args.outfile
+        _send(connection, ACCEPT)
+
+        stdout = io.TextIOWrapper(
+            io.BufferedWriter(_FrameWriter(connection, STDOUT), OUTPUT_BUFFER_SIZE),
+            encoding=request['encoding'])
+        # Keep stdout and stderr in order, as a terminal would show them.
+        stderr = io.TextIOWrapper(_FrameWriter(connection, STDERR, before=stdout.flush),
+                                  encoding=request['encoding'], errors='backslashreplace',
+                                  write_through=True)
+        sys.stdout.redirect(stdout)
+        sys.stderr.redirect(stderr)
+        try:
+            self.run(self.db, args)
+            status = 0
+        except SystemExit as err:
+            # as the interpreter would report it
+            if err.code is None or isinstance(err.code, int):
+                status = err.code or 0
+            else:
+                print(err.code, file=sys.stderr)
+                status = 1
+        except ConnectionError:
+            return  # the client went away, such as when piped into `head`
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout.redirect(None)
+            sys.stderr.redirect(None)
+        stdout.flush()
+        _send(connection, EXIT, str(status).encode())
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """Hand each connection to the `NEODaemon` of the server."""
+
+    def handle(self):
+        """Read the request, and run it."""
+        try:
+            try:
+                request = json.loads(self.rfile.readline())
+            except ValueError:
+                _send(self.connection, REFUSE, b"Malformed request.")
+                return
+            self.server.neo_daemon.handle(self.connection, request)
+        except ConnectionError:
+            pass  # the client went away
+
+
+class ThreadLocalStream:
+    """Stand in for `sys.stdout` or `sys.stderr`, writing to a stream of the current thread.
+
+    Threads that haven't redirected the proxy write to the original stream.
+    """
+
+    def __init__(self, default):
+        """Create a new `ThreadLocalStream`.
+
+        :param default: The stream to write to without a redirection.
+        """
+        self._default = default
+        self._local = threading.local()
+
+    def redirect(self, stream):
+        """Write to a stream from the current thread, or stop redirecting with None."""
+        self._local.stream = stream
+
+    def _target(self):
+        return getattr(self._local, 'stream', None) or self._default
+
+    def write(self, text):
+        """Write text to the stream of the current thread."""
+        return self._target().write(text)
+
+    def flush(self):
+        """Flush the stream of the current thread."""
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class _FrameWriter(io.RawIOBase):
+    """A binary stream that sends what's written to it as frames on one channel."""
+
+    def __init__(self, connection, channel, before=None):
+        """Create a new `_FrameWriter`.
+
+        :param connection: The connected `socket.socket`.
+        :param channel: The channel of the frames, `STDOUT` or `STDERR`.
+        :param before: A function to call before sending each frame, or None.
+        """
+        super().__init__()
+        self.connection = connection
+        self.channel = channel
+        self.before = before
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.before:
+            self.before()
+        _send(self.connection, self.channel, data)
+        return len(data)
+
+
+def forward(argv, args, path=SOCKET_PATH):
+    """Run a command on the daemon, if one is running, relaying its output.
+
+    Batch files can name output files relative to the working directory of the
+    client, so queries with `--batch` always run locally.
+
+    :param argv: The command-line arguments, which the daemon parses again.
+    :param args: The same arguments, as parsed by the top-level parser.
+    :param path: The path of the daemon's Unix socket.
+    :return: The exit status of the command, or None if no daemon ran it and
+    it must be run locally.
+    """
+    if getattr(args, 'batch', None):
+        return None
+    connection = _connect(str(path))
+    if connection is None:
+        return None
+    with connection, connection.makefile('rb') as frames:
+        request = {'argv': argv, 'cwd': os.getcwd(), 'encoding': sys.stdout.encoding}
+        try:
+            connection.sendall(json.dumps(request).encode() + b'\n')
+            frame = _receive(frames)
+        except OSError:
+            return None
+        if frame is None or frame[0] != ACCEPT:
+            return None
+
+        connection.settimeout(None)
+        sys.stdout.flush()
+        while True:
+            frame = _receive(frames)
+            if frame is None:
+                print("The NEO daemon stopped unexpectedly.", file=sys.stderr)
+                return 1
+            channel, data = frame
+            if channel == EXIT:
+                return int(data)
+            if channel == STDOUT:
+                sys.stdout.buffer.write(data)
+            else:
+                sys.stdout.buffer.flush()
+                sys.stderr.buffer.write(data)
+                sys.stderr.buffer.flush()
+
+
+def _connect(path):
+    """Connect to a daemon's Unix socket, if it's private to the current user.
+
+    Anyone could create a socket at a predictable path in a shared directory,
+    so a socket that belongs to another user, or that others can access, is
+    ignored.
+
+    :param path: The path of the socket.
+    :return: The connected `socket.socket`, or None if no daemon is listening.
+    """
+    if not hasattr(socket, 'AF_UNIX') or not _is_private(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(HANDSHAKE_TIMEOUT)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def _is_private(path):
+    """Return whether a file belongs to the current user, and only they can access it.
+
+    :param path: The path of the file.
+    :return: False if it doesn't exist, belongs to another user or is accessible to others.
+    """
+    try:
+        status = os.stat(path)
+    except OSError:
+        return False
+    return status.st_uid == os.getuid() and not stat.S_IMODE(status.st_mode) & 0o077
+
+
+def _send(connection, channel, data=b''):
+    """Send a frame of data on a channel."""
+    connection.sendall(FRAME.pack(channel, len(data)))
+    if data:
+        connection.sendall(data)
+
+
+def _receive(frames):
+    """Receive the next frame.
+
+    :param frames: A binary file of the connection.
+    :return: A tuple of the channel and the data, or None if the connection closed.
+    """
+    header = frames.read(FRAME.size)
+    if len(header) < FRAME.size:
+        return None
+    channel, size = FRAME.unpack(header)
+    data = frames.read(size)
+    if len(data) < size:
+        return None
+    return channel, data
+
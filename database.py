@@ -9,11 +9,63 @@ Under normal circumstances, the main module creates one NEODatabase from the
 data on NEOs and close approaches extracted by `extract.load_neos` and
 `extract.load_approaches`.
 
+A `NEODatabase` can also hold named standing queries - collections of filters
+whose matching close approaches are materialized once, when the standing query
+is registered, and then kept up to date as new close approaches are ingested.
+
 You'll edit this file in Tasks 2 and 3.
 """
-from extract import neo_csv_path
-from filters import DistanceFilter
-from models import NearEarthObject, CloseApproach
+import base64
+import collections.abc
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import attrgetter
+
+from helpers import ordinal_to_minutes
+from filters import (AttributeFilter, DateFilter, TimeFilter, CompiledQuery, And,
+                     Conjunction, np, as_expression, is_vectorizable, disjunctive_normal_form)
+
+
+# The number of close approaches evaluated at a time by a vectorized query.
+BLOCK_SIZE = 4096
+
+# The order of the close approaches in a database, which is also the order of
+# the keys behind pagination cursors: by time, then by primary designation.
+_ORDER = attrgetter('time_key', '_designation')
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor can't be decoded."""
+
+
+def make_cursor(approach):
+    """Return an opaque pagination cursor for a close approach.
+
+    A cursor encodes the position of the close approach in the index order of
+    a `NEODatabase` (by time, then by primary designation), so a query given
+    the cursor resumes right after it - even against a reloaded database.
+
+    :param approach: A `CloseApproach`, usually the last one of a page.
+    :return: The cursor, as a URL-safe string.
+    """
+    key = f"{approach.time_key}:{approach._designation}".encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+
+def parse_cursor(cursor):
+    """Decode a pagination cursor made by `make_cursor`.
+
+    :param cursor: The cursor, as a string.
+    :return: A tuple of the time key and the primary designation it encodes.
+    :raises InvalidCursorError: If the cursor is malformed.
+    """
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        time_key, designation = key.split(':', 1)
+        return int(time_key), designation
+    except ValueError:
+        raise InvalidCursorError(f"'{cursor}' is not a valid cursor.")
 
 
 class NEODatabase:
@@ -23,6 +75,12 @@ class NEODatabase:
     approaches. It additionally maintains a few auxiliary data structures to
     help fetch NEOs by primary designation or by name and to help speed up
     querying for close approaches that match criteria.
+
+    All of this data lives in an immutable snapshot. Readers (the `get_neo_by_*`
+    methods and `query`) take the current snapshot once and never lock, so a
+    running query always sees one consistent data set. Writers (`ingest`,
+    `reload` and the standing query methods) are serialized by a lock, build a
+    new snapshot and swap it in with a single assignment.
     """
 
     def __init__(self, neos, approaches):
@@ -43,20 +101,21 @@ class NEODatabase:
         :param neos: A collection of `NearEarthObject`s.
         :param approaches: A collection of `CloseApproach`es.
         """
-        self._neos = neos
-        self._approaches = approaches
-        # create fast lookup dictionaries by primary designation and name
-        # (most NEOs don't have a name)
-        self.neos_by_pdes = {neo.designation: neo for neo in self._neos}
-        self.neos_by_name = {neo.name: neo for neo in self._neos}
+        self._snapshot = _Snapshot.build(neos, approaches)
+        # serializes writers; readers never take it
+        self._lock = threading.Lock()
+        # named standing queries, kept up to date by `ingest`
+        self.standing_queries = {}
 
-        for approach in self._approaches:
-            # link neos to approaches
-            approach.neo = self.neos_by_pdes[approach._designation]
-            # link approaches to neos
-            self.neos_by_pdes[approach._designation].approaches.append(
-                approach
-            )
+    @property
+    def neos_by_pdes(self):
+        """Return the NEOs of the current snapshot by primary designation."""
+        return self._snapshot.neos_by_pdes
+
+    @property
+    def neos_by_name(self):
+        """Return the NEOs of the current snapshot by name."""
+        return self._snapshot.neos_by_name
 
     def get_neo_by_designation(self, designation):
         """Find and return an NEO by its primary designation.
@@ -90,25 +149,650 @@ class NEODatabase:
         """
         return self.neos_by_name.get(name.capitalize())
 
-    def query(self, filters=()):
+    def query(self, filters=(), after=None, stats=None):
         """Query close approaches to generate those that match a collection of
         filters.
 
         This generates a stream of `CloseApproach` objects that match all of
-        the provided filters.
+        the provided filters - or, if given a filter expression (of `And`,
+        `Or` and `Not`), that match the expression.
 
         If no arguments are provided, generate all known close approaches.
 
-        The `CloseApproach` objects are generated in internal order, which
-        isn't guaranteed to be sorted meaninfully, although is often sorted
-        by time.
+        The `CloseApproach` objects are generated in index order - by time, and
+        then by primary designation. Given a cursor (see `make_cursor`) for
+        the last close approach of a page, the stream resumes right after it,
+        without scanning any earlier close approaches. The filters
+        are normalized into a disjunction of conjunctions, each with a single
+        interval per attribute. Contradictory conjunctions are dropped without
+        scanning anything; the date interval of each remaining conjunction
+        selects a slice of the time-ordered close approaches, and the union of
+        those slices is scanned once, so every match is generated exactly once.
+
+        The stream is evaluated against the snapshot that is current when
+        `query` is called, even if the database is changed while it is being
+        consumed. To see how a query would be evaluated without running it,
+        use `plan`; `query` is `execute` of that plan.
+
+        When NumPy is installed and every filter supports `evaluate`, the
+        filters are evaluated on blocks of `BLOCK_SIZE` close approaches at a
+        time. Blocks are only evaluated as the stream is consumed, so a
+        `limit`ed stream stops after the block that fills its quota.
 
         :param filters: A collection of filters capturing user-specified
-        criteria.
+        criteria, a filter expression, or a `CompiledQuery`.
+        :param after: A pagination cursor to resume after, or `None` to start
+        from the beginning.
+        :param stats: A dictionary, such as a `collections.Counter`, to which to
+        add the number of close approaches scanned (under `'scanned'`) as the
+        stream is consumed, or `None`.
         :return: A stream of matching `CloseApproach` objects.
+        :raises InvalidCursorError: If the cursor is malformed.
+        """
+        return self.execute(self.plan(filters, after), stats)
+
+    def plan(self, filters=(), after=None):
+        """Plan a query against the current snapshot, without scanning anything.
+
+        An expression whose normal form would have more than `filters.MAX_DISJUNCTS`
+        conjunctions is planned as one scan of the full range.
+
+        :param filters: A collection of filters, a filter expression, or a
+        `CompiledQuery`, as for `query`.
+        :param after: A pagination cursor to resume after, or `None`.
+        :return: A `QueryPlan`.
+        :raises InvalidCursorError: If the cursor is malformed.
+        """
+        snapshot = self._snapshot
+        expression = as_expression(filters)
+        disjuncts = disjunctive_normal_form(filters)
+        ranges = snapshot.ranges(disjuncts)
+        if after is not None:
+            resume = snapshot.position_after(parse_cursor(after))
+            ranges = [(max(start, resume), stop) for start, stop in ranges if stop > resume]
+        vectorized = np is not None and is_vectorizable(expression)
+        return QueryPlan(snapshot, expression, [Conjunction(disjunct) for disjunct in disjuncts],
+                         ranges, vectorized)
+
+    def execute(self, plan, stats=None):
+        """Generate the close approaches that match a planned query.
+
+        :param plan: A `QueryPlan`, as returned by `plan`.
+        :param stats: A dictionary in which to count the scanned close approaches, or `None`.
+        :return: A stream of matching `CloseApproach` objects, as for `query`.
+        """
+        if plan.vectorized:
+            return self._scan_blocks(plan.snapshot, plan.ranges, plan.expression, stats)
+        return self._scan(plan.snapshot.items, plan.ranges, _predicate(plan.expression), stats)
+
+    @staticmethod
+    def _scan_blocks(snapshot, ranges, expression, stats=None):
+        """Generate the matching close approaches, evaluating a block at a time.
+
+        :param snapshot: The `_Snapshot` to query.
+        :param ranges: A sorted list of disjoint (start, stop) index ranges.
+        :param expression: A filter expression that supports `evaluate`.
+        :param stats: A dictionary in which to count the scanned close approaches, or `None`.
+        :yield: The matching `CloseApproach` objects.
+        """
+        columns = snapshot.columns()
+        approaches = snapshot.items
+        for start, stop in ranges:
+            for block_start in range(start, stop, BLOCK_SIZE):
+                block_stop = min(block_start + BLOCK_SIZE, stop)
+                block = {name: column[block_start:block_stop] for name, column in columns.items()}
+                mask = expression.evaluate(block)
+                if stats is not None:
+                    stats['scanned'] += block_stop - block_start
+                for index in np.flatnonzero(mask).tolist():
+                    yield approaches[block_start + index]
+
+    @staticmethod
+    def _scan(approaches, ranges, predicate, stats=None):
+        """Generate the close approaches in some ranges that match a predicate.
+
+        :param approaches: A sequence of linked `CloseApproach`es.
+        :param ranges: A sorted list of disjoint (start, stop) index ranges.
+        :param predicate: A 1-argument predicate on a `CloseApproach`.
+        :param stats: A dictionary in which to count the scanned close approaches, or `None`.
+        :yield: The matching `CloseApproach` objects.
         """
-        for approach in self._approaches:
-            # all filters need to be True for an approach to be included
-            # in the results
-            if all([filter(approach) for filter in filters]):
-                yield approach
+        for start, stop in ranges:
+            if stats is None:
+                for approach in approaches[start:stop]:
+                    if predicate(approach):
+                        yield approach
+                continue
+            # count up to each match, so that a stream that is stopped early
+            # only counts what it scanned
+            counted = start
+            for position in range(start, stop):
+                approach = approaches[position]
+                if predicate(approach):
+                    stats['scanned'] += position + 1 - counted
+                    counted = position + 1
+                    yield approach
+            stats['scanned'] += stop - counted
+
+    def query_many(self, filter_sets, limits=None):
+        """Query close approaches for many collections of filters in one pass.
+
+        Every collection of filters (or filter expression) is planned as in
+        `query`. The union of their index ranges is then scanned once; as the
+        scan proceeds, only the queries whose ranges cover the current close
+        approach evaluate it, and each match is routed to every query that it
+        satisfies. A query stops collecting once it reaches its limit, and the
+        scan stops once every query has.
+
+        :param filter_sets: A sequence of collections of filters (or filter
+        expressions), one per query.
+        :param limits: A sequence of the maximum number of results of each
+        query, where 0 or `None` means no limit. By default, no query is limited.
+        :return: A list of lists of matching `CloseApproach` objects, one per
+        query, each in time order.
+        """
+        snapshot = self._snapshot
+        approaches = snapshot.items
+        expressions = [as_expression(filters) for filters in filter_sets]
+        limits = [limit or None for limit in (limits or [None] * len(expressions))]
+        results = [[] for _ in expressions]
+        vectorized = [np is not None and is_vectorizable(expression) for expression in expressions]
+        columns = snapshot.columns() if any(vectorized) else None
+
+        # split the union of all ranges into segments covered by a fixed set of queries
+        covering = {}
+        for number, filters in enumerate(filter_sets):
+            for start, stop in snapshot.ranges(disjunctive_normal_form(filters)):
+                covering.setdefault(start, []).append((number, True))
+                covering.setdefault(stop, []).append((number, False))
+        def finished(number):
+            return limits[number] is not None and len(results[number]) >= limits[number]
+
+        active = set()
+        boundaries = sorted(covering)
+        for start, stop in zip(boundaries, boundaries[1:]):
+            for number, entering in covering[start]:
+                (active.add if entering else active.discard)(number)
+            active = {number for number in active if not finished(number)}
+            for block_start in range(start, stop, BLOCK_SIZE):
+                if not active:
+                    break
+                block_stop = min(block_start + BLOCK_SIZE, stop)
+                block_approaches = approaches[block_start:block_stop]
+                block = None
+                for number in sorted(active):
+                    if vectorized[number]:
+                        if block is None:
+                            block = {name: column[block_start:block_stop]
+                                     for name, column in columns.items()}
+                        mask = expressions[number].evaluate(block)
+                        matches = [block_approaches[index] for index in np.flatnonzero(mask).tolist()]
+                    else:
+                        predicate = _predicate(expressions[number])
+                        matches = [approach for approach in block_approaches if predicate(approach)]
+                    if limits[number] is not None:
+                        matches = matches[:limits[number] - len(results[number])]
+                    results[number].extend(matches)
+                    if finished(number):
+                        active.discard(number)
+            if all(map(finished, range(len(results)))):
+                break
+        return results
+
+    def ingest(self, approaches):
+        """Add new close approaches to this database.
+
+        The new close approaches are linked to their NEOs (exactly as in the
+        constructor), appended to the database, and offered to every standing
+        query - so the materialized results of a standing query stay current
+        without re-scanning the close approaches that were already known.
+
+        Queries that are already running are unaffected - they finish against
+        the snapshot they started with.
+
+        :param approaches: A collection of new, unlinked `CloseApproach`es.
+        :return: The number of ingested close approaches.
+        """
+        approaches = tuple(approaches)
+        with self._lock:
+            self._snapshot = self._snapshot.extend(approaches)
+            for standing_query in self.standing_queries.values():
+                standing_query.update(approaches)
+        return len(approaches)
+
+    def reload(self, neos, approaches):
+        """Replace all of the data in this database.
+
+        The new NEOs and close approaches are subject to the same precondition
+        as in the constructor. A new snapshot is built from them and swapped in
+        atomically, and every standing query is recomputed against it. Queries
+        that are already running finish against the old snapshot.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param approaches: A collection of `CloseApproach`es.
+        """
+        snapshot = _Snapshot.build(neos, approaches)
+        with self._lock:
+            self.standing_queries = {
+                name: StandingQuery(name, standing_query.filters, snapshot.approaches)
+                for name, standing_query in self.standing_queries.items()
+            }
+            self._snapshot = snapshot
+
+    def register_standing_query(self, name, filters=()):
+        """Register a named standing query on this database.
+
+        The matching close approaches are computed once, with a full `query`,
+        and are incrementally maintained by `ingest` from then on. Registering
+        a standing query under an existing name replaces the old one.
+
+        :param name: The name of the standing query.
+        :param filters: A collection of filters capturing user-specified
+        criteria.
+        :return: The registered `StandingQuery`.
+        """
+        with self._lock:
+            standing_query = StandingQuery(name, filters, self._snapshot.approaches)
+            standing_queries = dict(self.standing_queries)
+            standing_queries[name] = standing_query
+            self.standing_queries = standing_queries
+        return standing_query
+
+    def unregister_standing_query(self, name):
+        """Remove a standing query from this database.
+
+        :param name: The name of the standing query.
+        :return: The removed `StandingQuery`, or `None` if there wasn't one.
+        """
+        with self._lock:
+            standing_queries = dict(self.standing_queries)
+            standing_query = standing_queries.pop(name, None)
+            self.standing_queries = standing_queries
+        return standing_query
+
+    def get_standing_query(self, name):
+        """Find and return a standing query by its name.
+
+        :param name: The name of the standing query.
+        :return: The `StandingQuery` with the given name, or `None`.
+        """
+        return self.standing_queries.get(name)
+
+
+class QueryPlan:
+    """How a query is evaluated against a snapshot of a `NEODatabase`.
+
+    A plan is made by `NEODatabase.plan` and run by `NEODatabase.execute`, so
+    describing a plan describes exactly what running the query does: which
+    ranges of the time index it scans (its access path), whether it
+    evaluates the filters on blocks of columns or one close approach at a
+    time, and in which order.
+    """
+
+    def __init__(self, snapshot, expression, conjunctions, ranges, vectorized):
+        """Create a new `QueryPlan`.
+
+        :param snapshot: The `_Snapshot` to query.
+        :param expression: The filter expression evaluated on each close approach.
+        :param conjunctions: The `Conjunction`s of the normalized filters; any
+        that are `empty` are skipped.
+        :param ranges: A sorted list of disjoint (start, stop) index ranges to scan.
+        :param vectorized: Whether the expression is evaluated on blocks of columns.
+        """
+        self.snapshot = snapshot
+        self.expression = expression
+        self.conjunctions = conjunctions
+        self.ranges = ranges
+        self.vectorized = vectorized
+
+    @property
+    def access_path(self):
+        """Return how the close approaches to scan are found.
+
+        :return: `'none'` if nothing can match, `'full scan'` if every close
+        approach is scanned, or `'time slice'` if only ranges of the time
+        index are.
+        """
+        if not self.ranges:
+            return 'none'
+        if self.ranges == [(0, self.snapshot.size)]:
+            return 'full scan'
+        return 'time slice'
+
+    @property
+    def estimated_rows(self):
+        """Return the number of close approaches in the ranges to scan.
+
+        This is the number scanned by the whole stream; a limited stream
+        stops sooner.
+        """
+        return sum(stop - start for start, stop in self.ranges)
+
+    def predicate_order(self):
+        """Return the predicates evaluated on each close approach, in order.
+
+        The operands of nested `And`s are listed one by one. A `CompiledQuery`
+        lists its filters grouped by the attribute that they read, as its
+        generated function evaluates them. Any other expression (such as an
+        `Or`) is listed whole.
+
+        :return: A list of predicates.
+        """
+        if isinstance(self.expression, CompiledQuery):
+            groups = {}
+            for filter in self.expression:
+                standard = (isinstance(filter, AttributeFilter)
+                            and type(filter).__call__ is AttributeFilter.__call__)
+                key = filter.getter_class() if standard else id(filter)
+                groups.setdefault(key, []).append(filter)
+            return [filter for group in groups.values() for filter in group]
+        predicates = []
+        pending = [self.expression]
+        while pending:
+            predicate = pending.pop(0)
+            if type(predicate) is And:
+                pending[:0] = predicate.operands
+            else:
+                predicates.append(predicate)
+        return predicates
+
+
+def _predicate(expression):
+    """Return the fastest callable form of a filter expression."""
+    return expression.predicate if isinstance(expression, CompiledQuery) else expression
+
+
+class _Snapshot:
+    """An immutable, fully linked view of the data in a `NEODatabase`.
+
+    The close approaches of a snapshot, their index and their columns never
+    change once it has been built; adding close approaches makes a new
+    snapshot, so a query keeps seeing the close approaches it started with.
+    The NEOs, however, are shared by every snapshot. Linking new close
+    approaches replaces each NEO's `.approaches` collection (rather than
+    appending to it), so a reader that already holds the collection keeps a
+    consistent one, but an NEO found through any snapshot lists the close
+    approaches of the latest.
+
+    The close approaches of a snapshot are kept in index order (by time, then
+    by primary designation), alongside a parallel list of their time keys
+    (minutes since the epoch) that serves as an index for both date and time
+    intervals. When new close approaches all come after the old ones, the new
+    snapshot appends them to the same lists, which is why every snapshot only
+    reads the first `size` items of its lists.
+    """
+
+    __slots__ = ('neos', 'items', 'times', 'size', 'neos_by_pdes', 'neos_by_name', '_columns')
+
+    def __init__(self, neos, items, times, neos_by_pdes, neos_by_name, columns=None):
+        """Create a new `_Snapshot` from already linked data.
+
+        :param neos: A tuple of `NearEarthObject`s.
+        :param items: A list of linked `CloseApproach`es, in index order.
+        :param times: A list of the time keys of the approaches.
+        :param neos_by_pdes: A dictionary mapping primary designations to NEOs.
+        :param neos_by_name: A dictionary mapping names to NEOs.
+        :param columns: The column arrays of the approaches, if already built.
+        """
+        self.neos = neos
+        self.items = items
+        self.times = times
+        self.size = len(items)
+        self.neos_by_pdes = neos_by_pdes
+        self.neos_by_name = neos_by_name
+        self._columns = columns
+
+    @property
+    def approaches(self):
+        """Return a read-only sequence of the close approaches, in index order."""
+        return _Prefix(self.items, self.size)
+
+    def position_after(self, key):
+        """Find the index of the first close approach that follows a key.
+
+        :param key: A tuple of a time key and a primary designation.
+        :return: The index of the first close approach ordered after the key.
+        """
+        time_key, designation = key
+        position = bisect_left(self.times, time_key, 0, self.size)
+        # step over the (few) close approaches at the same minute
+        while (position < self.size and self.times[position] == time_key
+               and self.items[position]._designation <= designation):
+            position += 1
+        return position
+
+    def ranges(self, disjuncts):
+        """Find the slices of close approaches that a disjunction can match.
+
+        :param disjuncts: A disjunction of conjunctions of filters, as returned
+        by `disjunctive_normal_form`.
+        :return: A sorted list of disjoint (start, stop) index ranges.
+        """
+        ranges = []
+        for conjunction in map(Conjunction, disjuncts):
+            if conjunction.empty:
+                continue
+            earliest, latest = conjunction.interval(TimeFilter)
+            first_day, last_day = conjunction.interval(DateFilter)
+            # a date interval covers every minute of its days
+            if first_day is not None:
+                day_start = ordinal_to_minutes(first_day)
+                earliest = day_start if earliest is None else max(earliest, day_start)
+            if last_day is not None:
+                day_end = ordinal_to_minutes(last_day + 1) - 1
+                latest = day_end if latest is None else min(latest, day_end)
+            start = 0 if earliest is None else bisect_left(self.times, earliest, 0, self.size)
+            stop = self.size if latest is None else bisect_right(self.times, latest, 0, self.size)
+            if start < stop:
+                ranges.append((start, stop))
+
+        # merge overlapping ranges, so that no close approach is scanned twice
+        merged = []
+        for start, stop in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        return merged
+
+    def columns(self):
+        """Return the attributes of the close approaches as NumPy arrays.
+
+        The columns are built on first use and cached; there is one element
+        per close approach, in the same order as `.approaches`. Missing
+        distances and velocities are NaN, like missing diameters.
+
+        :return: A dictionary mapping column names to NumPy arrays.
+        """
+        if self._columns is None:
+            self._columns = _build_columns(self.approaches)
+        return self._columns
+
+    @classmethod
+    def build(cls, neos, approaches):
+        """Link unlinked NEOs and close approaches into a new snapshot.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param approaches: A collection of `CloseApproach`es.
+        :return: A new `_Snapshot`.
+        """
+        neos = tuple(neos)
+        # create fast lookup dictionaries by primary designation and name
+        # (most NEOs don't have a name)
+        neos_by_pdes = {neo.designation: neo for neo in neos}
+        neos_by_name = {neo.name: neo for neo in neos}
+        snapshot = cls(neos, [], [], neos_by_pdes, neos_by_name)
+        return snapshot.extend(approaches)
+
+    def extend(self, approaches):
+        """Link new close approaches into a new snapshot, leaving this one unchanged.
+
+        :param approaches: A collection of `CloseApproach`es whose `.neo`
+        attribute hasn't been set yet.
+        :return: A new `_Snapshot` that also contains the new approaches.
+        """
+        approaches = tuple(approaches)
+        linked = {}
+        for approach in approaches:
+            # link neos to approaches
+            neo = self.neos_by_pdes[approach._designation]
+            approach.neo = neo
+            linked.setdefault(neo, []).append(approach)
+        # link approaches to neos, copying rather than mutating each collection
+        for neo, new_approaches in linked.items():
+            neo.approaches = neo.approaches + new_approaches
+        # The old approaches before the earliest new one stay where they are;
+        # only the rest (none, when the new approaches follow the old ones -
+        # such as the next chunk of a time-ordered file) are sorted together
+        # with the new ones, and the index and columns are extended with them.
+        size = self.size
+        position = size
+        if approaches:
+            earliest = min(approach.time_key for approach in approaches)
+            position = bisect_left(self.times, earliest, 0, size)
+        tail = self.items[position:size] + list(approaches)
+        if not all(_ORDER(earlier) <= _ORDER(later) for earlier, later in zip(tail, tail[1:])):
+            tail.sort(key=_ORDER)
+        tail_times = [approach.time_key for approach in tail]
+        if position == size == len(self.items):
+            # this snapshot only reads the first `size` items, so the new
+            # snapshot can append to the same lists rather than copy them
+            items, times = self.items, self.times
+            items.extend(tail)
+            times.extend(tail_times)
+        else:
+            items = self.items[:position] + tail
+            times = self.times[:position] + tail_times
+        columns = self._columns
+        if columns is not None and position:
+            tail_columns = _build_columns(tail)
+            columns = {name: np.concatenate((column[:position], tail_columns[name]))
+                       for name, column in columns.items()}
+        else:
+            # rebuilt when next needed
+            columns = None
+        return _Snapshot(self.neos, items, times, self.neos_by_pdes, self.neos_by_name, columns)
+
+
+class _Prefix(collections.abc.Sequence):
+    """A read-only view of the first items of a list that may grow at the end."""
+
+    __slots__ = ('_items', '_size')
+
+    def __init__(self, items, size):
+        """Create a new `_Prefix`.
+
+        :param items: A list, which is only ever appended to.
+        :param size: The number of leading items of the list to expose.
+        """
+        self._items = items
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step == 1:
+                return self._items[start:max(start, stop)]
+            return [self._items[position] for position in range(start, stop, step)]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("index out of range")
+        return self._items[index]
+
+    def __iter__(self):
+        return islice(self._items, self._size)
+
+
+def _build_columns(approaches):
+    """Build the NumPy column arrays for a collection of linked close approaches.
+
+    :param approaches: A sequence of linked `CloseApproach`es.
+    :return: A dictionary mapping column names to NumPy arrays.
+    """
+    nan = float('nan')
+    count = len(approaches)
+    return {
+        'date': np.fromiter((approach.date_key for approach in approaches),
+                            dtype=np.int64, count=count),
+        'time': np.fromiter((approach.time_key for approach in approaches),
+                            dtype=np.int64, count=count),
+        'distance': np.fromiter((nan if approach.distance is None else approach.distance
+                                 for approach in approaches), dtype=np.float64, count=count),
+        'velocity': np.fromiter((nan if approach.velocity is None else approach.velocity
+                                 for approach in approaches), dtype=np.float64, count=count),
+        'diameter': np.fromiter((approach.neo.diameter for approach in approaches),
+                                dtype=np.float64, count=count),
+        'hazardous': np.fromiter((approach.neo.hazardous for approach in approaches),
+                                 dtype=np.bool_, count=count),
+    }
+
+
+class StandingQuery:
+    """A named query whose matching close approaches are materialized.
+
+    A `StandingQuery` holds a collection of filters and a list of the close
+    approaches that match all of them, in the same order as `NEODatabase.query`
+    returns them - by time, then by designation - however they were ingested.
+    It is created and maintained by a `NEODatabase`, which merges the matches
+    of every update into the list under its lock; reading the results takes a
+    copy of them, so a reader never sees an update half-done.
+    """
+
+    def __init__(self, name, filters=(), approaches=()):
+        """Create a new `StandingQuery`.
+
+        :param name: The name of this standing query.
+        :param filters: A collection of filters capturing user-specified
+        criteria.
+        :param approaches: A collection of linked `CloseApproach`es from which
+        to materialize the initial results.
+        """
+        self.name = name
+        self.filters = filters if callable(filters) else tuple(filters)
+        self._predicate = _predicate(as_expression(self.filters))
+        # the results, and their sort keys to bisect on
+        self._results = []
+        self._keys = []
+        self.update(approaches)
+
+    @property
+    def results(self):
+        """Return a tuple of the materialized results."""
+        return tuple(self._results)
+
+    def update(self, approaches):
+        """Merge the matching close approaches from a batch into the results.
+
+        Matches that all come after the current results - the usual case - are
+        appended. Otherwise, only the results from the earliest match onwards
+        are merged with the matches.
+
+        :param approaches: A sequence of linked `CloseApproach`es.
+        """
+        matches = sorted(NEODatabase._scan(approaches, [(0, len(approaches))], self._predicate),
+                         key=_ORDER)
+        if not matches:
+            return
+        keys = [_ORDER(approach) for approach in matches]
+        position = bisect_right(self._keys, keys[0])
+        if position < len(self._keys):
+            matches = sorted(self._results[position:] + matches, key=_ORDER)
+            keys = [_ORDER(approach) for approach in matches]
+        self._results[position:] = matches
+        self._keys[position:] = keys
+
+    def __len__(self):
+        """Return the number of materialized results."""
+        return len(self._results)
+
+    def __iter__(self):
+        """Iterate over the materialized results."""
+        return iter(self.results)
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"StandingQuery(name={self.name!r}, filters={self.filters!r}, results={len(self)})"
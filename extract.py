@@ -6,7 +6,15 @@ described in the project instructions, into a collection of `NearEarthObject`s.
 
 The `load_approaches` function extracts close approach data from a JSON file,
 formatted as described in the project instructions, into a collection of
-`CloseApproach` objects.
+`CloseApproach` objects. It also reads JSON Lines files of close approaches
+(see `load_approaches_ndjson`), which are parsed in parallel across processes.
+To use the first close approaches before the rest are read, the
+`load_approaches_in_chunks` generator reads either kind of file a chunk at a
+time.
+
+When only one NEO is needed, `find_neo` reads the CSV file up to that NEO, and
+`load_approaches_of` reads just its close approaches, seeking to them through
+an index of byte offsets kept next to the close approach file (`cad.json.idx`).
 
 The main module calls these functions with the arguments provided at the
 command line, and uses the resulting collections to build an `NEODatabase`.
@@ -14,7 +22,12 @@ command line, and uses the resulting collections to build an `NEODatabase`.
 You'll edit this file in Task 2.
 """
 import csv
+import datetime
 import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
 from models import NearEarthObject, CloseApproach
@@ -27,6 +40,17 @@ DATA_ROOT = PROJECT_ROOT / 'data'
 neo_csv_path = DATA_ROOT / 'neos.csv'
 cad_json_path = DATA_ROOT / 'cad.json'
 
+# The extensions of JSON Lines files, with one close approach per line.
+NDJSON_SUFFIXES = ('.jsonl', '.ndjson')
+# JSON Lines files smaller than this (in bytes) are parsed in a single process.
+PARALLEL_THRESHOLD = 4 * 2 ** 20
+# The extension of the index of a close approach file, and how many bytes of
+# the index are read line by line (rather than bisected) in a lookup.
+INDEX_SUFFIX = '.idx'
+INDEX_SEARCH_BLOCK = 4096
+# The number of close approaches in each chunk read by `load_approaches_in_chunks`.
+LOAD_CHUNK_SIZE = 2 ** 16
+
 
 def load_neos(neo_csv_path):
     """Read near-Earth object information from a CSV file.
@@ -46,13 +70,43 @@ def load_neos(neo_csv_path):
     return neos
 
 
+def find_neo(neo_csv_path, designation=None, name=None):
+    """Read one near-Earth object, by primary designation or by name, from a CSV file.
+
+    The file is only read up to the matching row. As with the `get_neo_by_*`
+    methods of `NEODatabase`, the designation must match exactly and the name
+    once capitalized.
+
+    :param neo_csv_path: A path to a CSV file containing data about
+    near-Earth objects.
+    :param designation: The primary designation of the NEO to find.
+    :param name: The name of the NEO to find, if no designation is given.
+    :return: The matching `NearEarthObject`, or None.
+    """
+    field, value = ('pdes', designation) if designation else ('name', name.capitalize())
+    with open(neo_csv_path, 'r') as infile:
+        reader = csv.reader(infile)
+        fieldnames = next(reader)
+        column = fieldnames.index(field)
+        for row in reader:
+            # only build the dictionary for the match
+            if row[column] == value:
+                return NearEarthObject(**dict(zip(fieldnames, row)))
+    return None
+
+
 def load_approaches(cad_json_path):
     """Read close approach data from a JSON file.
 
+    JSON Lines files (with a `.jsonl` or `.ndjson` extension) are read with
+    `load_approaches_ndjson`.
+
     :param neo_csv_path: A path to a JSON file containing data about
     close approaches.
     :return: A collection of `CloseApproach`es.
     """
+    if Path(cad_json_path).suffix in NDJSON_SUFFIXES:
+        return load_approaches_ndjson(cad_json_path)
     close_approaches = []
     with open(cad_json_path, 'r') as file:
         close_approach_data = json.load(file)
@@ -62,3 +116,263 @@ def load_approaches(cad_json_path):
             # class constructor
             close_approaches.append(CloseApproach(close_approach))
     return close_approaches
+
+
+def load_approaches_in_chunks(cad_json_path, chunk_size=LOAD_CHUNK_SIZE):
+    """Read close approach data from a JSON or JSON Lines file, a chunk at a time.
+
+    This is slower than `load_approaches`, but the first close approaches are
+    available long before the last ones are read.
+
+    :param cad_json_path: A path to a file of close approaches.
+    :param chunk_size: The number of close approaches in each chunk.
+    :return: A generator of (chunk, progress) tuples: a list of
+    `CloseApproach`es, in the order of the file, and the fraction of the
+    file read so far.
+    """
+    chunk = []
+    if Path(cad_json_path).suffix in NDJSON_SUFFIXES:
+        size = os.path.getsize(cad_json_path)
+        position = 0
+        with open(cad_json_path, 'rb') as infile:
+            for line in infile:
+                position += len(line)
+                if line.strip():
+                    chunk.append(CloseApproach(_ndjson_record(json.loads(line))))
+                    if len(chunk) == chunk_size:
+                        yield chunk, position / size
+                        chunk = []
+    else:
+        with open(cad_json_path, 'r') as infile:
+            text = infile.read()
+        for row, _, stop in _json_rows(text):
+            chunk.append(CloseApproach(row))
+            if len(chunk) == chunk_size:
+                yield chunk, stop / len(text)
+                chunk = []
+    yield chunk, 1.0
+
+
+def load_approaches_ndjson(ndjson_path, workers=None):
+    """Read close approach data from a JSON Lines file.
+
+    Each non-blank line holds one close approach: either a row of the `data`
+    list of `cad.json`, or an object as written by `write.write_to_ndjson`.
+
+    Large files are split into one byte range per worker, and the lines that
+    start in each range are parsed by a separate process.
+
+    :param ndjson_path: A path to a JSON Lines file of close approaches.
+    :param workers: The number of processes to parse with. Defaults to the
+    number of CPUs.
+    :return: A collection of `CloseApproach`es, in the order of the file.
+    """
+    size = os.path.getsize(ndjson_path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or size < PARALLEL_THRESHOLD:
+        return _load_ndjson_range(ndjson_path, 0, size)
+    bounds = [size * worker // workers for worker in range(workers + 1)]
+    with ProcessPoolExecutor(workers) as executor:
+        chunks = executor.map(_load_ndjson_range, repeat(ndjson_path), bounds[:-1], bounds[1:])
+        return [approach for chunk in chunks for approach in chunk]
+
+
+def _load_ndjson_range(ndjson_path, start, stop):
+    """Parse the lines of a JSON Lines file that start within a byte range.
+
+    :param ndjson_path: A path to a JSON Lines file of close approaches.
+    :param start: The offset of the first byte of the range.
+    :param stop: The offset just past the last byte of the range.
+    :return: A list of `CloseApproach`es.
+    """
+    close_approaches = []
+    with open(ndjson_path, 'rb') as infile:
+        if start:
+            # skip the rest of the line that started in the previous range
+            infile.seek(start - 1)
+            infile.readline()
+        while infile.tell() < stop:
+            line = infile.readline()
+            if not line:
+                break
+            if line.strip():
+                close_approaches.append(CloseApproach(_ndjson_record(json.loads(line))))
+    return close_approaches
+
+
+def _ndjson_record(record):
+    """Convert a parsed line of a JSON Lines file to a `cad.json` data row.
+
+    :param record: A `cad.json` data row, or a serialized close approach.
+    :return: A list of fields for the `CloseApproach` constructor.
+    """
+    if not isinstance(record, dict):
+        return record
+    # a serialized close approach: only the fields read by `CloseApproach`
+    time = datetime.datetime.strptime(record['datetime_utc'], '%Y-%m-%d %H:%M')
+    return [record['neo']['designation'], None, None, time.strftime('%Y-%b-%d %H:%M'),
+            record['distance_au'], None, None, record['velocity_km_s']]
+
+
+def load_approaches_of(cad_json_path, designation, index_path=None):
+    """Read the close approaches of one NEO from a JSON or JSON Lines file.
+
+    Only the NEO's own rows are read and parsed, at the byte offsets listed
+    by the index of the file. The index is built on first use - which takes
+    about as long as loading the whole file - and rebuilt whenever the file
+    changes. If it can't be written, the whole file is loaded instead.
+
+    :param cad_json_path: A path to a file of close approaches.
+    :param designation: The primary designation of the NEO.
+    :param index_path: A path to the index, by default next to the file.
+    :return: A list of the NEO's `CloseApproach`es, in the order of the file.
+    """
+    index_path = index_path or Path(str(cad_json_path) + INDEX_SUFFIX)
+    try:
+        if not _index_is_current(index_path, cad_json_path):
+            build_approach_index(cad_json_path, index_path)
+    except OSError:
+        return [approach for approach in load_approaches(cad_json_path)
+                if approach._designation == designation]
+    close_approaches = []
+    with open(cad_json_path, 'rb') as infile:
+        for start, stop in _search_index(index_path, designation.encode()):
+            infile.seek(start)
+            record = json.loads(infile.read(stop - start).decode())
+            close_approaches.append(CloseApproach(_ndjson_record(record)))
+    return close_approaches
+
+
+def build_approach_index(cad_json_path, index_path):
+    """Index the close approaches of a JSON or JSON Lines file by primary designation.
+
+    The index is a text file of `designation<TAB>start<TAB>stop` lines, sorted
+    by designation and then by offset, after a header line with the size and
+    modification time of the indexed file. Each (start, stop) byte range holds
+    one JSON-encoded close approach.
+
+    :param cad_json_path: A path to a file of close approaches.
+    :param index_path: A path at which to write the index.
+    """
+    stat = os.stat(cad_json_path)
+    if Path(cad_json_path).suffix in NDJSON_SUFFIXES:
+        spans = _ndjson_spans(cad_json_path)
+    else:
+        spans = _json_spans(cad_json_path)
+    spans.sort()
+    # write the index whole, so that a reader never sees half of it
+    partial_path = f'{index_path}.{os.getpid()}'
+    with open(partial_path, 'wb') as outfile:
+        outfile.write(f'# {stat.st_size} {stat.st_mtime_ns}\n'.encode())
+        outfile.writelines(b'%s\t%d\t%d\n' % span for span in spans)
+    os.replace(partial_path, index_path)
+
+
+def _json_spans(cad_json_path):
+    """Find the byte range and designation of each row of `data` in a `cad.json` file.
+
+    :param cad_json_path: A path to a `cad.json` file.
+    :return: A list of (designation as bytes, start, stop) tuples.
+    """
+    with open(cad_json_path, 'rb') as infile:
+        # Latin-1 maps each byte to one character, so character offsets are byte offsets.
+        text = infile.read().decode('latin-1')
+    return [(row[0].encode('latin-1'), start, stop) for row, start, stop in _json_rows(text)]
+
+
+def _json_rows(text):
+    """Parse the rows of `data` in the text of a `cad.json` file, one at a time.
+
+    :param text: The text of a `cad.json` file.
+    :return: A generator of (row, start, stop) tuples, with the character
+    offsets of each row.
+    :raises ValueError: If the text isn't a well-formed `cad.json` file.
+    """
+    decoder = json.JSONDecoder()
+    separator = re.compile(r'[\s,]*')
+    position = text.index('[', text.index('"data"')) + 1
+    while True:
+        position = separator.match(text, position).end()
+        if position == len(text):
+            raise ValueError("The close approach data ends unexpectedly.")
+        if text[position] == ']':
+            return
+        row, end = decoder.raw_decode(text, position)
+        yield row, position, end
+        position = end
+
+
+def _ndjson_spans(ndjson_path):
+    """Find the byte range and designation of each line of a JSON Lines file.
+
+    :param ndjson_path: A path to a JSON Lines file of close approaches.
+    :return: A list of (designation as bytes, start, stop) tuples.
+    """
+    spans = []
+    position = 0
+    with open(ndjson_path, 'rb') as infile:
+        for line in infile:
+            if line.strip():
+                designation = str(_ndjson_record(json.loads(line))[0])
+                spans.append((designation.encode(), position, position + len(line)))
+            position += len(line)
+    return spans
+
+
+def file_signature(path):
+    """Identify a data file by its path and the time and size of its last modification.
+
+    :param path: The path of the file.
+    :return: A tuple that changes whenever the file does, or None if it doesn't exist.
+    """
+    path = Path(path).resolve()
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def _index_is_current(index_path, cad_json_path):
+    """Return whether an index exists and was built from the current version of a file."""
+    stat = os.stat(cad_json_path)
+    try:
+        with open(index_path, 'rb') as index:
+            header = index.readline()
+    except OSError:
+        return False
+    return header == f'# {stat.st_size} {stat.st_mtime_ns}\n'.encode()
+
+
+def _search_index(index_path, key):
+    """Look up the byte ranges of a designation in an index, by bisecting the file.
+
+    :param index_path: A path to an index written by `build_approach_index`.
+    :param key: The designation, as bytes.
+    :return: A list of the (start, stop) byte ranges listed for the designation.
+    """
+    with open(index_path, 'rb') as index:
+        index.readline()  # the header
+        first = low = index.tell()
+        high = os.fstat(index.fileno()).st_size
+        # Narrow down to a block that starts before the first matching line.
+        while high - low > INDEX_SEARCH_BLOCK:
+            middle = (low + high) // 2
+            index.seek(middle)
+            index.readline()  # the rest of the line at `middle`
+            line = index.readline()
+            if line and line.split(b'\t', 1)[0] < key:
+                low = middle
+            else:
+                high = middle
+        index.seek(low)
+        if low > first:
+            index.readline()
+        spans = []
+        for line in index:
+            designation, start, stop = line.split(b'\t')
+            if designation > key:
+                break
+            if designation == key:
+                spans.append((int(start), int(stop)))
+        return spans
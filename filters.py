@@ -5,6 +5,8 @@ The `create_filters` function produces a collection of objects that is used by
 the `query` method to generate a stream of `CloseApproach` objects that match
 all of the desired criteria. The arguments to `create_filters` are provided by
 the main module and originate from the user's command-line options.
+The `filters_from_args` function calls it with the parsed options of a query,
+whether they come from the command line, the interactive shell or the server.
 
 This function can be thought to return a collection of instances of subclasses
 of `AttributeFilter` - a 1-argument callable (on a `CloseApproach`) constructed
@@ -12,19 +14,59 @@ from a comparator (from the `operator` module), a reference value, and a class
 method `get` that subclasses can override to fetch an attribute of interest
 from the supplied `CloseApproach`.
 
+Optionally, `create_filters` can instead return a `CompiledQuery` - the same
+filters fused into one generated predicate function, which reads each attribute
+of a `CloseApproach` once, inlines the comparisons and short-circuits.
+
+When NumPy is installed, each `AttributeFilter` can also be evaluated on a
+whole block of close approaches at once: `evaluate` takes a mapping of column
+arrays (as built by the `NEODatabase`) and returns a boolean mask.
+
+Filters can also be combined into boolean expressions with `And`, `Or` and
+`Not`, or parsed from text (such as `hazardous or diameter > 1`) with
+`parse_where`. The `disjunctive_normal_form` function normalizes any of these
+into an OR of ANDs, and `Conjunction` merges the bounds within each AND into
+one interval per attribute. This lets a `NEODatabase` skip contradictory
+disjuncts, pick an index range for each of the others and still evaluate the
+whole expression in a single scan.
+
 The `limit` function simply limits the maximum number of values produced by an
 iterator.
 
 You'll edit this file in Tasks 3a and 3c.
 """
+import datetime
 import operator
-from itertools import islice
+import re
+from itertools import islice, product
+
+from helpers import datetime_to_minutes, minutes_to_datetime, datetime_to_str
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it, filters are evaluated one approach at a time.
+    np = None
 
 
 class UnsupportedCriterionError(NotImplementedError):
     """A filter criterion is unsupported."""
 
 
+class InvalidExpressionError(ValueError):
+    """A filter expression can't be parsed."""
+
+
+# Infix spellings of the comparators that `CompiledQuery` inlines.
+_INFIX_OPERATORS = {
+    operator.eq: '==',
+    operator.ne: '!=',
+    operator.lt: '<',
+    operator.le: '<=',
+    operator.gt: '>',
+    operator.ge: '>=',
+}
+
+
 class AttributeFilter:
     """A general superclass for filters on comparable attributes.
 
@@ -39,8 +81,21 @@ class AttributeFilter:
 
     Concrete subclasses can override the `get` classmethod to provide custom
     behavior to fetch a desired attribute from the given `CloseApproach`.
+
+    A subclass that overrides `get` may also set `accessor` to the equivalent
+    Python expression (in terms of `approach`), which lets `CompiledQuery`
+    inline the attribute access, and `column` to the name of the equivalent
+    column array, which lets `evaluate` work on a block of close approaches.
+    If the attribute only takes integer values, `step` can be set to 1, which
+    lets strict comparisons be normalized into inclusive bounds. These are
+    only trusted on the class that defines `get`, so subclasses of a concrete
+    filter that override `get` again fall back to calling it.
     """
 
+    accessor = None
+    column = None
+    step = None
+
     def __init__(self, op, value):
         """Construct a new `AttributeFilter` from an binary predicate and a
         reference value.
@@ -77,6 +132,44 @@ class AttributeFilter:
         """
         raise UnsupportedCriterionError
 
+    @classmethod
+    def getter_class(cls):
+        """Return the class that defines the `get` used by this class.
+
+        Filters with the same getter class read the same attribute.
+        """
+        for klass in cls.__mro__:
+            if 'get' in vars(klass):
+                return klass
+        return AttributeFilter
+
+    @classmethod
+    def declared(cls, name):
+        """Return an attribute declared by the class that defines `get`.
+
+        :param name: The name of the class attribute, such as `'accessor'`.
+        :return: Its value, or `None` if that class doesn't declare it.
+        """
+        return vars(cls.getter_class()).get(name)
+
+    @classmethod
+    def vectorizable(cls):
+        """Return whether filters of this class support `evaluate`."""
+        return (np is not None and cls.declared('column') is not None
+                and cls.__call__ is AttributeFilter.__call__)
+
+    def evaluate(self, columns):
+        """Evaluate this filter on a block of close approaches at once.
+
+        :param columns: A mapping from column names to equally long NumPy
+        arrays, one element per close approach.
+        :return: A boolean NumPy array, True where the close approach matches.
+        """
+        column = self.declared('column')
+        if column is None:
+            raise UnsupportedCriterionError
+        return self.op(columns[column], self.value)
+
     def __repr__(self):
         """Return a string representation of this AttributeFilter.
 
@@ -93,21 +186,45 @@ class AttributeFilter:
 
 
 class DateFilter(AttributeFilter):
-    """filter by date: exact match, less than and greater than."""
+    """filter by date: exact match, less than and greater than.
+
+    Close approaches precompute the ordinal of their date (`date_key`), so a
+    `DateFilter` stores its reference date as an ordinal too, and compares
+    integers without creating a `date` per close approach.
+    """
+
+    accessor = 'approach.date_key'
+    column = 'date'
+    step = 1
+
+    def __init__(self, op, value):
+        """Construct a new `DateFilter` from a binary predicate and a reference date.
+
+        :param op: A 2-argument predicate comparator (such as `operator.le`).
+        :param value: The reference `date`, or its ordinal.
+        """
+        super().__init__(op, value.toordinal() if isinstance(value, datetime.date) else value)
 
     @classmethod
     def get(cls, approach):
         """
         Extract the date component from a CloseApproach's time attribute.
 
-        This method is used to retrieve the `date` value from a `CloseApproach`
+        This method is used to retrieve the date of a `CloseApproach`
         instance, which will be compared against the reference value stored in
         the filter.
 
         :param approach: A `CloseApproach` instance.
-        :return: A `date` object representing the date of the close approach.
+        :return: The ordinal of the date of the close approach.
         """
-        return approach.time.date()
+        return approach.date_key
+
+    def __repr__(self):
+        """Return a string representation of this DateFilter, showing the reference date."""
+        return (
+            f"{self.__class__.__name__}(op=operator.{self.op.__name__}, "
+            f"value={datetime.date.fromordinal(self.value)})"
+        )
 
     @classmethod
     def on(cls, date):
@@ -148,9 +265,72 @@ class DateFilter(AttributeFilter):
         return cls(operator.ge, start_date)
 
 
+class TimeFilter(AttributeFilter):
+    """filter by time of close approach, at minute resolution.
+
+    Close approaches precompute their time as whole minutes since the Unix
+    epoch (`time_key`), so a `TimeFilter` stores its reference time the same
+    way and compares integers.
+    """
+
+    accessor = 'approach.time_key'
+    column = 'time'
+    step = 1
+
+    def __init__(self, op, value):
+        """Construct a new `TimeFilter` from a binary predicate and a reference time.
+
+        :param op: A 2-argument predicate comparator (such as `operator.le`).
+        :param value: The reference naive `datetime`, or its time key.
+        """
+        super().__init__(op, datetime_to_minutes(value) if isinstance(value, datetime.datetime) else value)
+
+    @classmethod
+    def get(cls, approach):
+        """
+        Retrieve the time key of a CloseApproach instance.
+
+        :param approach: A `CloseApproach` instance.
+        :return: The time of the close approach, in minutes since the epoch.
+        """
+        return approach.time_key
+
+    @classmethod
+    def before(cls, end_time):
+        """
+        Create a TimeFilter that matches close approaches occurring at or
+        before a specific time.
+
+        :param end_time: A naive `datetime` of the latest acceptable time.
+        :return: A `TimeFilter` instance with operator.le.
+        """
+        return cls(operator.le, end_time)
+
+    @classmethod
+    def after(cls, start_time):
+        """
+        Create a TimeFilter that matches close approaches occurring at or
+        after a specific time.
+
+        :param start_time: A naive `datetime` of the earliest acceptable time.
+        :return: A `TimeFilter` instance with operator.ge.
+        """
+        return cls(operator.ge, start_time)
+
+    def __repr__(self):
+        """Return a string representation of this TimeFilter, showing the reference time."""
+        return (
+            f"{self.__class__.__name__}(op=operator.{self.op.__name__}, "
+            f"value={datetime_to_str(minutes_to_datetime(self.value))})"
+        )
+
+
 class DistanceFilter(AttributeFilter):
     """filter by distance."""
 
+    accessor = 'approach.distance'
+    column = 'distance'
+
     @classmethod
     def get(cls, approach):
         """
@@ -187,6 +367,9 @@ class DistanceFilter(AttributeFilter):
 class VelocityFilter(AttributeFilter):
     """Filter by velocity."""
 
+    accessor = 'approach.velocity'
+    column = 'velocity'
+
     @classmethod
     def get(cls, approach):
         """
@@ -223,6 +406,9 @@ class VelocityFilter(AttributeFilter):
 class DiameterFilter(AttributeFilter):
     """filter by diameter."""
 
+    accessor = 'approach.neo.diameter'
+    column = 'diameter'
+
     @classmethod
     def get(cls, approach):
         """
@@ -259,6 +445,9 @@ class DiameterFilter(AttributeFilter):
 class HazardousFilter(AttributeFilter):
     """filter CloseApproaches based on whether its NEO is hazardous or not."""
 
+    accessor = 'approach.neo.hazardous'
+    column = 'hazardous'
+
     @classmethod
     def get(cls, approach):
         """
@@ -281,11 +470,473 @@ class HazardousFilter(AttributeFilter):
         return cls(operator.eq, hazardous)
 
 
+class CompiledQuery:
+    """A collection of filters fused into a single predicate function.
+
+    A `CompiledQuery` generates the source of one Python function for its
+    filters and compiles it. Filters that fetch the same attribute are grouped,
+    so each attribute is read once; the comparators of `operator` are inlined
+    as infix comparisons; and evaluation stops at the first failing group.
+
+    Filters whose class supplies an `accessor` have their attribute access
+    inlined too. Any other `AttributeFilter` (such as a custom subclass) is
+    evaluated through its own `get` and `op`, and any other callable is called
+    as an opaque predicate - so the semantics are those of calling every
+    filter in turn.
+
+    A `CompiledQuery` is itself a 1-argument callable predicate, and iterating
+    over it yields the original filters.
+    """
+
+    def __init__(self, filters=()):
+        """Compile a new `CompiledQuery` from a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified
+        criteria.
+        """
+        self.filters = tuple(filters)
+        self.source, namespace = self._generate(self.filters)
+        exec(compile(self.source, '<CompiledQuery>', 'exec'), namespace)
+        self.predicate = namespace['predicate']
+
+    @classmethod
+    def _generate(cls, filters):
+        """Generate the source of the predicate function for some filters.
+
+        :param filters: A tuple of filters.
+        :return: A tuple of the source and the namespace it must run in.
+        """
+        namespace = {}
+        # group the comparisons by the attribute they read, in first-seen order
+        groups = {}
+        for index, filter in enumerate(filters):
+            if not isinstance(filter, AttributeFilter) or type(filter).__call__ is not AttributeFilter.__call__:
+                # an opaque predicate, in a group of its own
+                namespace[f'filter_{index}'] = filter
+                groups[index] = (None, [(index, filter)])
+                continue
+            accessor = filter.declared('accessor')
+            if accessor is not None:
+                key = accessor
+            else:
+                # a custom `get`, shared by filters of the same class
+                key = getattr(filter.get, '__func__', filter.get)
+                if key not in groups:
+                    namespace[f'get_{index}'] = filter.get
+                    accessor = f'get_{index}(approach)'
+            groups.setdefault(key, (accessor, []))[1].append((index, filter))
+
+        lines = ['def predicate(approach):']
+        for number, (accessor, members) in enumerate(groups.values()):
+            conditions = []
+            for index, filter in members:
+                if accessor is None:
+                    conditions.append(f'filter_{index}(approach)')
+                    continue
+                namespace[f'value_{index}'] = filter.value
+                infix = _INFIX_OPERATORS.get(filter.op)
+                if infix:
+                    conditions.append(f'value {infix} value_{index}')
+                else:
+                    namespace[f'op_{index}'] = filter.op
+                    conditions.append(f'op_{index}(value, value_{index})')
+            if accessor is not None:
+                lines.append(f'    value = {accessor}')
+            lines.append(f'    if not ({" and ".join(conditions)}):')
+            lines.append('        return False')
+        lines.append('    return True')
+        return '\n'.join(lines) + '\n', namespace
+
+    def __call__(self, approach):
+        """Invoke `self(approach)`."""
+        return self.predicate(approach)
+
+    def __iter__(self):
+        """Iterate over the original filters."""
+        return iter(self.filters)
+
+    def __len__(self):
+        """Return the number of original filters."""
+        return len(self.filters)
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"CompiledQuery({list(self.filters)!r})"
+
+
+class And:
+    """A conjunction of filters: matches when every operand matches.
+
+    The operands can be any 1-argument predicates on a `CloseApproach` -
+    usually `AttributeFilter`s or other expressions. An `And` without operands
+    matches everything.
+    """
+
+    def __init__(self, *operands):
+        """Create a new `And` of some operands.
+
+        :param operands: The filters or expressions to combine.
+        """
+        self.operands = operands
+
+    def __call__(self, approach):
+        """Invoke `self(approach)`."""
+        return all(operand(approach) for operand in self.operands)
+
+    def vectorizable(self):
+        """Return whether every operand supports `evaluate`."""
+        return bool(self.operands) and all(is_vectorizable(operand) for operand in self.operands)
+
+    def evaluate(self, columns):
+        """Evaluate this expression on a block of close approaches at once.
+
+        :param columns: A mapping from column names to NumPy arrays.
+        :return: A boolean NumPy array, True where the close approach matches.
+        """
+        return np.logical_and.reduce([operand.evaluate(columns) for operand in self.operands])
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"{self.__class__.__name__}({', '.join(map(repr, self.operands))})"
+
+
+class Or(And):
+    """A disjunction of filters: matches when any operand matches.
+
+    An `Or` without operands matches nothing.
+    """
+
+    def __call__(self, approach):
+        """Invoke `self(approach)`."""
+        return any(operand(approach) for operand in self.operands)
+
+    def evaluate(self, columns):
+        """Evaluate this expression on a block of close approaches at once.
+
+        :param columns: A mapping from column names to NumPy arrays.
+        :return: A boolean NumPy array, True where the close approach matches.
+        """
+        return np.logical_or.reduce([operand.evaluate(columns) for operand in self.operands])
+
+
+class Not:
+    """The negation of a filter: matches when its operand doesn't."""
+
+    def __init__(self, operand):
+        """Create a new `Not` of an operand.
+
+        :param operand: The filter or expression to negate.
+        """
+        self.operand = operand
+
+    def __call__(self, approach):
+        """Invoke `self(approach)`."""
+        return not self.operand(approach)
+
+    def vectorizable(self):
+        """Return whether the operand supports `evaluate`."""
+        return is_vectorizable(self.operand)
+
+    def evaluate(self, columns):
+        """Evaluate this expression on a block of close approaches at once.
+
+        :param columns: A mapping from column names to NumPy arrays.
+        :return: A boolean NumPy array, True where the close approach matches.
+        """
+        return np.logical_not(self.operand.evaluate(columns))
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"Not({self.operand!r})"
+
+
+def is_vectorizable(filter):
+    """Return whether a filter or expression supports `evaluate`."""
+    vectorizable = getattr(filter, 'vectorizable', None)
+    return vectorizable is not None and vectorizable()
+
+
+def as_expression(filters):
+    """Return filters as a single callable predicate.
+
+    A collection of filters (as returned by `create_filters`) becomes an `And`
+    of them; anything that's already callable - an expression, a single
+    filter or a `CompiledQuery` - is returned as is.
+
+    :param filters: A collection of filters, or a filter expression.
+    :return: A 1-argument predicate on a `CloseApproach`.
+    """
+    return filters if callable(filters) else And(*filters)
+
+
+def disjunctive_normal_form(filters):
+    """Normalize filters into a disjunction of conjunctions.
+
+    Nested `And`s and `Or`s are flattened, `Not` is pushed inwards with De
+    Morgan's laws (and double negations cancel out), and `And`s are
+    distributed over `Or`s. The literals of the result are `AttributeFilter`s,
+    negations of them, and any other predicates, which are kept as they are.
+
+    Distributing can multiply the number of conjunctions - an AND of n ORs of
+    two filters has 2 ** n of them. A subexpression whose normal form would
+    have more than `MAX_DISJUNCTS` conjunctions is instead kept whole, as a
+    single literal.
+
+    :param filters: A collection of filters, or a filter expression.
+    :return: A list of tuples of literals; an approach matches the expression
+    when it matches every literal of at least one tuple.
+    """
+    if isinstance(filters, Or):
+        disjuncts = [conjunction for operand in filters.operands
+                     for conjunction in disjunctive_normal_form(operand)]
+        return disjuncts if len(disjuncts) <= MAX_DISJUNCTS else [(filters,)]
+    if isinstance(filters, (And, CompiledQuery)) or not callable(filters):
+        operands = filters.operands if isinstance(filters, And) else tuple(filters)
+        normal_forms = [disjunctive_normal_form(operand) for operand in operands]
+        size = 1
+        for normal_form in normal_forms:
+            size *= len(normal_form)
+        if size > MAX_DISJUNCTS:
+            return [(as_expression(filters),)]
+        return [sum(conjunctions, ()) for conjunctions in product(*normal_forms)]
+    if isinstance(filters, Not):
+        operand = filters.operand
+        if isinstance(operand, Not):
+            return disjunctive_normal_form(operand.operand)
+        if isinstance(operand, Or):
+            return disjunctive_normal_form(And(*map(Not, operand.operands)))
+        if isinstance(operand, (And, CompiledQuery)) or not callable(operand):
+            operands = operand.operands if isinstance(operand, And) else tuple(operand)
+            return disjunctive_normal_form(Or(*map(Not, operands)))
+    return [(filters,)]
+
+
+class Conjunction:
+    """The normal form of a conjunction of filters.
+
+    The bounds that the filters of a conjunction put on each attribute are
+    merged into one inclusive interval, keeping only the tightest lower and
+    upper bound. `AttributeFilter`s that compare with `==`, `<=` or `>=` are
+    bounds (as are filters on integer attributes, such as `DateFilter`s, that
+    compare with `<` or `>`, which are shifted by one step); every other
+    literal is kept as a residual filter.
+
+    If the interval of any attribute is empty - its lower bound is above its
+    upper bound - no close approach can match the conjunction, and `empty` is
+    True.
+    """
+
+    def __init__(self, filters=()):
+        """Normalize a new `Conjunction` from a collection of filters.
+
+        :param filters: A collection of filters that must all match.
+        """
+        # the interval of each attribute, keyed by the filter class that reads it
+        self.intervals = {}
+        self.residual = []
+        for filter in filters:
+            bounds = self._bounds(filter)
+            if bounds is None:
+                self.residual.append(filter)
+                continue
+            key = filter.getter_class()
+            low, high = self.intervals.get(key, (None, None))
+            if bounds[0] is not None and (low is None or bounds[0] > low):
+                low = bounds[0]
+            if bounds[1] is not None and (high is None or bounds[1] < high):
+                high = bounds[1]
+            self.intervals[key] = (low, high)
+        self.empty = any(low is not None and high is not None and low > high
+                         for low, high in self.intervals.values())
+
+    @staticmethod
+    def _bounds(filter):
+        """Return the inclusive (low, high) bounds a filter imposes, if any."""
+        if not isinstance(filter, AttributeFilter) or type(filter).__call__ is not AttributeFilter.__call__:
+            return None
+        if filter.op is operator.eq:
+            return filter.value, filter.value
+        if filter.op is operator.ge:
+            return filter.value, None
+        if filter.op is operator.le:
+            return None, filter.value
+        step = filter.declared('step')
+        if step is not None:
+            if filter.op is operator.gt:
+                return filter.value + step, None
+            if filter.op is operator.lt:
+                return None, filter.value - step
+        return None
+
+    def interval(self, filter_class):
+        """Return the inclusive interval for the attribute a filter class reads.
+
+        :param filter_class: A subclass of `AttributeFilter`, such as `DateFilter`.
+        :return: A tuple of the lower and upper bound, either of which is
+        `None` if unbounded.
+        """
+        return self.intervals.get(filter_class.getter_class(), (None, None))
+
+    def filters(self):
+        """Return the minimal list of filters equivalent to this conjunction.
+
+        Each attribute gets a single `==` filter if its bounds coincide, and
+        otherwise at most a `>=` and a `<=` filter. An empty conjunction keeps
+        the two conflicting bounds, so that it still matches nothing when its
+        filters are called one by one.
+
+        :return: A list of filters.
+        """
+        filters = []
+        for filter_class, (low, high) in self.intervals.items():
+            if low is not None and low == high:
+                filters.append(filter_class(operator.eq, low))
+                continue
+            if low is not None:
+                filters.append(filter_class(operator.ge, low))
+            if high is not None:
+                filters.append(filter_class(operator.le, high))
+        return filters + self.residual
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"Conjunction({self.filters()!r})"
+
+
+# The most conjunctions that `disjunctive_normal_form` expands an expression into.
+MAX_DISJUNCTS = 64
+
+# The fields, comparators and keywords of the `parse_where` expression syntax.
+_WHERE_TOKENS = re.compile(r'\s*(\(|\)|[<>!]=|==|[<>=]|[^\s()<>!=]+)')
+_WHERE_OPERATORS = {
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+_WHERE_KEYWORDS = ('and', 'or', 'not')
+
+
+def _parse_where_date(text):
+    """Parse a date in YYYY-MM-DD format."""
+    return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def _parse_where_time(text):
+    """Parse a time in YYYY-MM-DDTHH:MM format."""
+    return datetime.datetime.strptime(text, '%Y-%m-%dT%H:%M')
+
+
+def _parse_where_boolean(text):
+    """Parse a boolean spelled as true/false, yes/no, y/n or 1/0."""
+    value = {'true': True, 'yes': True, 'y': True, '1': True,
+             'false': False, 'no': False, 'n': False, '0': False}.get(text.lower())
+    if value is None:
+        raise ValueError(text)
+    return value
+
+
+_WHERE_FIELDS = {
+    'date': (DateFilter, _parse_where_date),
+    'time': (TimeFilter, _parse_where_time),
+    'distance': (DistanceFilter, float),
+    'velocity': (VelocityFilter, float),
+    'diameter': (DiameterFilter, float),
+    'hazardous': (HazardousFilter, _parse_where_boolean),
+}
+
+
+def parse_where(text):
+    """Parse a boolean filter expression.
+
+    Comparisons have the form `FIELD OP VALUE`, where FIELD is one of `date`
+    (a YYYY-MM-DD date), `time` (a YYYY-MM-DDTHH:MM time), `distance` (au),
+    `velocity` (km/s), `diameter` (km) or `hazardous` (true or false) and OP
+    is one of `=`, `==`, `!=`, `<`, `<=`, `>` or `>=`. A bare `hazardous` is short for `hazardous = true`.
+    Comparisons combine with `and`, `or`, `not` and parentheses, with the
+    usual precedence:
+
+        hazardous or diameter > 1
+        date >= 2020-01-01 and not (distance > 0.1 or velocity < 10)
+
+    :param text: The expression to parse.
+    :return: An expression of `And`, `Or`, `Not` and `AttributeFilter`s.
+    :raises InvalidExpressionError: If the expression is malformed.
+    """
+    tokens = _WHERE_TOKENS.findall(text)
+    if ''.join(tokens).replace(' ', '') != re.sub(r'\s+', '', text):
+        raise InvalidExpressionError(f"Unexpected character in filter expression {text!r}.")
+    position = 0
+
+    def peek():
+        return tokens[position].lower() if position < len(tokens) else None
+
+    def take(expected=None):
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise InvalidExpressionError(f"Unexpected end of filter expression {text!r}.")
+        if expected is not None and token != expected:
+            raise InvalidExpressionError(
+                f"Expected {expected!r} in filter expression {text!r}, found {token!r}.")
+        position += 1
+        return tokens[position - 1]
+
+    def disjunction():
+        operands = [conjunction()]
+        while peek() == 'or':
+            take()
+            operands.append(conjunction())
+        return operands[0] if len(operands) == 1 else Or(*operands)
+
+    def conjunction():
+        operands = [negation()]
+        while peek() == 'and':
+            take()
+            operands.append(negation())
+        return operands[0] if len(operands) == 1 else And(*operands)
+
+    def negation():
+        if peek() == 'not':
+            take()
+            return Not(negation())
+        if peek() == '(':
+            take()
+            expression = disjunction()
+            take(')')
+            return expression
+        return comparison()
+
+    def comparison():
+        field = take().lower()
+        if field not in _WHERE_FIELDS:
+            raise InvalidExpressionError(
+                f"Unknown field {field!r} in filter expression {text!r}; "
+                f"use one of {', '.join(_WHERE_FIELDS)}.")
+        filter_class, convert = _WHERE_FIELDS[field]
+        if peek() not in _WHERE_OPERATORS:
+            if field == 'hazardous':
+                return filter_class(operator.eq, True)
+            raise InvalidExpressionError(f"Expected a comparison after {field!r} in {text!r}.")
+        op = _WHERE_OPERATORS[take()]
+        value = take()
+        try:
+            return filter_class(op, convert(value))
+        except ValueError:
+            raise InvalidExpressionError(f"Invalid {field} {value!r} in filter expression {text!r}.")
+
+    if not tokens:
+        raise InvalidExpressionError("Empty filter expression.")
+    expression = disjunction()
+    if position != len(tokens):
+        raise InvalidExpressionError(f"Unexpected {tokens[position]!r} in filter expression {text!r}.")
+    return expression
+
+
 def create_filters(date=None, start_date=None, end_date=None,
+                   start_time=None, end_time=None,
                    distance_min=None, distance_max=None,
                    velocity_min=None, velocity_max=None,
                    diameter_min=None, diameter_max=None,
-                   hazardous=None):
+                   hazardous=None, compiled=False):
     """Create a collection of filters from user-specified criteria.
 
     Each of these arguments is provided by the main module with a value from
@@ -303,13 +954,21 @@ def create_filters(date=None, start_date=None, end_date=None,
     The return value must be compatible with the `query` method of
     `NEODatabase` because the main module directly passes this result to that
     method. For now, this can be thought of as a collection of
-    `AttributeFilter`s.
+    `AttributeFilter`s - or, with `compiled=True`, a `CompiledQuery` of them.
+
+    The criteria on each attribute are merged into one interval (see
+    `Conjunction`), so redundant bounds are dropped: `date` together with
+    `start_date` and `end_date` becomes at most one `DateFilter`, for instance.
 
     :param date: A `date` on which a matching `CloseApproach` occurs.
     :param start_date: A `date` on or after which a matching `CloseApproach`
     occurs.
     :param end_date: A `date` on or before which a matching `CloseApproach`
     occurs.
+    :param start_time: A naive `datetime` at or after which a matching
+    `CloseApproach` occurs, to the minute.
+    :param end_time: A naive `datetime` at or before which a matching
+    `CloseApproach` occurs, to the minute.
     :param distance_min: A minimum nominal approach distance for a matching
     `CloseApproach`.
     :param distance_max: A maximum nominal approach distance for a matching
@@ -324,6 +983,7 @@ def create_filters(date=None, start_date=None, end_date=None,
     `CloseApproach`.
     :param hazardous: Whether the NEO of a matching `CloseApproach` is
     potentially hazardous.
+    :param compiled: Whether to fuse the filters into a `CompiledQuery`.
     :return: A collection of filters for use with `query`.
     """
     filters = []
@@ -336,6 +996,12 @@ def create_filters(date=None, start_date=None, end_date=None,
     if end_date:
         filters.append(DateFilter.before(end_date))
 
+    # time filters
+    if start_time:
+        filters.append(TimeFilter.after(start_time))
+    if end_time:
+        filters.append(TimeFilter.before(end_time))
+
     # distance filters
     if distance_min:
         filters.append(DistanceFilter.distance_min_filter(distance_min))
@@ -358,6 +1024,31 @@ def create_filters(date=None, start_date=None, end_date=None,
     if hazardous is not None:
         filters.append(HazardousFilter.hazardous_filter(hazardous))
 
+    # merge the bounds on each attribute and drop the redundant ones
+    filters = Conjunction(filters).filters()
+    return CompiledQuery(filters) if compiled else filters
+
+
+def filters_from_args(args):
+    """Create a collection of filters from the parsed arguments of a `query`.
+
+    If a `--where` expression was given, the result is a filter expression that
+    requires both the expression and the other filters to match.
+
+    :param args: All arguments from the command line, as parsed by the query parser.
+    :return: A collection of filters (or a filter expression) for use with
+    `NEODatabase.query`.
+    """
+    filters = create_filters(
+        date=args.date, start_date=args.start_date, end_date=args.end_date,
+        start_time=args.start_time, end_time=args.end_time,
+        distance_min=args.distance_min, distance_max=args.distance_max,
+        velocity_min=args.velocity_min, velocity_max=args.velocity_max,
+        diameter_min=args.diameter_min, diameter_max=args.diameter_max,
+        hazardous=args.hazardous
+    )
+    if args.where is not None:
+        return And(args.where, *filters)
     return filters
 
 
@@ -9,10 +9,22 @@ The `datetime_to_str` function converts a Python `datetime` into a string.
 Although `datetime`s already have human-readable string representations, those
 representations display seconds, but NASA's data (and our datetimes!) don't
 provide that level of resolution, so the output format also will not.
+
+The `datetime_to_minutes` and `minutes_to_datetime` functions convert between
+datetimes and integer time keys - whole minutes since the Unix epoch - which
+close approaches precompute so that they can be compared without creating any
+objects. The `ordinal_to_minutes` function converts a date ordinal (as given
+by `date.toordinal`) to the time key of its midnight.
 """
 import datetime
 
 
+# The time keys of datetimes count minutes since this epoch.
+EPOCH = datetime.datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+
 def cd_to_datetime(calendar_date):
     """Convert a NASA-formatted calendar date/time description into a datetime.
 
@@ -42,3 +54,30 @@ def datetime_to_str(dt):
     :return: That datetime, as a human-readable string without seconds.
     """
     return datetime.datetime.strftime(dt, "%Y-%m-%d %H:%M")
+
+
+def datetime_to_minutes(dt):
+    """Convert a naive Python datetime into an integer time key.
+
+    :param dt: A naive Python datetime.
+    :return: The number of whole minutes between the Unix epoch and `dt`.
+    """
+    return (dt.toordinal() - _EPOCH_ORDINAL) * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+
+def minutes_to_datetime(minutes):
+    """Convert an integer time key back into a naive Python datetime.
+
+    :param minutes: A number of minutes since the Unix epoch.
+    :return: The corresponding naive `datetime`.
+    """
+    return EPOCH + datetime.timedelta(minutes=minutes)
+
+
+def ordinal_to_minutes(ordinal):
+    """Convert a date ordinal into the time key of that date's midnight.
+
+    :param ordinal: A proleptic Gregorian ordinal, as given by `date.toordinal`.
+    :return: The number of minutes between the Unix epoch and that midnight.
+    """
+    return (ordinal - _EPOCH_ORDINAL) * MINUTES_PER_DAY
@@ -5,10 +5,12 @@ See `README.md` for a detailed discussion of this project.
 
 This script can be invoked from the command line::
 
-    $ python3 main.py {inspect,query,interactive} [args]
+    $ python3 main.py {inspect,query,interactive,serve,batch,daemon} [args]
 
 The `inspect` subcommand looks up an NEO by name or by primary designation, and
-optionally lists all of that NEO's known close approaches:
+optionally lists all of that NEO's known close approaches. It only reads that
+NEO from the data files (the first `--verbose` inspection indexes the close
+approach file, in `cad.json.idx`, to find an NEO's close approaches quickly):
 
     $ python3 main.py inspect --pdes 1P
     $ python3 main.py inspect --name Halley
@@ -22,32 +24,124 @@ The `query` subcommand searches for close approaches that match given criteria:
     $ python3 main.py query --date 2020-03-14 --max-velocity 25 --min-diameter 0.5 --hazardous
     $ python3 main.py query --start-date 2000-01-01 --max-diameter 0.1 --not-hazardous
     $ python3 main.py query --hazardous --max-distance 0.05 --min-velocity 30
+    $ python3 main.py query --start-time "2020-01-01 06:00" --end-time "2020-01-01 18:00"
 
-The set of results can be limited in size and/or saved to an output file in CSV
-or JSON format:
+More complex criteria can be given as a boolean expression with `--where`,
+which is combined with any other filters:
+
+    $ python3 main.py query --where "hazardous or diameter > 1"
+    $ python3 main.py query --start-date 2020-01-01 --where "not (distance > 0.1 or velocity < 10)"
+
+Results are printed as sentences, or as tab-separated values for other tools:
+
+    $ python3 main.py query --start-date 2020-01-01 --limit 0 --tsv | cut -f 1,4
+
+The set of results can be limited in size and/or saved to an output file in CSV,
+JSON or JSON Lines (one close approach per line) format:
 
     $ python3 main.py query --limit 5 --outfile results.csv
     $ python3 main.py query --limit 15 --outfile results.json
+    $ python3 main.py query --start-date 2020-01-01 --outfile results.jsonl
+
+With NumPy (or PyArrow) installed, the results can also be saved as typed
+columns, ready to load into a dataframe:
+
+    $ python3 main.py query --start-date 2020-01-01 --outfile results.npz
+    $ python3 main.py query --start-date 2020-01-01 --outfile results.arrow
+
+To see how a query is evaluated - its normalized filters, access path, predicate
+order, estimated and actual rows scanned, and the time of each stage - without
+outputting any results, add `--explain` (or use `explain` in the interactive
+shell):
+
+    $ python3 main.py query --start-date 2020-01-01 --max-distance 0.05 --explain
+
+When a limited page of results printed to stdout is full, a cursor for the
+next page is printed to stderr. The same query with `--after` resumes right
+after the last result:
+
+    $ python3 main.py query --hazardous --limit 20 --after MTIzNDU2Nzg6NDMz
+
+Many queries - one set of query options per line of a file, each with its own
+`--limit` and `--outfile` - can be evaluated together in a single pass:
+
+    $ python3 main.py query --batch reports.txt
+
+The `batch` subcommand instead runs a file of whole `inspect` and `query`
+commands (see `batch.py`), in parallel, and then prints a table of the
+latency and number of rows of each:
 
-The `interactive` subcommand loads the NEO database and spawns an interactive
-command shell that can repeatedly execute `inspect` and `query` commands without
-having to wait to reload the database each time. However, it doesn't hot-reload.
+    $ python3 main.py batch reports.txt --workers 8
+
+Large exports can be written on a background thread, while the query is still
+being evaluated, and the time spent on each can be reported:
+
+    $ python3 main.py query --outfile results.csv --pipeline --timings
+
+Output files are compressed when their name ends with `.gz`, `.xz` or `.bz2`
+(or `.zst`, with zstandard installed), optionally on a separate thread:
+
+    $ python3 main.py query --outfile results.csv.gz --compression-level 6
+    $ python3 main.py query --outfile results.jsonl.xz --compression-thread --pipeline
+
+Large outputs can be split into shards - by year, by number of results or by
+size in MiB - that are written in parallel and listed in a manifest file
+(`results-manifest.json`):
+
+    $ python3 main.py query --outfile results.csv --shard-by year
+    $ python3 main.py query --outfile results.jsonl.gz --shard-by size --shard-size 64
+
+The `interactive` subcommand spawns an interactive command shell that can
+repeatedly execute `inspect` and `query` commands without having to wait to
+reload the database each time. The shell starts immediately, and loads the data
+files in the background: `inspect` runs as soon as the NEOs are loaded, while
+commands that need close approaches wait for them - or, with `--partial`, run
+against those loaded so far. When the data files change, it reloads them in the
+background and swaps in the new data between commands. However, it doesn't
+hot-reload its own code. Within the shell, `timing on` reports the time and the
+rows scanned and returned by each command, and `profile <command>` lists the
+functions that a command spent the most time in.
+
+The `serve` subcommand keeps the NEO database loaded and serves `inspect` and
+`query` requests over HTTP (see `server.py`), on localhost or a Unix socket:
+
+    $ python3 main.py serve --port 8000
+    $ curl 'http://localhost:8000/query?start-date=2020-01-01&hazardous&limit=5'
+
+The `daemon` subcommand keeps the NEO database loaded in the background (see
+`daemon.py`). While it runs, `inspect` and `query` commands are forwarded to it
+and answered in milliseconds, with the same output; without it, or with
+`--no-daemon`, they load the data files themselves:
+
+    $ python3 main.py daemon &
+    $ python3 main.py query --date 2020-01-01
 
 If needed, the script can load data from data files other than the default with
 `--neofile` or `--cadfile`.
 """
 import argparse
 import cmd
+import collections
+import cProfile
 import datetime
 import pathlib
+import pstats
 import shlex
+import signal
 import sys
+import threading
 import time
 
-from extract import load_neos, load_approaches
-from database import NEODatabase
-from filters import create_filters, limit
-from write import write_to_csv, write_to_json
+from extract import (load_neos, load_approaches, load_approaches_in_chunks, find_neo,
+                     load_approaches_of, file_signature)
+from database import BLOCK_SIZE, NEODatabase, InvalidCursorError, make_cursor, parse_cursor
+from filters import filters_from_args, limit, parse_where, InvalidExpressionError
+from helpers import datetime_to_str
+from batch import WORKERS as BATCH_WORKERS, read_commands, run_batch
+from daemon import SOCKET_PATH, NEODaemon, forward
+from server import serve
+from write import (COMPRESSORS, SHARD_SIZES, WRITERS, render, write_in_background, write_shards,
+                   writer_for)
 
 
 # Paths to the root of the project and the `data` subfolder.
@@ -56,6 +150,12 @@ DATA_ROOT = PROJECT_ROOT / 'data'
 
 # The current time, for use with the kill-on-change feature of the interactive shell.
 _START = time.time()
+# How often the interactive shell checks whether its data files changed, in seconds.
+DATA_POLL_INTERVAL = 2
+# The number of functions listed by the interactive shell's `profile` command.
+PROFILE_LINES = 15
+# How often the interactive shell updates its progress while waiting for data, in seconds.
+PROGRESS_INTERVAL = 0.2
 
 
 def date_fromisoformat(date_string):
@@ -73,6 +173,61 @@ def date_fromisoformat(date_string):
         raise argparse.ArgumentTypeError(f"'{date_string}' is not a valid date. Use YYYY-MM-DD.")
 
 
+def datetime_fromisoformat(datetime_string):
+    """Return a naive `datetime.datetime` for a string in YYYY-MM-DD HH:MM format.
+
+    A `T` may separate the date and the time instead of a space.
+
+    :param datetime_string: A date and time in the format YYYY-MM-DD HH:MM.
+    :return: A `datetime.datetime` corresponding to the given string.
+    """
+    try:
+        return datetime.datetime.strptime(datetime_string.replace('T', ' '), '%Y-%m-%d %H:%M')
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"'{datetime_string}' is not a valid time. Use YYYY-MM-DD HH:MM.")
+
+
+def where_expression(text):
+    """Return a filter expression parsed from a `--where` option.
+
+    :param text: A boolean filter expression, such as `hazardous or diameter > 1`.
+    :return: The parsed filter expression.
+    """
+    try:
+        return parse_where(text)
+    except InvalidExpressionError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+
+def non_negative_int(text):
+    """Return a non-negative integer parsed from an option, such as `--limit`.
+
+    :param text: A whole number, such as `20`.
+    :return: The number, as an `int`.
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a whole number.")
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"'{text}' is negative.")
+    return value
+
+
+def cursor(text):
+    """Validate a pagination cursor given to `--after`.
+
+    :param text: A cursor, as printed after a full page of results.
+    :return: The cursor, unchanged.
+    """
+    try:
+        parse_cursor(text)
+    except InvalidCursorError as err:
+        raise argparse.ArgumentTypeError(str(err))
+    return text
+
+
 def make_parser():
     """Create an ArgumentParser for this script.
 
@@ -88,7 +243,17 @@ def make_parser():
                         help="Path to CSV file of near-Earth objects.")
     parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
                         type=pathlib.Path,
-                        help="Path to JSON file of close approach data.")
+                        help="Path to JSON file of close approach data, or to a JSON "
+                             "Lines file (.jsonl or .ndjson) of close approaches.")
+
+    # Add arguments for the background daemon.
+    parser.add_argument('--daemon-socket', default=SOCKET_PATH, type=pathlib.Path,
+                        help="Path to the Unix socket of the NEO daemon. Defaults to "
+                             "$NEO_DAEMON_SOCKET, or a socket in $XDG_RUNTIME_DIR or in a "
+                             "private directory of the temporary directory.")
+    parser.add_argument('--no-daemon', action='store_true',
+                        help="If specified, load the data files even if an NEO daemon "
+                             "is running.")
     subparsers = parser.add_subparsers(dest='cmd')
 
     # Add the `inspect` subcommand parser.
@@ -118,6 +283,12 @@ def make_parser():
     filters.add_argument('-e', '--end-date', type=date_fromisoformat,
                          help="Only return close approaches on or before the given date, "
                               "in YYYY-MM-DD format (e.g. 2020-12-31).")
+    filters.add_argument('--start-time', type=datetime_fromisoformat,
+                         help="Only return close approaches at or after the given time, "
+                              "in YYYY-MM-DD HH:MM format (e.g. '2020-12-31 18:30').")
+    filters.add_argument('--end-time', type=datetime_fromisoformat,
+                         help="Only return close approaches at or before the given time, "
+                              "in YYYY-MM-DD HH:MM format (e.g. '2020-12-31 18:30').")
     filters.add_argument('--min-distance', dest='distance_min', type=float,
                          help="In astronomical units. Only return close approaches that "
                               "pass as far or farther away from Earth as the given distance.")
@@ -144,22 +315,95 @@ def make_parser():
     filters.add_argument('--not-hazardous', dest='hazardous', default=None, action='store_false',
                          help="If specified, only return close approaches of NEOs that "
                               "are not potentially hazardous.")
-    query.add_argument('-l', '--limit', type=int,
+    filters.add_argument('-w', '--where', type=where_expression,
+                         help="Only return close approaches that match a boolean expression "
+                              "of comparisons on date (YYYY-MM-DD), time (YYYY-MM-DDTHH:MM), "
+                              "distance, velocity, diameter and hazardous, combined with "
+                              "and, or, not and parentheses (e.g. 'hazardous or diameter > 1' "
+                              "or 'time >= 2020-01-01T12:00').")
+    query.add_argument('-l', '--limit', type=non_negative_int,
                        help="The maximum number of matches to return. "
                             "Defaults to 10 if no --outfile is given.")
+    query.add_argument('-a', '--after', type=cursor,
+                       help="Resume after the last result of a previous page, given the "
+                            "cursor printed with that page.")
+    query.add_argument('--tsv', action='store_true',
+                       help="If specified, print results as tab-separated values (with "
+                            "a header line) instead of sentences.")
     query.add_argument('-o', '--outfile', type=pathlib.Path,
-                       help="File in which to save structured results. "
-                            "If omitted, results are printed to standard output.")
+                       help="File in which to save structured results, as .csv, .json, "
+                            ".jsonl or .ndjson (or as .npz with NumPy, or .arrow with "
+                            "PyArrow). A further .gz, .xz or .bz2 extension (or .zst with "
+                            "zstandard) compresses the file. If omitted, results are "
+                            "printed to standard output.")
+    query.add_argument('--compression-level', type=int,
+                       help="The level with which to compress the output file, if its "
+                            "extension asks for it. Defaults to the compressor's default.")
+    query.add_argument('--compression-thread', action='store_true',
+                       help="If specified, compress the output file on a separate thread.")
+    query.add_argument('--shard-by', choices=tuple(SHARD_SIZES),
+                       help="If specified, split the output file into shards (such as "
+                            "results-2020.csv or results-0001.csv) by year, by number "
+                            "of results or by size, and list them in a manifest.")
+    query.add_argument('--shard-size', type=int,
+                       help="The number of results in each shard with --shard-by count "
+                            f"(default {SHARD_SIZES['count']}), or the approximate size of "
+                            "each shard in MiB with --shard-by size "
+                            f"(default {SHARD_SIZES['size'] // 2 ** 20}).")
+    query.add_argument('--pipeline', action='store_true',
+                       help="If specified, write the output file on a background thread "
+                            "while the query is still being evaluated. Requires --outfile.")
+    query.add_argument('--timings', action='store_true',
+                       help="If specified, print how long evaluating the query and "
+                            "writing the results took to standard error.")
+    instead = query.add_mutually_exclusive_group()
+    instead.add_argument('-b', '--batch', type=pathlib.Path,
+                         help="File of queries to run instead, one set of query options per "
+                              "line (each with its own --limit and --outfile). All of the "
+                              "queries are evaluated in a single pass over the database.")
+    instead.add_argument('--explain', action='store_true',
+                         help="If specified, print how the query is evaluated - the "
+                              "normalized filters, the access path, the order of the "
+                              "predicates, the estimated and actual rows scanned and the "
+                              "time of each stage - instead of the results.")
 
     repl = subparsers.add_parser('interactive',
                                  description="Start an interactive command session "
                                              "to repeatedly run `interact` and `query` commands.")
     repl.add_argument('-a', '--aggressive', action='store_true',
                       help="If specified, kill the session whenever a project file is modified.")
+    repl.add_argument('--partial', action='store_true',
+                      help="If specified, run commands against the close approaches loaded so "
+                           "far while the data files load, rather than waiting for all of them.")
+
+    serve_parser = subparsers.add_parser('serve',
+                                         description="Serve `inspect` and `query` requests "
+                                                     "over HTTP, streaming results as JSON Lines.")
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help="The interface on which to listen. Defaults to localhost.")
+    serve_parser.add_argument('--port', type=int, default=8000,
+                              help="The TCP port on which to listen. Defaults to 8000.")
+    serve_parser.add_argument('--socket', type=pathlib.Path,
+                              help="If specified, listen on a Unix socket at this path instead.")
+
+    batch = subparsers.add_parser('batch',
+                                  description="Run a file of `inspect` and `query` commands, "
+                                              "one per line, in parallel against the "
+                                              "database, and summarize them.")
+    batch.add_argument('file', type=pathlib.Path,
+                       help="The file of commands, each as it would be given to this script "
+                            "(e.g. 'query --date 2020-01-01 --outfile jan1.csv').")
+    batch.add_argument('--workers', type=int, default=BATCH_WORKERS,
+                       help=f"The number of commands to run at a time (default {BATCH_WORKERS}).")
+
+    subparsers.add_parser('daemon',
+                          description="Keep the NEO database loaded in the background, and "
+                                      "run the `inspect` and `query` commands sent to "
+                                      "the --daemon-socket.")
     return parser, inspect, query
 
 
-def inspect(database, pdes=None, name=None, verbose=False):
+def inspect(database, pdes=None, name=None, verbose=False, stats=None):
     """Perform the `inspect` subcommand.
 
     This function fetches an NEO by designation or by name. If a matching NEO is
@@ -174,6 +418,10 @@ def inspect(database, pdes=None, name=None, verbose=False):
     :param pdes: The primary designation of an NEO for which to search.
     :param name: The name of an NEO for which to search.
     :param verbose: Whether to additionally print all of a matching NEO's close approaches.
+    :param stats: A dictionary, such as a `collections.Counter`, to which to add
+    the number of rows (the NEO and any close approaches printed) scanned and
+    returned, or None. The NEO is looked up rather than scanned for, so these
+    are the same.
     :return: The matching `NearEarthObject`, or None if not found.
     """
     # Fetch the NEO of interest.
@@ -185,17 +433,20 @@ def inspect(database, pdes=None, name=None, verbose=False):
     # Ensure that we have received an NEO.
     if not neo:
         print("No matching NEOs exist in the database.", file=sys.stderr)
-        return None
+    else:
+        # Display information about this NEO, and optionally its close approaches if verbose.
+        print(neo)
+        if verbose:
+            render(neo.approaches, sys.stdout, prefix='- ')
 
-    # Display information about this NEO, and optionally its close approaches if verbose.
-    print(neo)
-    if verbose:
-        for approach in neo.approaches:
-            print(f"- {approach}")
-    return neo
+    if stats is not None:
+        rows = 0 if not neo else 1 + len(neo.approaches) if verbose else 1
+        stats['scanned'] += rows
+        stats['returned'] += rows
+    return neo or None
 
 
-def query(database, args):
+def query(database, args, stats=None):
     """Perform the `query` subcommand.
 
     Create a collection of filters with `create_filters` and supply them to the
@@ -203,35 +454,425 @@ def query(database, args):
 
     If an output file wasn't given, print these results to stdout, limiting to
     10 entries if no limit was specified. If an output file was given, use the
-    file's extension to infer whether the file should hold CSV or JSON data, and
-    then write the results to the output file in that format.
+    file's extension to infer whether the file should hold CSV, JSON or JSON
+    Lines data, and then write the results to the output file in that format.
+
+    If the results were printed and the limit was reached, print a cursor with
+    which the same query resumes right after the last result (with `--after`)
+    to stderr. With `--timings`, also print how the time was split between
+    evaluating the query and writing the results to stderr.
+
+    If a batch file was given, run all of the queries in it instead. With
+    `--explain`, print how the query is evaluated instead of the results.
 
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param stats: A dictionary, such as a `collections.Counter`, to which to add
+    the number of close approaches scanned and returned (under `'scanned'` and
+    `'returned'`), or None. Batches aren't counted.
     """
+    if args.batch:
+        query_batch(database, args.batch)
+        return
+    if args.explain:
+        explain(database, args, stats)
+        return
+
     # Construct a collection of filters from arguments supplied at the command line.
-    filters = create_filters(
-        date=args.date, start_date=args.start_date, end_date=args.end_date,
-        distance_min=args.distance_min, distance_max=args.distance_max,
-        velocity_min=args.velocity_min, velocity_max=args.velocity_max,
-        diameter_min=args.diameter_min, diameter_max=args.diameter_max,
-        hazardous=args.hazardous
-    )
+    filters = filters_from_args(args)
     # Query the database with the collection of filters.
-    results = database.query(filters)
+    start = time.perf_counter()
+    results = database.query(filters, after=args.after, stats=stats)
+    timings = collections.defaultdict(float) if args.timings else None
+    if timings is not None:
+        results = timed(results, timings)
+    n = output_limit(args)
+    page = Page(limit(results, n))
+    output(page, args, timings)
+    if n and page.count == n and not args.outfile:
+        print(f"Next page: --after {make_cursor(page.last)}", file=sys.stderr)
+    if stats is not None:
+        stats['returned'] += page.count
+    if timings is not None:
+        report_timings(timings, time.perf_counter() - start, page.count)
+
+
+def explain(database, args, stats=None):
+    """Perform the `query` subcommand with `--explain`.
+
+    The query is planned and run as `query` would (with the same limit), but
+    instead of outputting the results, print its plan: the normalized filters,
+    the access path, the order in which the predicates are evaluated, the
+    estimated and actual numbers of close approaches scanned, and the time
+    taken by each stage.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param stats: A dictionary to which to add the number of close approaches
+    scanned and returned, or None.
+    """
+    filters = filters_from_args(args)
+    stages = collections.OrderedDict()
+    start = time.perf_counter()
+    plan = database.plan(filters, after=args.after)
+    stages['plan'] = time.perf_counter() - start
+    if plan.vectorized:
+        # built on first use, and then cached for every later query
+        start = time.perf_counter()
+        plan.snapshot.columns()
+        stages['columns'] = time.perf_counter() - start
+    counts = collections.Counter()
+    n = output_limit(args)
+    start = time.perf_counter()
+    returned = sum(1 for _ in limit(database.execute(plan, counts), n))
+    stages['scan'] = time.perf_counter() - start
+
+    print("Filters (normalized, any of):" if len(plan.conjunctions) > 1 else "Filters (normalized):")
+    for number, conjunction in enumerate(plan.conjunctions, start=1):
+        description = ' and '.join(map(repr, conjunction.filters())) or "none"
+        skipped = " - contradictory, skipped" if conjunction.empty else ""
+        print(f"  {number}. {description}{skipped}")
+    ranges = ', '.join(f"[{start:,}, {stop:,})" for start, stop in plan.ranges)
+    total = len(plan.snapshot.approaches)
+    if plan.access_path == 'time slice':
+        print(f"Access path: time slice - rows {ranges} of the {total:,} in the time index")
+    else:
+        print(f"Access path: {plan.access_path} - of {total:,} close approaches")
+    if plan.vectorized:
+        print(f"Evaluation: vectorized, in blocks of {BLOCK_SIZE:,} close approaches")
+    else:
+        print("Evaluation: one close approach at a time, stopping at the first failing predicate")
+    print("Predicate order:")
+    for number, predicate in enumerate(plan.predicate_order(), start=1):
+        print(f"  {number}. {predicate!r}")
+    print(f"Rows scanned: {plan.estimated_rows:,} estimated, {counts['scanned']:,} actual")
+    print(f"Rows returned: {returned:,}" + (f" (limit {n:,})" if n else ""))
+    print("Time: " + ', '.join(f"{stage} {seconds:.3f} s" for stage, seconds in stages.items())
+          + f", total {sum(stages.values()):.3f} s")
+
+    if stats is not None:
+        stats['scanned'] += counts['scanned']
+        stats['returned'] += returned
+
+
+def timed(results, timings):
+    """Pass through a stream of results, timing how long they take to produce.
+
+    The time is added to `timings['query']`.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param timings: A `collections.defaultdict(float)` of times in seconds.
+    :return: A generator of the same results.
+    """
+    results = iter(results)
+    while True:
+        start = time.perf_counter()
+        result = next(results, None)
+        timings['query'] += time.perf_counter() - start
+        if result is None:
+            return
+        yield result
+
+
+def report_timings(timings, total, count):
+    """Print the breakdown of the time taken by a `query` to stderr.
+
+    :param timings: A dictionary of times in seconds, by stage.
+    :param total: The wall time of the whole query in seconds.
+    :param count: The number of results output.
+    """
+    # without a background writer, whatever wasn't spent on the query was spent writing
+    write = timings['write'] if 'write' in timings else total - timings['query']
+    print(f"Query: {timings['query']:.3f} s, write: {write:.3f} s, "
+          f"total: {total:.3f} s for {count} results", file=sys.stderr)
+    if 'wait' in timings:
+        print(f"(waited {timings['wait']:.3f} s for the background writer)", file=sys.stderr)
+
+
+class Page:
+    """Pass through a stream of results, counting them and keeping the last one."""
+
+    def __init__(self, results):
+        """Create a new `Page` of results.
+
+        :param results: An iterable of `CloseApproach` objects.
+        """
+        self.results = results
+        self.count = 0
+        self.last = None
+
+    def __iter__(self):
+        """Generate the results, keeping track of how many were consumed."""
+        for result in self.results:
+            self.count += 1
+            self.last = result
+            yield result
 
+
+def output_limit(args):
+    """Return the maximum number of results to output for a `query`.
+
+    :param args: All arguments from the command line, as parsed by the query parser.
+    :return: The limit, defaulting to 10 if no output file was given, where
+    0 or None means no limit.
+    """
+    return args.limit if args.outfile else args.limit or 10
+
+
+def output(results, args, timings=None):
+    """Print the (already limited) results of a `query` or save them to a file.
+
+    With `--pipeline`, the file is written on a background thread. With
+    `--shard-by`, the results are split into several files, written in
+    parallel. If the name ends with a compression extension too (such as
+    `results.csv.gz`), the files are compressed as they're written.
+
+    :param results: An iterable of matching `CloseApproach` objects.
+    :param args: All arguments from the command line, as parsed by the query parser.
+    :param timings: A dictionary to which to add the time spent by a background
+    writer, or `None`.
+    """
     if not args.outfile:
-        # Write the results to stdout, limiting to 10 entries if not specified.
-        for result in limit(results, args.limit or 10):
-            print(result)
+        # Write the results to stdout, in chunks.
+        render(results, sys.stdout, tsv=args.tsv)
     else:
-        # Write the results to a file.
-        if args.outfile.suffix == '.csv':
-            write_to_csv(limit(results, args.limit), args.outfile)
-        elif args.outfile.suffix == '.json':
-            write_to_json(limit(results, args.limit), args.outfile)
+        # Write the results to a file, in the format given by its extension.
+        writer = writer_for(args.outfile)
+        options = {'level': args.compression_level, 'threaded': args.compression_thread}
+        if writer is None:
+            extensions = ', '.join(f"`{extension}`" for extension in WRITERS)
+            compressions = ', '.join(f"`{extension}`" for extension in COMPRESSORS)
+            print(f"Please use an output file that ends with one of {extensions}, "
+                  f"optionally followed by one of {compressions}.", file=sys.stderr)
+        elif args.shard_by:
+            shard_size = args.shard_size
+            if shard_size and args.shard_by == 'size':
+                shard_size *= 2 ** 20
+            shards = write_shards(writer, results, args.outfile, args.shard_by, shard_size, **options)
+            print(f"Wrote {len(shards)} shards, listed in the manifest.", file=sys.stderr)
+        elif args.pipeline:
+            write_in_background(writer, results, args.outfile, timings, **options)
         else:
-            print("Please use an output file that ends with `.csv` or `.json`.", file=sys.stderr)
+            writer(results, args.outfile, **options)
+
+
+def read_batch(batch_file):
+    """Parse the queries in a batch file.
+
+    Each non-blank line of the file holds the options of one `query`, exactly
+    as they would be given at the command line. Lines starting with `#` are
+    comments. Lines that can't be parsed, or that page with `--after`, are
+    reported and skipped.
+
+    :param batch_file: A path to the batch file.
+    :return: A list of (line number, parsed arguments) tuples.
+    """
+    _, _, query_parser = make_parser()
+    queries = []
+    with open(batch_file) as infile:
+        for number, line in enumerate(infile, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            args = NEOShell.parse_arg_with(line, query_parser)
+            if args is None or args.batch or args.after:
+                print(f"{batch_file}:{number}: skipping invalid query.", file=sys.stderr)
+                continue
+            queries.append((number, args))
+    return queries
+
+
+def query_batch(database, batch_file):
+    """Run every query in a batch file with a single pass over the database.
+
+    All of the queries are evaluated together by `NEODatabase.query_many`,
+    each with its own limit, and then each query's results are printed or
+    saved to its own output file.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param batch_file: A path to a file of queries, one per line.
+    """
+    try:
+        queries = read_batch(batch_file)
+    except OSError as err:
+        print(f"Unable to read the batch file: {err}", file=sys.stderr)
+        return
+    all_results = database.query_many([filters_from_args(args) for _, args in queries],
+                                      [output_limit(args) for _, args in queries])
+    for (number, args), results in zip(queries, all_results):
+        if not args.outfile:
+            print(f"# {batch_file}:{number}")
+        output(results, args)
+
+
+class DataLoader:
+    """Load the data files of the interactive shell on a background thread.
+
+    The `.database` exists from the start, but is empty until the NEOs are
+    loaded (`.neos_loaded` is set). The close approaches are then read in
+    chunks, in the order of the file, and ingested one chunk at a time until
+    `.finished` is set - so standing queries stay current throughout, and a
+    time-ordered file (such as `cad.json`) is loaded as a growing prefix in
+    time.
+    """
+
+    def __init__(self, neofile, cadfile):
+        """Create a new `DataLoader`.
+
+        Creating this object doesn't start loading - for that, use `.start()`.
+
+        :param neofile: The path of the CSV file of NEOs.
+        :param cadfile: The path of the file of close approaches.
+        """
+        self.files = (neofile, cadfile)
+        self.database = NEODatabase([], [])
+        self.neos_loaded = threading.Event()
+        self.finished = threading.Event()
+        # the number of close approaches ingested, the latest of their times,
+        # and the fraction of the close approach file read
+        self.count = 0
+        self.through = None
+        self.progress = 0.0
+        self.seconds = None
+        self.error = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.load, daemon=True)
+
+    def start(self):
+        """Start loading the data files on a background thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop loading the data files, after the chunk in progress."""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def load(self):
+        """Load the NEOs, and then the close approaches a chunk at a time."""
+        start = time.perf_counter()
+        try:
+            self.database.reload(load_neos(self.files[0]), ())
+            self.neos_loaded.set()
+            for approaches, progress in load_approaches_in_chunks(self.files[1]):
+                if self._stopped.is_set():
+                    return
+                self.database.ingest(approaches)
+                if approaches:
+                    latest = max(approach.time for approach in approaches)
+                    self.through = max(self.through or latest, latest)
+                self.count += len(approaches)
+                self.progress = progress
+        except (OSError, ValueError, KeyError) as err:
+            self.error = err
+        finally:
+            self.seconds = time.perf_counter() - start
+            self.neos_loaded.set()
+            self.finished.set()
+
+    def describe(self):
+        """Describe how much of the data has been loaded so far, as a string."""
+        if not self.neos_loaded.is_set():
+            return "loading NEOs"
+        through = f", through {datetime_to_str(self.through)}" if self.through else ""
+        return f"{self.progress:.0%} ({self.count:,} close approaches{through})"
+
+
+class DataReloader:
+    """Reload the data files of the interactive shell in the background when they change.
+
+    A daemon thread polls the size and modification time of the data files.
+    When they change, it loads them into a new `NEODatabase` - with the same
+    standing queries as the shell's database - which the shell collects with
+    `.take()` and swaps in between commands.
+    """
+
+    # The outcome of a reload: the new database (or None, if the files couldn't
+    # be loaded), the standing queries it was built with, how long it took and
+    # any error.
+    Result = collections.namedtuple('Result', 'database standing_queries seconds error')
+
+    def __init__(self, neofile, cadfile, database, interval=DATA_POLL_INTERVAL):
+        """Create a new `DataReloader`.
+
+        Creating this object doesn't start watching - for that, use `.start()`.
+
+        :param neofile: The path of the CSV file of NEOs.
+        :param cadfile: The path of the file of close approaches.
+        :param database: The `NEODatabase` that was loaded from these files.
+        :param interval: How often to check the files for changes, in seconds.
+        """
+        self.files = (neofile, cadfile)
+        self.database = database
+        self.interval = interval
+        self.signatures = self.signature()
+        # the result of the latest reload that hasn't been taken, handed over
+        # from the watching thread under the lock
+        self.result = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.watch, daemon=True)
+
+    def start(self):
+        """Start watching the data files on a background thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching the data files, waiting for a reload in progress."""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def signature(self):
+        """Return the signatures of the data files, as given by `file_signature`."""
+        return tuple(map(file_signature, self.files))
+
+    def watch(self):
+        """Reload the data files whenever they change, until stopped."""
+        while not self._stopped.wait(self.interval):
+            signatures = self.signature()
+            if signatures != self.signatures and None not in signatures:
+                self.signatures = signatures
+                self.offer(self.reload())
+
+    def reload(self):
+        """Load the data files into a new database, with the current standing queries.
+
+        :return: A `DataReloader.Result`.
+        """
+        start = time.perf_counter()
+        standing_queries = self.database.standing_queries
+        try:
+            database = NEODatabase(load_neos(self.files[0]), load_approaches(self.files[1]))
+            for standing_query in standing_queries.values():
+                database.register_standing_query(standing_query.name, standing_query.filters)
+        except (OSError, ValueError, KeyError) as err:
+            # such as a file that is still being written - retry when it changes again
+            return self.Result(None, standing_queries, time.perf_counter() - start, err)
+        return self.Result(database, standing_queries, time.perf_counter() - start, None)
+
+    def offer(self, result):
+        """Hand the result of a finished reload over to `.take()`.
+
+        A result that hasn't been taken yet is replaced, since the new one was
+        loaded from more recent files.
+
+        :param result: A `DataReloader.Result`.
+        """
+        with self._lock:
+            self.result = result
+
+    def take(self):
+        """Collect the result of a finished reload, at most once.
+
+        :return: A `DataReloader.Result`, or None if no reload finished since
+        the last call.
+        """
+        with self._lock:
+            result, self.result = self.result, None
+        if result is not None and result.database is not None:
+            self.database = result.database
+        return result
 
 
 class NEOShell(cmd.Cmd):
@@ -244,14 +885,22 @@ class NEOShell(cmd.Cmd):
 
     The primary purpose of this shell is to allow users to repeatedly perform
     inspect and query commands, while only loading the data (which can be quite
-    slow) once.
+    slow) once. If the data files are given, they're watched, and reloaded on a
+    background thread when they change; the new database replaces the old one
+    between commands.
+
+    Given a `DataLoader`, the session starts before the data is loaded. Commands
+    that only need NEOs wait for the NEOs; the others wait for the close
+    approaches too, showing the progress - unless partial results are on, in
+    which case they run against the close approaches loaded so far.
     """
 
     intro = ("Explore close approaches of near-Earth objects. "
              "Type `help` or `?` to list commands and `exit` to exit.\n")
     prompt = '(neo) '
 
-    def __init__(self, database, inspect_parser, query_parser, aggressive=False, **kwargs):
+    def __init__(self, database, inspect_parser, query_parser, aggressive=False,
+                 data_files=None, loader=None, partial=False, **kwargs):
         """Create a new `NEOShell`.
 
         Creating this object doesn't start the session - for that, use `.cmdloop()`.
@@ -260,6 +909,12 @@ class NEOShell(cmd.Cmd):
         :param inspect_parser: The subparser for the `inspect` subcommand.
         :param query_parser: The subparser for the `query` subcommand.
         :param aggressive: Whether to kill the session whenever a project file is changed.
+        :param data_files: The paths of the NEO and close approach files from
+        which the database was loaded, to reload it when they change, or None.
+        :param loader: A `DataLoader` that loads the database in the background
+        (which is then its `.database`), or None.
+        :param partial: Whether to run commands against the close approaches
+        loaded so far, rather than waiting for all of them.
         :param kwargs: A dictionary of excess keyword arguments passed to the superclass.
         """
         super().__init__(**kwargs)
@@ -267,6 +922,10 @@ class NEOShell(cmd.Cmd):
         self.inspect = inspect_parser
         self.query = query_parser
         self.aggressive = aggressive
+        self.reloader = DataReloader(*data_files, database) if data_files else None
+        self.loader = loader
+        self.partial = partial
+        self.timing = False
 
     @classmethod
     def parse_arg_with(cls, arg, parser):
@@ -312,13 +971,17 @@ class NEOShell(cmd.Cmd):
             (neo) inspect --verbose --name Eros
         """
         args = self.parse_arg_with(arg, self.inspect)
-        if not args:
+        if not args or not self.wait_for_data(approaches=args.verbose):
             return
 
         # Run the `inspect` subcommand.
+        stats = collections.Counter() if self.timing else None
+        start = time.perf_counter()
         inspect(self.db,
                 pdes=args.pdes, name=args.name,
-                verbose=args.verbose)
+                verbose=args.verbose, stats=stats)
+        if self.timing:
+            self.report_timing(start, stats)
 
     def do_q(self, arg):
         """Shorthand for `query`."""
@@ -333,25 +996,256 @@ class NEOShell(cmd.Cmd):
             (neo) query --date 2020-01-01
 
         You can use any of the other filters: `--start-date`, `--end-date`,
-        `--min-distance`, `--max-distance`, `--min-velocity`, `--max-velocity`,
+        `--start-time`, `--end-time`, `--min-distance`, `--max-distance`, `--min-velocity`, `--max-velocity`,
         `--min-diameter`, `--max-diameter`, `--hazardous`, `--not-hazardous`.
 
+        A boolean expression of criteria can be given with `--where`, comparing
+        `date` (YYYY-MM-DD), `time` (YYYY-MM-DDTHH:MM), `distance`, `velocity`,
+        `diameter` and `hazardous`:
+
+            (neo) query --where "hazardous or diameter > 1"
+            (neo) query --where "time >= 2020-01-01T12:00 and distance < 0.1"
+
         The number of results shown can be limited to a maximum number with `--limit`:
 
             (neo) query --limit 2
 
+        When a page is full, the cursor printed after it fetches the next page:
+
+            (neo) query --limit 2 --after MTIzNDU2Nzg6NDMz
+
         The results can be saved to a file (instead of displayed to stdout) with
         `--outfile`:
 
             (neo) query --limit 5 --outfile results.csv
             (neo) query --limit 5 --outfile results.json
+            (neo) query --limit 5 --outfile results.jsonl
+
+        A file of queries, one set of options per line, can be run in a single
+        pass over the database with `--batch`:
+
+            (neo) query --batch reports.txt
+
+        To see how a query is evaluated instead of its results, add `--explain`
+        (or use the `explain` command).
+        """
+        args = self.parse_arg_with(arg, self.query)
+        if not args or not self.wait_for_data():
+            return
+
+        # Run the `query` subcommand.
+        stats = collections.Counter() if self.timing else None
+        start = time.perf_counter()
+        query(self.db, args, stats)
+        if self.timing:
+            self.report_timing(start, stats)
+
+    def do_explain(self, arg):
+        """Explain how a query is evaluated within the REPL session.
+
+        This takes the same options as `query`, and runs the query, but prints
+        its plan instead of the results: the normalized filters, the access
+        path (a full scan, or slices of the time index), the order in which
+        the predicates are evaluated, the estimated and actual numbers of rows
+        scanned, and the time of each stage:
+
+            (neo) explain --start-date 2020-01-01 --end-date 2020-01-31 --hazardous
         """
         args = self.parse_arg_with(arg, self.query)
         if not args:
             return
+        if args.batch:
+            print("Unable to explain a batch of queries.", file=sys.stderr)
+            return
+        if not self.wait_for_data():
+            return
+        explain(self.db, args)
 
-        # Run the `inspect` subcommand.
-        query(self.db, args)
+    def do_timing(self, arg):
+        """Turn the timing of commands on or off within the REPL session.
+
+        While timing is on, the wall time of each `inspect` and `query`, and the
+        number of rows (close approaches) it scanned and returned, are printed
+        after it:
+
+            (neo) timing on
+            (neo) query --date 2020-01-01 --max-distance 0.1
+            ...
+            Time: 0.004 s, 13 rows scanned, 10 rows returned.
+            (neo) timing off
+
+        Without an argument, print whether timing is on.
+        """
+        arg = arg.strip().lower()
+        if arg in ('on', 'off'):
+            self.timing = arg == 'on'
+        elif arg:
+            print("Usage: timing [on | off]", file=sys.stderr)
+            return
+        print(f"Timing is {'on' if self.timing else 'off'}.")
+
+    def do_partial(self, arg):
+        """Turn partial results on or off within the REPL session.
+
+        While the data files are still loading, commands that need close
+        approaches wait for all of them. With partial results on, they run
+        against the close approaches loaded so far instead - the earliest
+        ones, as `cad.json` is in time order:
+
+            (neo) partial on
+            (neo) query --hazardous
+            Partial results: 35% (329,000 close approaches, through 1987-05-02 11:44).
+            ...
+
+        Without an argument, print whether partial results are on.
+        """
+        arg = arg.strip().lower()
+        if arg in ('on', 'off'):
+            self.partial = arg == 'on'
+        elif arg:
+            print("Usage: partial [on | off]", file=sys.stderr)
+            return
+        print(f"Partial results are {'on' if self.partial else 'off'}.")
+
+    def wait_for_data(self, approaches=True):
+        """Wait until the data that a command needs has been loaded in the background.
+
+        The NEOs are always waited for. The close approaches are waited for,
+        with the progress shown on stderr, unless partial results are on; then
+        a note of how much has been loaded is printed instead.
+
+        :param approaches: Whether the command needs close approaches, or only NEOs.
+        :return: Whether to run the command - False if the data files couldn't
+        be loaded, or the wait was interrupted with Ctrl-C.
+        """
+        loader = self.loader
+        if loader is None:
+            return True
+        loaded = loader.finished if approaches and not self.partial else loader.neos_loaded
+        waited = False
+        try:
+            while not loaded.wait(PROGRESS_INTERVAL):
+                print(f"\rWaiting for the data files: {loader.describe()} ", end='',
+                      file=sys.stderr, flush=True)
+                waited = True
+        except KeyboardInterrupt:
+            print("\nStopped waiting for the data files.", file=sys.stderr)
+            return False
+        if waited:
+            print(file=sys.stderr)
+        if loader.error:
+            print(f"Unable to load the data files: {loader.error}", file=sys.stderr)
+            return False
+        if approaches and not loader.finished.is_set():
+            print(f"Partial results: {loader.describe()}.", file=sys.stderr)
+        return True
+
+    def report_timing(self, start, stats):
+        """Print the wall time of a command and the rows it scanned and returned to stderr.
+
+        :param start: The `time.perf_counter()` when the command started.
+        :param stats: A dictionary of the numbers of rows `'scanned'` and
+        `'returned'`, or an empty one if they weren't counted.
+        """
+        elapsed = time.perf_counter() - start
+        rows = (f", {stats['scanned']:,} rows scanned, {stats['returned']:,} rows returned"
+                if stats else "")
+        print(f"Time: {elapsed:.3f} s{rows}.", file=sys.stderr)
+
+    def do_profile(self, arg):
+        """Run a command under cProfile within the REPL session.
+
+        After the command's own output, list the functions in which it spent
+        the most time (excluding the functions they called), to find out what
+        makes a query slow:
+
+            (neo) profile query --start-date 2020-01-01 --hazardous --limit 0
+        """
+        command = self.parseline(arg)[0]
+        if not command or command == 'profile':
+            print("Usage: profile COMMAND [ARGS]", file=sys.stderr)
+            return
+        profiler = cProfile.Profile()
+        profiler.runcall(self.onecmd, arg)
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        stats.strip_dirs().sort_stats('tottime').print_stats(PROFILE_LINES)
+
+    def do_standing(self, arg):
+        """Manage and read named standing queries within the REPL session.
+
+        A standing query keeps its matching close approaches materialized, and
+        updates them whenever new close approaches are ingested. Register one
+        with the same filters as `query`:
+
+            (neo) standing add close-pha --hazardous --max-distance 0.05
+
+        List the registered standing queries with their number of results:
+
+            (neo) standing
+            (neo) standing list
+
+        Print the materialized results of a standing query, limited to 10
+        entries unless another limit (0 for no limit) is given:
+
+            (neo) standing show close-pha
+            (neo) standing show close-pha 25
+
+        Remove a standing query:
+
+            (neo) standing drop close-pha
+        """
+        # Split off the action and the name; the rest are options for `add`.
+        action, *rest = arg.split(None, 2) or ['list']
+        if action != 'drop' and not self.wait_for_data():
+            return
+
+        if action == 'list':
+            if not self.db.standing_queries:
+                print("No standing queries are registered.", file=sys.stderr)
+            for standing_query in self.db.standing_queries.values():
+                print(f"{standing_query.name}: {len(standing_query)} close approaches")
+        elif action == 'add' and rest:
+            args = self.parse_arg_with(rest[1] if len(rest) > 1 else '', self.query)
+            if not args:
+                return
+            standing_query = self.db.register_standing_query(rest[0], filters_from_args(args))
+            print(f"{standing_query.name}: {len(standing_query)} close approaches")
+        elif action == 'show' and rest:
+            standing_query = self.db.get_standing_query(rest[0])
+            if standing_query is None:
+                print(f"No standing query is named {rest[0]!r}.", file=sys.stderr)
+                return
+            try:
+                n = int(rest[1]) if len(rest) > 1 else 10
+            except ValueError:
+                print(f"'{rest[1]}' is not a valid limit.", file=sys.stderr)
+                return
+            for result in limit(standing_query, n):
+                print(result)
+        elif action == 'drop' and rest:
+            if self.db.unregister_standing_query(rest[0]) is None:
+                print(f"No standing query is named {rest[0]!r}.", file=sys.stderr)
+        else:
+            print("Usage: standing [list | add NAME [filters] | show NAME [LIMIT] | drop NAME]",
+                  file=sys.stderr)
+
+    def do_ingest(self, arg):
+        """Ingest new close approaches from a JSON file within the REPL session.
+
+        The file must be formatted like `cad.json`, or be a JSON Lines file of
+        close approaches (`.jsonl` or `.ndjson`). The new close approaches are
+        added to the database and to the results of every standing query:
+
+            (neo) ingest data/cad-update.json
+        """
+        if not self.wait_for_data():
+            return
+        try:
+            count = self.db.ingest(load_approaches(arg.strip()))
+        except (OSError, ValueError, KeyError) as err:
+            print(f"Unable to ingest close approaches: {err}", file=sys.stderr)
+            return
+        print(f"Ingested {count} close approaches.")
 
     def do_EOF(self, _arg):
         """Exit the interactive session."""
@@ -361,8 +1255,57 @@ class NEOShell(cmd.Cmd):
     do_exit = do_EOF
     do_quit = do_EOF
 
+    def preloop(self):
+        """Start loading the data files, if they aren't loaded yet, and watching them."""
+        if self.loader:
+            self.loader.start()
+        if self.reloader:
+            self.reloader.start()
+
+    def postloop(self):
+        """Stop loading and watching the data files."""
+        if self.loader:
+            self.loader.stop()
+        if self.reloader:
+            self.reloader.stop()
+
+    def report_loaded(self):
+        """Report that the data files have been loaded in the background, once."""
+        loader = self.loader
+        if loader is None or not loader.finished.is_set() or loader.error:
+            return
+        print(f"Loaded {loader.count:,} close approaches in {loader.seconds:.1f} s.",
+              file=sys.stderr)
+        self.loader = None
+
+    def swap_database(self):
+        """Replace the database with one reloaded in the background, if one is ready."""
+        result = self.reloader.take() if self.reloader else None
+        if result is None:
+            return
+        if result.error:
+            print(f"Unable to reload the data files: {result.error}", file=sys.stderr)
+            return
+        if self.loader:
+            # the reloaded data files supersede the ones still being loaded
+            self.loader.stop()
+            self.loader = None
+        database = result.database
+        before, now = result.standing_queries, self.db.standing_queries
+        if now is not before:
+            # the standing queries changed while reloading: carry the changes over
+            for name in before.keys() - now.keys():
+                database.unregister_standing_query(name)
+            for name, standing_query in now.items():
+                if before.get(name) is not standing_query:
+                    database.register_standing_query(name, standing_query.filters)
+        self.db = database
+        print(f"Reloaded the data files in {result.seconds:.1f} s.", file=sys.stderr)
+
     def precmd(self, line):
-        """Watch for changes to the files in this project."""
+        """Swap in reloaded data, and watch for changes to the files in this project."""
+        self.report_loaded()
+        self.swap_database()
         changed = [f for f in PROJECT_ROOT.glob('*.py') if f.stat().st_mtime > _START]
         if changed:
             print("The following file(s) have been modified since this interactive session began: "
@@ -377,21 +1320,88 @@ class NEOShell(cmd.Cmd):
         return line
 
 
+def run(database, args, stats=None):
+    """Run the `inspect` or `query` subcommand - locally, or for a daemon client or a batch.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param stats: A dictionary to which to add the number of rows scanned and
+    returned, or None.
+    """
+    if args.cmd == 'inspect':
+        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose, stats=stats)
+    elif args.cmd == 'query':
+        query(database, args, stats)
+
+
+def load_database(args):
+    """Load the data that a subcommand needs from the data files into an `NEODatabase`.
+
+    The `inspect` subcommand only needs one NEO, so only that NEO is read -
+    and with `--verbose`, only its close approaches, through the index of the
+    close approach file (see `extract.load_approaches_of`). The other
+    subcommands load everything.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :return: A new `NEODatabase`.
+    """
+    if args.cmd != 'inspect':
+        return NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    neo = find_neo(args.neofile, designation=args.pdes, name=args.name)
+    if neo is None:
+        return NEODatabase([], [])
+    approaches = load_approaches_of(args.cadfile, neo.designation) if args.verbose else []
+    return NEODatabase([neo], approaches)
+
+
 def main():
     """Run the main script."""
     parser, inspect_parser, query_parser = make_parser()
     args = parser.parse_args()
+    if args.cmd == 'query' and not args.outfile:
+        for option, value in (('--pipeline', args.pipeline), ('--shard-by', args.shard_by),
+                              ('--shard-size', args.shard_size)):
+            if value:
+                query_parser.error(f"{option} requires --outfile")
+
+    # Let a running daemon answer from its database, if it can.
+    if args.cmd in ('inspect', 'query') and not args.no_daemon:
+        status = forward(sys.argv[1:], args, args.daemon_socket)
+        if status is not None:
+            sys.exit(status)
+
+    # The interactive shell starts right away, and loads the data files in the background.
+    if args.cmd == 'interactive':
+        loader = DataLoader(args.neofile, args.cadfile)
+        NEOShell(loader.database, inspect_parser, query_parser, aggressive=args.aggressive,
+                 data_files=(args.neofile, args.cadfile), loader=loader,
+                 partial=args.partial).cmdloop()
+        return
 
     # Extract data from the data files into structured Python objects.
-    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    database = load_database(args)
 
     # Run the chosen subcommand.
-    if args.cmd == 'inspect':
-        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose)
-    elif args.cmd == 'query':
-        query(database, args)
-    elif args.cmd == 'interactive':
-        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive).cmdloop()
+    if args.cmd in ('inspect', 'query'):
+        run(database, args)
+    elif args.cmd == 'serve':
+        serve(database, inspect_parser, query_parser, host=args.host, port=args.port,
+              path=args.socket and str(args.socket))
+    elif args.cmd == 'batch':
+        try:
+            commands, skipped = read_commands(args.file, parser)
+        except OSError as err:
+            print(f"Unable to read the batch file: {err}", file=sys.stderr)
+            sys.exit(1)
+        outcomes = run_batch(database, commands, run, workers=args.workers)
+        if skipped or any(outcome.error for outcome in outcomes):
+            sys.exit(1)
+    elif args.cmd == 'daemon':
+        # Exit cleanly on `kill`, as on Ctrl-C.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        daemon = NEODaemon(database, parser, run, (args.neofile, args.cadfile))
+        if not daemon.serve(args.daemon_socket):
+            sys.exit(1)
 
 
 if __name__ == '__main__':
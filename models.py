@@ -17,7 +17,7 @@ quirks of the data set, such as missing names and unknown diameters.
 
 You'll edit this file in Task 1.
 """
-from helpers import cd_to_datetime, datetime_to_str
+from helpers import cd_to_datetime, datetime_to_str, datetime_to_minutes
 
 
 class NearEarthObject:
@@ -96,9 +96,14 @@ class CloseApproach:
         self._designation = str(info[0])
         # convert time using helper; None if missing
         self.time = cd_to_datetime(info[3]) if info[3] else None
+        # precomputed integer keys for filtering: minutes since the epoch and
+        # the date's ordinal
+        self.time_key = datetime_to_minutes(self.time) if self.time else None
+        self.date_key = self.time.toordinal() if self.time else None
         # distance and velocity are rounded to two decimal places
-        self.distance = round(float(info[4]), 2) if float(info[4]) else None
-        self.velocity = round(float(info[7]), 2) if float(info[7]) else None
+        # (only missing values are None - a tiny distance may round to zero)
+        self.distance = round(float(info[4]), 2) if info[4] not in (None, '') else None
+        self.velocity = round(float(info[7]), 2) if info[7] not in (None, '') else None
 
         # Create an attribute for the referenced NEO, originally None.
         self.neo = None
@@ -0,0 +1,331 @@
+"""Serve inspect and query requests against an in-memory `NEODatabase` over HTTP.
+
+The `serve` function keeps one `NEODatabase` loaded and runs an asyncio HTTP
+server - on a local TCP port or on a Unix socket - with two endpoints, which
+take the same options as the `inspect` and `query` subcommands as URL query
+parameters (flags, such as `hazardous` or `verbose`, without a value):
+
+    $ curl 'http://localhost:8000/inspect?pdes=433&verbose'
+    $ curl 'http://localhost:8000/query?start-date=2020-01-01&max-distance=0.1&hazardous'
+    $ curl --unix-socket neo.sock 'http://localhost/query?where=diameter+>+1&limit=20'
+
+The results are streamed as JSON Lines, one close approach per line, in the
+format written by `write.write_to_ndjson`. When a `limit` is given and the page
+is full, the `X-Next-Cursor` response header holds the cursor to pass as
+`after` to fetch the next page.
+
+Many clients can be served at once. The event loop only parses requests and
+writes responses; evaluating the filters and encoding the results runs on a
+pool of threads. Every query reads a consistent snapshot of the database.
+"""
+import asyncio
+import http
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qsl, urlsplit
+
+from database import make_cursor
+from filters import filters_from_args, limit
+from write import serialize_for_json
+
+
+# The query parameters accepted by each endpoint - the long options of the
+# corresponding subcommand (with `-` or `_` between words).
+INSPECT_PARAMETERS = {'pdes', 'name', 'verbose'}
+QUERY_PARAMETERS = {'date', 'start-date', 'end-date', 'start-time', 'end-time',
+                    'min-distance', 'max-distance', 'min-velocity', 'max-velocity',
+                    'min-diameter', 'max-diameter', 'hazardous', 'not-hazardous',
+                    'where', 'limit', 'after'}
+# The number of close approaches encoded on the thread pool at a time, and the
+# number of threads.
+STREAM_BATCH_SIZE = 1024
+WORKERS = 4
+
+
+class InvalidRequest(Exception):
+    """A request can't be served."""
+
+    def __init__(self, status, message):
+        """Create a new `InvalidRequest`.
+
+        :param status: The HTTP status code of the response.
+        :param message: A description of the problem, for the client.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class NEOServer:
+    """Serve `inspect` and `query` requests against an `NEODatabase` over HTTP.
+
+    Like the `NEOShell`, this wraps the `inspect` and `query` parsers to parse
+    the parameters of each request as if they were supplied at the command
+    line. Each connection serves one request.
+    """
+
+    def __init__(self, database, inspect_parser, query_parser, workers=WORKERS):
+        """Create a new `NEOServer`.
+
+        Creating this object doesn't start the server - for that, use `.start()`.
+
+        :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+        :param inspect_parser: The subparser for the `inspect` subcommand.
+        :param query_parser: The subparser for the `query` subcommand.
+        :param workers: The number of threads on which to evaluate queries.
+        """
+        self.db = database
+        self.inspect = inspect_parser
+        self.query = query_parser
+        self.executor = ThreadPoolExecutor(workers)
+
+    def start(self, host='127.0.0.1', port=8000, path=None):
+        """Start listening for connections on the current event loop.
+
+        :param host: The interface on which to listen.
+        :param port: The TCP port on which to listen (0 for any free port).
+        :param path: The path of a Unix socket on which to listen instead.
+        :return: A coroutine that returns an `asyncio.Server`.
+        """
+        if path:
+            return asyncio.start_unix_server(self.handle, path=path)
+        return asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP request on a new connection, and close the connection.
+
+        :param reader: The `asyncio.StreamReader` of the connection.
+        :param writer: The `asyncio.StreamWriter` of the connection.
+        """
+        response = _Response(writer)
+        try:
+            path, params = await _read_request(reader)
+            if path == '/inspect':
+                await self.serve_inspect(params, response)
+            elif path == '/query':
+                await self.serve_query(params, response)
+            else:
+                raise InvalidRequest(404, f"No such endpoint: {path}")
+        except InvalidRequest as err:
+            response.error(err.status, err.message)
+        except ConnectionError:
+            pass  # the client went away
+        except Exception as err:
+            print(f"Unable to serve a request: {err!r}", file=sys.stderr)
+            if not response.started:
+                response.error(500, "Internal server error.")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass  # the client went away
+
+    async def serve_inspect(self, params, response):
+        """Respond with the NEO that matches an `inspect` request.
+
+        The response is a single JSON line, with the close approaches of the
+        NEO (without the NEO) under `approaches` if `verbose` is given.
+
+        :param params: A list of (name, value) query parameters.
+        :param response: The `_Response` to write to.
+        """
+        args = self.parse(self.inspect, params, INSPECT_PARAMETERS)
+        if args.pdes:
+            neo = self.db.get_neo_by_designation(args.pdes)
+        else:
+            neo = self.db.get_neo_by_name(args.name)
+        if not neo:
+            raise InvalidRequest(404, "No matching NEOs exist in the database.")
+        body = await self.run(_encode_neo, neo, args.verbose)
+        response.start(200)
+        await response.write(body)
+
+    async def serve_query(self, params, response):
+        """Stream the close approaches that match a `query` request.
+
+        :param params: A list of (name, value) query parameters.
+        :param response: The `_Response` to write to.
+        """
+        args = self.parse(self.query, params, QUERY_PARAMETERS)
+        # building the filters (e.g. compiling a `where` expression) and planning
+        # the query are done on the thread pool too
+        results = await self.run(_start_query, self.db, args)
+        headers = {}
+        if args.limit:
+            # read the whole page first, to know whether there's a next page
+            page = await self.run(list, limit(results, args.limit))
+            if len(page) == args.limit:
+                headers['X-Next-Cursor'] = make_cursor(page[-1])
+            results = iter(page)
+        response.start(200, headers)
+        while True:
+            chunk = await self.run(_encode_approaches, results)
+            if not chunk:
+                break
+            await response.write(chunk)
+
+    def parse(self, parser, params, allowed):
+        """Parse the query parameters of a request, using a given parser.
+
+        This must be called on the event loop's thread, because it replaces the
+        `error` method of the parser while parsing.
+
+        :param parser: An `argparse.ArgumentParser` to parse the parameters.
+        :param params: A list of (name, value) query parameters.
+        :param allowed: The set of parameter names that are allowed.
+        :return: A `Namespace` of the arguments.
+        :raises InvalidRequest: If the parameters are unsupported or invalid.
+        """
+        argv = []
+        for name, value in params:
+            name = name.replace('_', '-')
+            if name not in allowed:
+                raise InvalidRequest(400, f"Unsupported parameter: {name}")
+            argv.append(f'--{name}={value}' if value else f'--{name}')
+
+        def error(message):
+            raise InvalidRequest(400, message)
+
+        # `parse_args` reports errors by calling `error`, which would exit.
+        parser.error = error
+        try:
+            return parser.parse_args(argv)
+        finally:
+            del parser.error
+
+    def run(self, function, *args):
+        """Run a function on the thread pool, off the event loop.
+
+        :return: An awaitable of the function's return value.
+        """
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+class _Response:
+    """The HTTP response on a connection, sent in pieces."""
+
+    def __init__(self, writer):
+        """Create a new `_Response`.
+
+        :param writer: The `asyncio.StreamWriter` of the connection.
+        """
+        self.writer = writer
+        self.started = False
+
+    def start(self, status, headers=None):
+        """Send the status line and the headers.
+
+        :param status: The HTTP status code.
+        :param headers: A dictionary of additional headers.
+        """
+        lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}",
+                 "Content-Type: application/x-ndjson", "Connection: close"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        self.started = True
+
+    async def write(self, data):
+        """Send part of the body, waiting while the client is slow to receive it.
+
+        :param data: The bytes to send.
+        """
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def error(self, status, message):
+        """Send an error response, unless the response has already started.
+
+        :param status: The HTTP status code.
+        :param message: A description of the problem, for the client.
+        """
+        if not self.started:
+            self.start(status)
+            self.writer.write(json.dumps({'error': message}).encode() + b'\n')
+
+
+async def _read_request(reader):
+    """Read the request line and the headers of an HTTP request.
+
+    :param reader: The `asyncio.StreamReader` of the connection.
+    :return: A tuple of the path and the list of (name, value) query parameters.
+    :raises InvalidRequest: If the request is malformed or isn't a GET request.
+    """
+    request_line = await reader.readline()
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise InvalidRequest(400, "Malformed request.")
+    # the headers aren't needed, but must be consumed
+    while (await reader.readline()).strip():
+        pass
+    if method != 'GET':
+        raise InvalidRequest(405, "Only GET requests are supported.")
+    url = urlsplit(target)
+    return url.path, parse_qsl(url.query, keep_blank_values=True)
+
+
+def _start_query(database, args):
+    """Plan a `query` request and return the stream of its results.
+
+    :param database: The `NEODatabase` to query.
+    :param args: The `Namespace` of the request's arguments.
+    :return: A stream of matching `CloseApproach` objects.
+    """
+    return database.query(filters_from_args(args), after=args.after)
+
+
+def _encode_approaches(results):
+    """Encode the next batch of close approaches of a stream as JSON Lines.
+
+    :param results: An iterator of `CloseApproach` objects.
+    :return: Up to `STREAM_BATCH_SIZE` lines, as bytes - empty at the end of the stream.
+    """
+    return ''.join(json.dumps(serialize_for_json(approach)) + '\n'
+                   for approach in islice(results, STREAM_BATCH_SIZE)).encode()
+
+
+def _encode_neo(neo, verbose=False):
+    """Encode an NEO, and optionally its close approaches, as a JSON line.
+
+    :param neo: A `NearEarthObject`.
+    :param verbose: Whether to include the NEO's close approaches.
+    :return: The line, as bytes.
+    """
+    record = {'designation': neo.designation, 'name': neo.name or '',
+              'diameter_km': neo.diameter, 'potentially_hazardous': neo.hazardous}
+    if verbose:
+        record['approaches'] = [{key: value for key, value in approach.serialize().items()
+                                 if key != 'neo'} for approach in neo.approaches]
+    return json.dumps(record).encode() + b'\n'
+
+
+def serve(database, inspect_parser, query_parser, host='127.0.0.1', port=8000, path=None):
+    """Perform the `serve` subcommand: serve requests until interrupted.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param inspect_parser: The subparser for the `inspect` subcommand.
+    :param query_parser: The subparser for the `query` subcommand.
+    :param host: The interface on which to listen.
+    :param port: The TCP port on which to listen.
+    :param path: The path of a Unix socket on which to listen instead.
+    """
+    server = NEOServer(database, inspect_parser, query_parser)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    listener = loop.run_until_complete(server.start(host, port, path))
+    print(f"Serving on {path or f'http://{host}:{port}'} - press Ctrl-C to stop.", file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        server.executor.shutdown()
+        loop.close()
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,140 @@
+"""Check that a batch file of commands runs like the same commands one at a time.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_batch
+"""
+import collections
+import contextlib
+import datetime
+import io
+import pathlib
+import tempfile
+import unittest
+
+
+from extract import load_neos, load_approaches
+from database import NEODatabase
+from batch import read_commands, run_batch, format_summary
+from main import make_parser, run
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.parser, _, _ = make_parser()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_batch(self, *lines):
+        batch_file = self.root / 'batch.txt'
+        batch_file.write_text('\n'.join(lines) + '\n')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            commands, skipped = read_commands(batch_file, self.parser)
+        return commands, skipped, stderr.getvalue()
+
+    def run_batch(self, commands, workers=4):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            outcomes = run_batch(self.db, commands, run, workers=workers)
+        return outcomes, stdout.getvalue(), stderr.getvalue()
+
+    def run_one_at_a_time(self, commands):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            for command in commands:
+                run(self.db, command.args)
+        return stdout.getvalue()
+
+    def test_output_is_printed_in_the_order_of_the_file(self):
+        commands, _, _ = self.write_batch(
+            'query --start-date 2020-06-01 --limit 0',
+            'inspect --verbose --pdes "2020 AY1"',
+            'query --date 2020-01-01 --limit 3 --tsv',
+            'inspect --name Toro')
+        expected = self.run_one_at_a_time(commands)
+        outcomes, stdout, _ = self.run_batch(commands)
+        self.assertEqual(stdout, expected)
+        self.assertEqual([outcome.command.number for outcome in outcomes], [1, 2, 3, 4])
+
+    def test_outfiles_match_commands_run_one_at_a_time(self):
+        lines = [f'query --start-date 2020-0{month}-01 --limit 0 --outfile {self.root}/{month}.csv'
+                 for month in range(1, 10)]
+        commands, _, _ = self.write_batch(*lines)
+        self.run_batch(commands)
+        batch_outputs = [(self.root / f'{month}.csv').read_bytes() for month in range(1, 10)]
+        self.run_one_at_a_time(commands)
+        self.assertEqual(batch_outputs, [(self.root / f'{month}.csv').read_bytes()
+                                         for month in range(1, 10)])
+
+    def test_commands_writing_one_file_run_in_order(self):
+        outfile = self.root / 'shared.csv'
+        commands, _, _ = self.write_batch(
+            f'query --limit 0 --outfile {outfile}',
+            f'query --limit 5 --outfile {outfile}')
+        self.run_batch(commands)
+        self.assertEqual(len(outfile.read_text().splitlines()), 6)
+
+    def test_invalid_lines_are_skipped(self):
+        commands, skipped, stderr = self.write_batch(
+            '# a comment', '', 'interactive', 'query --date never', 'query --batch x.txt',
+            'query "unterminated', 'query --date 2020-01-01')
+        self.assertEqual(skipped, 4)
+        self.assertEqual([command.number for command in commands], [7])
+        self.assertIn('batch.txt:3: skipping invalid command.', stderr)
+
+    def test_failed_commands_do_not_stop_the_batch(self):
+        commands, _, _ = self.write_batch(
+            f'query --limit 5 --outfile {self.root}/missing/results.csv',
+            f'query --limit 5 --outfile {self.root}/results.csv')
+        outcomes, _, stderr = self.run_batch(commands)
+        self.assertIsInstance(outcomes[0].error, OSError)
+        self.assertIsNone(outcomes[1].error)
+        self.assertTrue((self.root / 'results.csv').exists())
+        self.assertIn('Ran 2 commands', stderr)
+        self.assertIn('1 failed', stderr)
+
+    def test_next_page_cursor_is_only_printed_with_results_on_stdout(self):
+        for line, printed in (('query --limit 5', True),
+                              (f'query --limit 5 --outfile {self.root}/page.csv', False)):
+            with self.subTest(line=line):
+                commands, _, _ = self.write_batch(line)
+                stderr = io.StringIO()
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+                    run(self.db, commands[0].args)
+                self.assertEqual('Next page: --after' in stderr.getvalue(), printed)
+
+    def test_summary_counts_rows(self):
+        commands, _, _ = self.write_batch(
+            'query --date 2020-01-01 --max-distance 0.1 --limit 0',
+            'inspect --verbose --pdes "2020 AY1"')
+        outcomes, _, stderr = self.run_batch(commands)
+        january_first = [approach for approach in self.db.query()
+                         if approach.time.date() == datetime.date(2020, 1, 1)]
+        matches = [approach for approach in january_first if approach.distance <= 0.1]
+        self.assertEqual(outcomes[0].stats,
+                         collections.Counter(scanned=len(january_first), returned=len(matches)))
+        self.assertEqual(outcomes[1].stats, collections.Counter(scanned=3, returned=3))
+
+        lines = stderr.splitlines()
+        self.assertEqual(lines, format_summary(outcomes, 0).splitlines()[:-1] + lines[-1:])
+        self.assertEqual(lines[0].split(),
+                         ['line', 'command', 'seconds', 'scanned', 'returned', 'status'])
+        self.assertEqual(lines[1].split()[-3:], [str(len(january_first)), str(len(matches)), 'ok'])
+        self.assertRegex(lines[-1], r'Ran 2 commands in \d+\.\d{3} s\.')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Check that commands forwarded to the NEO daemon print what they would locally.
+
+The daemon and its clients are separate runs of `main.py`, and the daemon
+listens on a Unix socket in a temporary directory.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_daemon
+"""
+import io
+import json
+import pathlib
+import shutil
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+
+from daemon import ACCEPT, REFUSE, EXIT, _connect, _receive, ThreadLocalStream
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+PROJECT_ROOT = TESTS_ROOT.parent
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unix sockets are unavailable.")
+class TestDaemon(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        root = pathlib.Path(cls.tmpdir.name)
+        cls.socket_path = root / 'neo.sock'
+        # copies of the data files, so that the index that `inspect --verbose`
+        # builds next to the close approach file isn't left among the tests
+        cls.neofile, cls.cadfile = root / 'neos.csv', root / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, cls.neofile)
+        shutil.copy(TEST_CAD_FILE, cls.cadfile)
+        cls.daemon = subprocess.Popen(
+            [sys.executable, str(PROJECT_ROOT / 'main.py'), '--neofile', str(cls.neofile),
+             '--cadfile', str(cls.cadfile), '--daemon-socket', str(cls.socket_path), 'daemon'],
+            stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while not cls.socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.daemon.send_signal(signal.SIGTERM)
+        cls.daemon.wait()
+        cls.tmpdir.cleanup()
+
+    def main(self, *argv, cadfile=None):
+        return subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / 'main.py'), '--neofile', str(self.neofile),
+             '--cadfile', str(cadfile or self.cadfile), '--daemon-socket', str(self.socket_path)] + list(argv),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.tmpdir.name, check=True)
+
+    def request(self, argv, cwd=PROJECT_ROOT):
+        with socket.socket(socket.AF_UNIX) as connection:
+            connection.connect(str(self.socket_path))
+            request = {'argv': argv, 'cwd': str(cwd), 'encoding': 'utf-8'}
+            connection.sendall(json.dumps(request).encode() + b'\n')
+            with connection.makefile('rb') as frames:
+                return list(iter(lambda: _receive(frames), None))
+
+    def test_forwarded_commands_print_the_same_output(self):
+        for argv in (['query', '--date', '2020-01-01', '--limit', '3'],
+                     ['query', '--start-date', '2020-06-01', '--limit', '0', '--tsv'],
+                     ['inspect', '--verbose', '--pdes', '2020 AY1'],
+                     ['inspect', '--name', 'not a real name']):
+            with self.subTest(argv=argv):
+                forwarded = self.main(*argv)
+                local = self.main('--no-daemon', *argv)
+                self.assertTrue(forwarded.stdout or forwarded.stderr)
+                self.assertEqual(forwarded.stdout, local.stdout)
+                self.assertEqual(forwarded.stderr, local.stderr)
+
+    def test_outfile_is_relative_to_the_client(self):
+        self.main('query', '--date', '2020-01-01', '--outfile', 'forwarded.csv')
+        self.main('--no-daemon', 'query', '--date', '2020-01-01', '--outfile', 'local.csv')
+        tmpdir = pathlib.Path(self.tmpdir.name)
+        self.assertEqual((tmpdir / 'forwarded.csv').read_bytes(), (tmpdir / 'local.csv').read_bytes())
+
+    def test_daemon_runs_accepted_commands(self):
+        argv = ['--neofile', str(self.neofile), '--cadfile', str(self.cadfile),
+                'query', '--date', '2020-01-01']
+        frames = self.request(argv)
+        self.assertEqual(frames[0], (ACCEPT, b''))
+        self.assertEqual(frames[-1], (EXIT, b'0'))
+        self.assertEqual(len(b''.join(data for _, data in frames[1:-1]).splitlines()), 11)
+
+    def test_daemon_refuses_other_data_files(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as cadfile:
+            cadfile.write(self.cadfile.read_bytes())
+            cadfile.flush()
+            argv = ['--neofile', str(self.neofile), '--cadfile', cadfile.name, 'query']
+            self.assertEqual(self.request(argv)[0][0], REFUSE)
+            # ...and the client falls back to loading them
+            self.assertEqual(self.main('query', cadfile=cadfile.name).stdout,
+                             self.main('query').stdout)
+
+    def test_daemon_refuses_malformed_requests(self):
+        with socket.socket(socket.AF_UNIX) as connection:
+            connection.connect(str(self.socket_path))
+            connection.sendall(b'not json\n')
+            with connection.makefile('rb') as frames:
+                self.assertEqual(_receive(frames)[0], REFUSE)
+
+    def test_client_ignores_a_socket_others_can_access(self):
+        self.socket_path.chmod(0o666)
+        try:
+            self.assertIsNone(_connect(str(self.socket_path)))
+        finally:
+            self.socket_path.chmod(0o600)
+        connection = _connect(str(self.socket_path))
+        self.assertIsNotNone(connection)
+        connection.close()
+
+    def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(self.socket_path.stat().st_mode), 0o600)
+
+    def test_second_daemon_does_not_start(self):
+        result = subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / 'main.py'), '--neofile', str(self.neofile),
+             '--cadfile', str(self.cadfile), '--daemon-socket', str(self.socket_path), 'daemon'],
+            stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn(b'already listening', result.stderr)
+
+    def test_client_runs_locally_without_a_daemon(self):
+        result = subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / 'main.py'), '--neofile', str(self.neofile),
+             '--cadfile', str(self.cadfile), '--daemon-socket', str(self.socket_path) + '.missing',
+             'inspect', '--pdes', '2020 AY1'], stdout=subprocess.PIPE, check=True)
+        self.assertTrue(result.stdout.startswith(b'A NearEarthObject 2020 AY1'))
+
+
+class TestThreadLocalStream(unittest.TestCase):
+    def test_threads_write_to_their_own_streams(self):
+        default = io.StringIO()
+        proxy = ThreadLocalStream(default)
+        streams = [io.StringIO() for _ in range(4)]
+
+        def write(stream, text):
+            proxy.redirect(stream)
+            for _ in range(100):
+                proxy.write(text)
+            proxy.redirect(None)
+
+        threads = [threading.Thread(target=write, args=(stream, str(i)))
+                   for i, stream in enumerate(streams)]
+        for thread in threads:
+            thread.start()
+        proxy.write('main')
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(default.getvalue(), 'main')
+        for i, stream in enumerate(streams):
+            self.assertEqual(stream.getvalue(), str(i) * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
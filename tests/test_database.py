@@ -10,13 +10,17 @@ To run these tests from the project root, run:
 
 These tests should pass when Task 2 is complete.
 """
+import collections
+import datetime
 import pathlib
 import math
 import unittest
+import unittest.mock
 
 
 from extract import load_neos, load_approaches
-from database import NEODatabase
+from database import NEODatabase, InvalidCursorError, make_cursor, parse_cursor, np
+from filters import create_filters, limit, parse_where, And, CompiledQuery
 
 
 # Paths to the test data files.
@@ -115,5 +119,285 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNone(nonexistent)
 
 
+class TestStandingQueries(unittest.TestCase):
+    def setUp(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        half = len(approaches) // 2
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), approaches[:half])
+        self.new_approaches = approaches[half:]
+        self.filters = create_filters(start_date=datetime.date(2020, 3, 1), distance_max=0.3)
+
+    def test_register_standing_query_materializes_results(self):
+        standing_query = self.db.register_standing_query('march', self.filters)
+        self.assertEqual(list(standing_query), list(self.db.query(self.filters)))
+        self.assertIs(self.db.get_standing_query('march'), standing_query)
+
+    def test_ingest_updates_standing_query_incrementally(self):
+        standing_query = self.db.register_standing_query('march', self.filters)
+        before = len(standing_query)
+        self.assertEqual(self.db.ingest(self.new_approaches), len(self.new_approaches))
+
+        self.assertGreater(len(standing_query), before)
+        self.assertEqual(list(standing_query), list(self.db.query(self.filters)))
+        for approach in self.new_approaches:
+            self.assertIn(approach, approach.neo.approaches)
+
+    def test_standing_query_results_are_in_query_order_after_out_of_order_ingests(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        half = len(approaches) // 2
+        db = NEODatabase(load_neos(TEST_NEO_FILE), approaches[half:])
+        standing_query = db.register_standing_query('march', self.filters)
+        # the earlier close approaches arrive last, latest batch first
+        for stop in range(half, 0, -500):
+            db.ingest(approaches[max(stop - 500, 0):stop])
+        self.assertEqual(list(standing_query), list(db.query(self.filters)))
+
+    def test_unregister_standing_query(self):
+        self.db.register_standing_query('march', self.filters)
+        self.assertIsNotNone(self.db.unregister_standing_query('march'))
+        self.assertIsNone(self.db.get_standing_query('march'))
+        self.assertIsNone(self.db.unregister_standing_query('march'))
+
+
+class TestQueryMany(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.filter_sets = [
+            create_filters(),
+            create_filters(date=datetime.date(2020, 3, 2)),
+            parse_where('hazardous or diameter > 1'),
+            create_filters(distance_min=0.5, distance_max=0.1),
+            create_filters(start_date=datetime.date(2020, 6, 1), velocity_min=20),
+            [lambda approach: approach.distance < 0.01],
+        ]
+
+    def test_query_many_matches_separate_queries(self):
+        results = self.db.query_many(self.filter_sets)
+        self.assertEqual(len(results), len(self.filter_sets))
+        for filters, received in zip(self.filter_sets, results):
+            self.assertEqual(list(self.db.query(filters)), received)
+
+    def test_query_many_applies_each_limit(self):
+        limits = [5, 0, 3, 2, 1, None]
+        results = self.db.query_many(self.filter_sets, limits)
+        for filters, n, received in zip(self.filter_sets, limits, results):
+            self.assertEqual(list(limit(self.db.query(filters), n)), received)
+
+
+class TestSnapshotIsolation(unittest.TestCase):
+    def setUp(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        half = len(approaches) // 2
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), approaches[:half])
+        self.old_approaches = approaches[:half]
+        self.new_approaches = approaches[half:]
+
+    def test_running_query_ignores_ingest(self):
+        expected = list(self.db.query())
+        results = self.db.query()
+        first = next(results)
+        self.db.ingest(self.new_approaches)
+        self.assertEqual([first] + list(results), expected)
+        self.assertCountEqual(expected, self.old_approaches)
+        self.assertEqual(len(list(self.db.query())), len(self.old_approaches) + len(self.new_approaches))
+
+    def test_ingest_does_not_mutate_approaches_of_neos(self):
+        neo = self.db.get_neo_by_designation(self.new_approaches[0]._designation)
+        approaches = neo.approaches
+        count = len(approaches)
+        self.db.ingest(self.new_approaches)
+        self.assertEqual(len(approaches), count)
+        self.assertIn(self.new_approaches[0], neo.approaches)
+
+    def test_old_snapshot_keeps_its_approaches_but_shares_neos(self):
+        plan = self.db.plan()
+        expected = list(plan.snapshot.approaches)
+        self.db.ingest(self.new_approaches)
+        # the close approaches of the old snapshot (and queries against it) are unchanged...
+        self.assertEqual(list(plan.snapshot.approaches), expected)
+        self.assertEqual(plan.snapshot.approaches[-1], expected[-1])
+        self.assertEqual(list(self.db.execute(plan)), expected)
+        # ...but its NEOs list the close approaches of the latest snapshot
+        neo = plan.snapshot.neos_by_pdes[self.new_approaches[0]._designation]
+        self.assertIn(self.new_approaches[0], neo.approaches)
+
+    def test_ingest_keeps_index_order(self):
+        db = NEODatabase(load_neos(TEST_NEO_FILE), [])
+        approaches = self.old_approaches + self.new_approaches
+        # chunks that follow each other, overlap at the edges, and go back in time
+        chunks = [approaches[start:start + 500] for start in range(0, len(approaches), 500)]
+        chunks = chunks[3:] + chunks[:3]
+        filters = create_filters(distance_max=0.1)
+        for chunk in chunks:
+            db.ingest(list(reversed(chunk[:10])) + chunk[10:])
+            # keep the column arrays (with NumPy) up to date as well
+            list(db.query(filters))
+        expected = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        self.assertEqual([make_cursor(approach) for approach in db.query()],
+                         [make_cursor(approach) for approach in expected.query()])
+        self.assertEqual([make_cursor(approach) for approach in db.query(filters)],
+                         [make_cursor(approach) for approach in expected.query(filters)])
+
+    def test_reload_swaps_data_and_recomputes_standing_queries(self):
+        filters = create_filters(distance_max=0.1)
+        self.db.register_standing_query('near', filters)
+        results = self.db.query(filters)
+
+        neos = load_neos(TEST_NEO_FILE)
+        approaches = load_approaches(TEST_CAD_FILE)
+        self.db.reload(neos, approaches)
+
+        self.assertTrue(all(approach in self.old_approaches for approach in results))
+        self.assertIs(self.db.get_neo_by_designation('1865'), {neo.designation: neo for neo in neos}['1865'])
+        self.assertEqual(list(self.db.get_standing_query('near')), list(self.db.query(filters)))
+        self.assertTrue(all(approach in approaches for approach in self.db.get_standing_query('near')))
+
+
+class TestPagination(unittest.TestCase):
+    def setUp(self):
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def pages(self, filters, size):
+        after = None
+        while True:
+            page = list(limit(self.db.query(filters, after=after), size))
+            yield page
+            if len(page) < size:
+                return
+            after = make_cursor(page[-1])
+
+    def test_cursor_round_trip(self):
+        approach = next(self.db.query())
+        self.assertEqual(parse_cursor(make_cursor(approach)), (approach.time_key, approach._designation))
+        for cursor in ('', 'not a cursor', make_cursor(approach)[:-2] + '!!'):
+            with self.assertRaises(InvalidCursorError):
+                parse_cursor(cursor)
+
+    def test_pages_cover_all_results_once(self):
+        for filters in (create_filters(), create_filters(distance_max=0.2),
+                        parse_where('hazardous or date = 2020-05-01'),
+                        [lambda approach: approach.velocity > 15]):
+            expected = list(self.db.query(filters))
+            pages = list(self.pages(filters, 7))
+            self.assertEqual([approach for page in pages for approach in page], expected)
+            self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+
+    def test_pages_break_ties_by_designation(self):
+        approaches = list(self.db.query())
+        keys = [(approach.time_key, approach._designation) for approach in approaches]
+        self.assertEqual(keys, sorted(keys))
+        ties = [index for index in range(1, len(keys)) if keys[index - 1][0] == keys[index][0]]
+        self.assertGreater(len(ties), 0)
+        for index in ties:
+            received = next(self.db.query(after=make_cursor(approaches[index - 1])))
+            self.assertIs(received, approaches[index])
+
+    def test_cursor_resumes_after_ingest(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        half = len(approaches) // 2
+        db = NEODatabase(load_neos(TEST_NEO_FILE), approaches[:half])
+        last = list(limit(db.query(), 10))[-1]
+        db.ingest(approaches[half:])
+        key = (last.time_key, last._designation)
+        expected = [approach for approach in db.query()
+                    if (approach.time_key, approach._designation) > key]
+        self.assertEqual(list(db.query(after=make_cursor(last))), expected)
+
+
+class TestScanStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.approaches = list(cls.db.query())
+
+    def scanned(self, filters, n=None):
+        stats = collections.Counter()
+        results = list(limit(self.db.query(filters, stats=stats), n))
+        return stats['scanned'], results
+
+    def assertScansMarch(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 3, 31),
+                                 distance_max=0.1)
+        in_march = [approach for approach in self.approaches if approach.time.month == 3]
+        scanned, results = self.scanned(filters)
+        self.assertEqual(scanned, len(in_march))
+        self.assertLess(len(results), scanned)
+
+    @unittest.skipIf(np is None, "NumPy is not installed.")
+    def test_vectorized_scan_counts_the_date_range(self):
+        self.assertScansMarch()
+
+    @unittest.mock.patch('database.np', None)
+    def test_scan_counts_the_date_range(self):
+        self.assertScansMarch()
+
+    @unittest.mock.patch('database.np', None)
+    def test_limited_stream_counts_rows_up_to_the_last_match(self):
+        filters = [lambda approach: approach.velocity > 20]
+        scanned, results = self.scanned(filters, 5)
+        self.assertEqual(scanned, self.approaches.index(results[-1]) + 1)
+
+
+class TestQueryPlan(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.approaches = list(cls.db.query())
+
+    def assertRunsLikeQuery(self, plan, filters, after=None):
+        self.assertEqual(list(self.db.execute(plan)), list(self.db.query(filters, after=after)))
+
+    def test_unfiltered_query_is_a_full_scan(self):
+        plan = self.db.plan()
+        self.assertEqual(plan.access_path, 'full scan')
+        self.assertEqual(plan.estimated_rows, len(self.approaches))
+        self.assertEqual(plan.predicate_order(), [])
+        self.assertRunsLikeQuery(plan, ())
+
+    def test_date_range_is_a_time_slice(self):
+        filters = create_filters(date=datetime.date(2020, 1, 1), distance_max=0.1)
+        plan = self.db.plan(filters)
+        on_january_first = [approach for approach in self.approaches
+                            if approach.time.date() == datetime.date(2020, 1, 1)]
+        self.assertEqual(plan.access_path, 'time slice')
+        self.assertEqual(plan.estimated_rows, len(on_january_first))
+        self.assertEqual(plan.vectorized, np is not None)
+        self.assertEqual(plan.predicate_order(), filters)
+        self.assertRunsLikeQuery(plan, filters)
+
+    def test_cursor_slices_the_time_index(self):
+        after = make_cursor(self.approaches[99])
+        plan = self.db.plan(after=after)
+        self.assertEqual(plan.access_path, 'time slice')
+        self.assertEqual(plan.estimated_rows, len(self.approaches) - 100)
+        self.assertRunsLikeQuery(plan, (), after)
+
+    def test_contradictory_filters_have_no_access_path(self):
+        filters = parse_where('date = 2020-01-01 and date = 2020-01-02')
+        plan = self.db.plan(filters)
+        self.assertEqual(plan.access_path, 'none')
+        self.assertEqual(plan.estimated_rows, 0)
+        self.assertTrue(plan.conjunctions[0].empty)
+        self.assertRunsLikeQuery(plan, filters)
+
+    def test_predicate_order_flattens_conjunctions(self):
+        near = create_filters(distance_max=0.1)[0]
+        fast = create_filters(velocity_min=20)[0]
+        on_date = create_filters(date=datetime.date(2020, 1, 1))[0]
+        either = parse_where('hazardous or diameter > 1')
+        plan = self.db.plan(And(And(on_date, either), fast, near))
+        self.assertEqual(plan.predicate_order(), [on_date, either, fast, near])
+
+    def test_predicate_order_of_a_compiled_query_groups_attributes(self):
+        near = create_filters(distance_max=0.1)[0]
+        far = create_filters(distance_min=0.01)[0]
+        on_date = create_filters(date=datetime.date(2020, 1, 1))[0]
+        custom = (lambda approach: approach.velocity > 20)
+        plan = self.db.plan(CompiledQuery([near, on_date, custom, far]))
+        self.assertFalse(plan.vectorized)
+        self.assertEqual(plan.predicate_order(), [near, far, on_date, custom])
+
+
 if __name__ == '__main__':
     unittest.main()
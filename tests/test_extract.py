@@ -12,11 +12,19 @@ These tests should pass when Task 2 is complete.
 """
 import collections.abc
 import datetime
+import os
 import pathlib
+import json
 import math
+import shutil
+import tempfile
 import unittest
+import unittest.mock
 
-from extract import load_neos, load_approaches
+from extract import (load_neos, load_approaches, load_approaches_ndjson, _load_ndjson_range,
+                     load_approaches_in_chunks, find_neo, load_approaches_of)
+from database import NEODatabase
+from write import write_to_ndjson
 from models import NearEarthObject, CloseApproach
 
 
@@ -118,5 +126,130 @@ class TestLoadApproaches(unittest.TestCase):
         self.assertIsInstance(approach.velocity, float)
 
 
+class TestLoadApproachesNDJSON(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        NEODatabase(load_neos(TEST_NEO_FILE), cls.approaches)
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.serialized_file = pathlib.Path(cls.tmpdir.name) / 'approaches.jsonl'
+        write_to_ndjson(cls.approaches, cls.serialized_file)
+        cls.rows_file = pathlib.Path(cls.tmpdir.name) / 'approaches.ndjson'
+        with open(TEST_CAD_FILE) as infile, open(cls.rows_file, 'w') as outfile:
+            for row in json.load(infile)['data']:
+                outfile.write(json.dumps(row) + '\n\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def assertSameApproaches(self, received):
+        self.assertEqual(len(received), len(self.approaches))
+        for approach, expected in zip(received, self.approaches):
+            self.assertIsInstance(approach, CloseApproach)
+            self.assertEqual(approach._designation, expected._designation)
+            self.assertEqual(approach.time, expected.time)
+            self.assertEqual(approach.distance, expected.distance)
+            self.assertEqual(approach.velocity, expected.velocity)
+
+    def test_load_serialized_approaches(self):
+        self.assertSameApproaches(load_approaches(self.serialized_file))
+
+    def test_load_cad_rows(self):
+        self.assertSameApproaches(load_approaches(self.rows_file))
+
+    def test_byte_ranges_split_at_line_boundaries(self):
+        size = self.serialized_file.stat().st_size
+        bounds = [0, 1, 1000, 1001, size // 2, size - 1, size]
+        received = []
+        for start, stop in zip(bounds, bounds[1:]):
+            received.extend(_load_ndjson_range(self.serialized_file, start, stop))
+        self.assertSameApproaches(received)
+
+    @unittest.mock.patch('extract.PARALLEL_THRESHOLD', 0)
+    def test_load_in_parallel(self):
+        self.assertSameApproaches(load_approaches_ndjson(self.rows_file, workers=3))
+
+    def test_load_in_chunks(self):
+        for path in (TEST_CAD_FILE, self.serialized_file, self.rows_file):
+            with self.subTest(path=path.name):
+                chunks = list(load_approaches_in_chunks(path, chunk_size=1000))
+                self.assertEqual([len(chunk) for chunk, _ in chunks], [1000] * 4 + [700])
+                progress = [progress for _, progress in chunks]
+                self.assertEqual(progress, sorted(progress))
+                self.assertEqual(progress[-1], 1.0)
+                self.assertSameApproaches([approach for chunk, _ in chunks for approach in chunk])
+
+    def test_load_truncated_file_in_chunks(self):
+        truncated_file = pathlib.Path(self.tmpdir.name) / 'truncated.json'
+        truncated_file.write_text(TEST_CAD_FILE.read_text()[:5000])
+        with self.assertRaises(ValueError):
+            list(load_approaches_in_chunks(truncated_file))
+
+
+class TestLoadOneNEO(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.index_file = pathlib.Path(cls.tmpdir.name) / 'cad.json.idx'
+        # a sample of NEOs with many, few or no close approaches
+        neos = sorted(cls.db._snapshot.neos, key=lambda neo: len(neo.approaches))
+        cls.sample = neos[:20] + neos[::97] + neos[-20:]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def assertSameApproaches(self, received, expected):
+        self.assertEqual([(approach._designation, approach.time, approach.distance, approach.velocity)
+                          for approach in received],
+                         [(approach._designation, approach.time, approach.distance, approach.velocity)
+                          for approach in expected])
+
+    def test_find_neo_by_designation(self):
+        for neo in self.sample:
+            self.assertEqual(repr(find_neo(TEST_NEO_FILE, designation=neo.designation)), repr(neo))
+        self.assertIsNone(find_neo(TEST_NEO_FILE, designation='not a designation'))
+
+    def test_find_neo_by_name(self):
+        for name in ('Toro', 'halley', 'EROS', 'not a name'):
+            self.assertEqual(repr(find_neo(TEST_NEO_FILE, name=name)),
+                             repr(self.db.get_neo_by_name(name)))
+
+    @unittest.mock.patch('extract.INDEX_SEARCH_BLOCK', 64)
+    def test_load_approaches_of_neo(self):
+        for neo in self.sample:
+            self.assertSameApproaches(load_approaches_of(TEST_CAD_FILE, neo.designation,
+                                                         self.index_file), neo.approaches)
+        self.assertEqual(load_approaches_of(TEST_CAD_FILE, 'not a designation', self.index_file), [])
+
+    def test_load_approaches_of_neo_from_ndjson(self):
+        ndjson_file = pathlib.Path(self.tmpdir.name) / 'cad.jsonl'
+        write_to_ndjson(self.db.query(), ndjson_file)
+        for neo in self.sample:
+            self.assertSameApproaches(load_approaches_of(ndjson_file, neo.designation), neo.approaches)
+
+    def test_index_is_rebuilt_when_file_changes(self):
+        cad_file = pathlib.Path(self.tmpdir.name) / 'changing.json'
+        shutil.copy(TEST_CAD_FILE, cad_file)
+        neo = self.sample[-1]
+        load_approaches_of(cad_file, neo.designation)
+        with open(cad_file) as infile:
+            data = json.load(infile)
+        data['data'] = [row for row in data['data'] if row[0] != neo.designation]
+        with open(cad_file, 'w') as outfile:
+            json.dump(data, outfile)
+        os.utime(cad_file, ns=(0, 0))
+        self.assertEqual(load_approaches_of(cad_file, neo.designation), [])
+
+    def test_whole_file_is_read_without_an_index(self):
+        neo = self.sample[-1]
+        with unittest.mock.patch('extract.build_approach_index', side_effect=PermissionError):
+            received = load_approaches_of(TEST_CAD_FILE, neo.designation,
+                                          pathlib.Path(self.tmpdir.name) / 'missing.idx')
+        self.assertSameApproaches(received, neo.approaches)
+
+
 if __name__ == '__main__':
     unittest.main()
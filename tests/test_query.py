@@ -13,12 +13,17 @@ To run these tests from the project root, run::
 These tests should pass when Tasks 3a and 3b are complete.
 """
 import datetime
+import operator
 import pathlib
+import time
 import unittest
 
 from database import NEODatabase
 from extract import load_neos, load_approaches
-from filters import create_filters
+from helpers import minutes_to_datetime
+from filters import (create_filters, limit, CompiledQuery, DateFilter, DistanceFilter, VelocityFilter,
+                     HazardousFilter, TimeFilter, And, Or, Not, Conjunction, parse_where,
+                     disjunctive_normal_form, InvalidExpressionError, np)
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -529,5 +534,252 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(expected, received, msg="Computed results do not match expected results.")
 
 
+class TestCompiledQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def assertCompiledMatches(self, filters):
+        compiled = CompiledQuery(filters)
+        expected = list(self.db.query(filters))
+        self.assertEqual(expected, list(self.db.query(compiled)))
+        for approach in self.approaches[:200]:
+            self.assertEqual(all(f(approach) for f in filters), compiled(approach))
+
+    def test_compiled_query_matches_per_filter_query(self):
+        self.assertCompiledMatches(create_filters())
+        self.assertCompiledMatches(create_filters(date=datetime.date(2020, 3, 2)))
+        self.assertCompiledMatches(create_filters(
+            start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 5, 31),
+            distance_min=0.05, distance_max=0.5, velocity_min=5, velocity_max=25,
+            diameter_min=0.5, diameter_max=1.5, hazardous=False
+        ))
+
+    def test_create_filters_can_compile(self):
+        filters = create_filters(distance_max=0.1, hazardous=True, compiled=True)
+        self.assertIsInstance(filters, CompiledQuery)
+        self.assertEqual(len(filters), 2)
+        # the two distance bounds read the attribute once
+        filters = create_filters(distance_min=0.1, distance_max=0.4, compiled=True)
+        self.assertEqual(filters.source.count('approach.distance'), 1)
+
+    def test_compiled_query_accepts_custom_filters(self):
+        class KilometerFilter(DistanceFilter):
+            @classmethod
+            def get(cls, approach):
+                return approach.distance * 149597870.7
+
+        filters = [KilometerFilter(operator.lt, 1.5e7), KilometerFilter(operator.gt, 1e6),
+                   DistanceFilter(operator.ne, 0.05),
+                   lambda approach: approach.velocity > 10]
+        self.assertCompiledMatches(filters)
+        self.assertIn('get_0(approach)', CompiledQuery(filters).source)
+
+
+class TestTimeFilters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        # in index order, like query results: by time, then by designation
+        cls.approaches = sorted(load_approaches(TEST_CAD_FILE),
+                                key=lambda approach: (approach.time, approach._designation))
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_approaches_precompute_integer_time_keys(self):
+        approach = self.approaches[0]
+        self.assertIsInstance(approach.time_key, int)
+        self.assertEqual(approach.date_key, approach.time.date().toordinal())
+        self.assertEqual(minutes_to_datetime(approach.time_key), approach.time)
+
+    def test_query_between_times(self):
+        start_time = datetime.datetime(2020, 3, 2, 6, 30)
+        end_time = datetime.datetime(2020, 3, 4, 12, 0)
+
+        expected = [
+            approach for approach in self.approaches
+            if start_time <= approach.time <= end_time
+        ]
+        self.assertGreater(len(expected), 0)
+
+        filters = create_filters(start_time=start_time, end_time=end_time)
+        self.assertEqual(expected, list(self.db.query(filters)))
+        self.assertEqual(expected, list(self.db.query(CompiledQuery(filters))))
+        self.assertEqual(expected, list(self.db.query(
+            parse_where('time >= 2020-03-02T06:30 and time <= 2020-03-04T12:00'))))
+
+    def test_query_with_date_and_time_bounds(self):
+        date = datetime.date(2020, 3, 2)
+        start_time = datetime.datetime(2020, 3, 2, 12, 0)
+
+        expected = [
+            approach for approach in self.approaches
+            if approach.time.date() == date and start_time <= approach.time
+        ]
+        self.assertGreater(len(expected), 0)
+        filters = create_filters(date=date, start_time=start_time)
+        self.assertEqual(expected, list(self.db.query(filters)))
+
+        filters = create_filters(date=date, start_time=datetime.datetime(2020, 3, 3))
+        self.assertEqual(self.db._snapshot.ranges(disjunctive_normal_form(filters)), [])
+
+    def test_date_filters_compare_ordinals(self):
+        filter = DateFilter.on(datetime.date(2020, 3, 2))
+        self.assertEqual(filter.value, datetime.date(2020, 3, 2).toordinal())
+        self.assertEqual(repr(filter), 'DateFilter(op=operator.eq, value=2020-03-02)')
+        self.assertEqual(repr(TimeFilter.after(datetime.datetime(2020, 3, 2, 6, 30))),
+                         'TimeFilter(op=operator.ge, value=2020-03-02 06:30)')
+
+
+class TestFilterNormalization(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_create_filters_merges_bounds_on_each_attribute(self):
+        date = datetime.date(2020, 3, 2)
+        filters = create_filters(date=date, start_date=datetime.date(2020, 2, 1),
+                                 end_date=datetime.date(2020, 4, 1))
+        self.assertEqual(len(filters), 1)
+        self.assertIs(filters[0].op, operator.eq)
+        self.assertEqual(filters[0].value, date.toordinal())
+
+        filters = create_filters(distance_min=0.1, distance_max=0.1, velocity_min=5)
+        self.assertEqual([(type(f), f.op, f.value) for f in filters],
+                         [(DistanceFilter, operator.eq, 0.1), (VelocityFilter, operator.ge, 5)])
+
+    def test_conjunction_keeps_the_tightest_bounds(self):
+        conjunction = Conjunction([DistanceFilter(operator.ge, 0.1), DistanceFilter(operator.ge, 0.2),
+                                   DistanceFilter(operator.le, 0.5), DistanceFilter(operator.le, 0.4),
+                                   DateFilter(operator.gt, datetime.date(2020, 1, 1)),
+                                   DistanceFilter(operator.ne, 0.3)])
+        self.assertFalse(conjunction.empty)
+        self.assertEqual(conjunction.interval(DistanceFilter), (0.2, 0.4))
+        self.assertEqual(conjunction.interval(DateFilter), (datetime.date(2020, 1, 2).toordinal(), None))
+        self.assertEqual(len(conjunction.filters()), 4)
+
+    def test_contradictory_filters_scan_nothing(self):
+        for filters in (create_filters(date=datetime.date(2020, 1, 1), start_date=datetime.date(2021, 1, 1)),
+                        create_filters(distance_min=0.5, distance_max=0.1),
+                        And(HazardousFilter(operator.eq, True), parse_where('not hazardous = false'),
+                            HazardousFilter(operator.eq, False))):
+            self.assertEqual(self.db._snapshot.ranges(disjunctive_normal_form(filters)), [])
+            self.assertEqual(list(self.db.query(filters)), [])
+
+        # the conflicting bounds are kept, so that calling the filters agrees
+        filters = create_filters(distance_min=0.5, distance_max=0.1)
+        self.assertTrue(Conjunction(filters).empty)
+        self.assertFalse(any(all(f(approach) for f in filters) for approach in self.approaches))
+
+
+class TestFilterExpressions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        # in index order, like query results: by time, then by designation
+        cls.approaches = sorted(load_approaches(TEST_CAD_FILE),
+                                key=lambda approach: (approach.time, approach._designation))
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_query_with_or_matches_union_without_duplicates(self):
+        expected = [
+            approach for approach in self.approaches
+            if approach.neo.hazardous or approach.neo.diameter > 1
+        ]
+        self.assertGreater(len(expected), 0)
+        received = list(self.db.query(parse_where('hazardous or diameter > 1')))
+        self.assertEqual(expected, received)
+
+    def test_query_with_date_disjuncts_and_negation(self):
+        march, may = datetime.date(2020, 3, 2), datetime.date(2020, 5, 1)
+        expected = [
+            approach for approach in self.approaches
+            if approach.time.date() in (march, may) and not approach.distance > 0.1
+        ]
+        self.assertGreater(len(expected), 0)
+        expression = And(Or(DateFilter.on(march), DateFilter.on(may)),
+                         Not(DistanceFilter(operator.gt, 0.1)))
+        self.assertEqual(expected, list(self.db.query(expression)))
+        self.assertEqual(expected, list(self.db.query(
+            parse_where('(date = 2020-03-02 or date = 2020-05-01) and not distance > 0.1'))))
+
+    def test_disjunctive_normal_form(self):
+        a, b, c = DateFilter.on(datetime.date(2020, 1, 1)), DistanceFilter(operator.le, 1), HazardousFilter(operator.eq, True)
+        self.assertEqual(disjunctive_normal_form([a, b]), [(a, b)])
+        self.assertEqual(disjunctive_normal_form(And(a, Or(b, c))), [(a, b), (a, c)])
+        dnf = disjunctive_normal_form(Not(Or(a, Not(b))))
+        self.assertEqual(len(dnf), 1)
+        self.assertIsInstance(dnf[0][0], Not)
+        self.assertIs(dnf[0][1], b)
+
+    def test_large_and_of_ors_plans_quickly_and_scans_the_full_range(self):
+        pairs = [Or(DistanceFilter(operator.le, 0.01 * (i + 1)), VelocityFilter(operator.ge, 20 + i))
+                 for i in range(18)]
+        expression = And(*pairs)
+        start = time.perf_counter()
+        plan = self.db.plan(expression)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(plan.access_path, 'full scan')
+        expected = [approach for approach in self.approaches if expression(approach)]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, list(self.db.execute(plan)))
+
+    def test_query_scans_only_the_date_ranges_of_the_disjuncts(self):
+        expression = parse_where('date = 2020-03-02 or date = 2020-05-01')
+        ranges = self.db._snapshot.ranges(disjunctive_normal_form(expression))
+        self.assertEqual(len(ranges), 2)
+        self.assertLess(sum(stop - start for start, stop in ranges), len(self.approaches) // 10)
+
+    def test_parse_where_rejects_malformed_expressions(self):
+        for text in ('', 'hazardous or', 'size > 1', 'distance > far', '(hazardous', 'hazardous)', 'distance ! 1'):
+            with self.assertRaises(InvalidExpressionError, msg=text):
+                parse_where(text)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed.")
+class TestVectorizedQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        # in index order, like query results: by time, then by designation
+        cls.approaches = sorted(load_approaches(TEST_CAD_FILE),
+                                key=lambda approach: (approach.time, approach._designation))
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_evaluate_matches_calling_each_filter(self):
+        columns = self.db._snapshot.columns()
+        for filter in create_filters(date=datetime.date(2020, 3, 2), distance_max=0.4,
+                                     velocity_min=10, diameter_min=0.5, hazardous=False):
+            mask = filter.evaluate(columns)
+            self.assertEqual(mask.tolist(), [bool(filter(approach)) for approach in self.approaches])
+
+    def test_vectorized_query_matches_per_filter_query(self):
+        filters = create_filters(
+            start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 5, 31),
+            distance_min=0.05, distance_max=0.5, velocity_min=5, velocity_max=25,
+            diameter_min=0.5, diameter_max=1.5, hazardous=False
+        )
+        expected = [approach for approach in self.approaches
+                    if all(filter(approach) for filter in filters)]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, list(self.db.query(filters)))
+
+    def test_vectorized_expression_matches_per_filter_evaluation(self):
+        expression = parse_where('not (hazardous or diameter > 1) and (distance < 0.05 or velocity >= 20)')
+        self.assertTrue(expression.vectorizable())
+        expected = [approach for approach in self.approaches if expression(approach)]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, list(self.db.query(expression)))
+
+    def test_vectorized_query_stops_after_the_block_that_fills_the_limit(self):
+        filters = create_filters(velocity_min=1)
+        results = self.db.query(filters)
+        self.assertEqual(len(list(limit(results, 3))), 3)
+        self.assertEqual(results.gi_frame.f_locals['block_start'], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
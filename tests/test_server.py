@@ -0,0 +1,135 @@
+"""Check that the HTTP server answers `inspect` and `query` requests.
+
+Each test talks to a server running on an event loop in a background thread,
+listening on a free port on localhost.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_server
+"""
+import asyncio
+import datetime
+import http.client
+import json
+import pathlib
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+
+from extract import load_neos, load_approaches
+from database import NEODatabase, make_cursor
+from filters import create_filters
+from main import make_parser
+from server import NEOServer
+from write import serialize_for_json
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        _, inspect_parser, query_parser = make_parser()
+        cls.server = NEOServer(cls.db, inspect_parser, query_parser)
+        cls.loop = asyncio.new_event_loop()
+        cls.listener = cls.loop.run_until_complete(cls.server.start('127.0.0.1', 0))
+        cls.port = cls.listener.sockets[0].getsockname()[1]
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.listener.close()
+        cls.loop.run_until_complete(cls.listener.wait_closed())
+        cls.loop.close()
+        cls.server.executor.shutdown()
+
+    def get(self, path, params=()):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            connection.request('GET', path + '?' + urlencode(params))
+            response = connection.getresponse()
+            return response, response.read().decode().splitlines()
+        finally:
+            connection.close()
+
+    def expected(self, results):
+        return [json.dumps(serialize_for_json(approach)) for approach in results]
+
+    def test_query_streams_matching_approaches(self):
+        response, lines = self.get('/query', [('start-date', '2020-03-01'), ('max_distance', '0.1')])
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Type'), 'application/x-ndjson')
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), distance_max=0.1)
+        self.assertEqual(lines, self.expected(self.db.query(filters)))
+        self.assertGreater(len(lines), 1000)
+
+    def test_query_with_flag_and_expression(self):
+        _, lines = self.get('/query', [('hazardous', ''), ('where', 'velocity > 30')])
+        self.assertTrue(lines)
+        for line in map(json.loads, lines):
+            self.assertTrue(line['neo']['potentially_hazardous'])
+            self.assertGreater(line['velocity_km_s'], 30)
+
+    def test_query_limit_sets_next_cursor(self):
+        response, page = self.get('/query', [('limit', '5')])
+        self.assertEqual(len(page), 5)
+        cursor = response.getheader('X-Next-Cursor')
+        first = list(self.db.query())[:10]
+        self.assertEqual(cursor, make_cursor(first[4]))
+
+        response, page = self.get('/query', [('limit', '5'), ('after', cursor)])
+        self.assertEqual(page, self.expected(first[5:]))
+
+    def test_query_last_page_has_no_cursor(self):
+        response, page = self.get('/query', [('date', '2020-01-01'), ('limit', '100000')])
+        self.assertTrue(page)
+        self.assertIsNone(response.getheader('X-Next-Cursor'))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ([('date', 'bad')], [('outfile', 'x.csv')], [('limit', 'ten')],
+                       [('limit', '-1')], [('where', 'diameter >')], [('after', '!!')]):
+            with self.subTest(params=params):
+                response, lines = self.get('/query', params)
+                self.assertEqual(response.status, 400)
+                self.assertIn('error', json.loads(lines[0]))
+
+    def test_unknown_endpoint_is_not_found(self):
+        response, lines = self.get('/nowhere')
+        self.assertEqual(response.status, 404)
+        self.assertIn('error', json.loads(lines[0]))
+
+    def test_inspect_by_designation(self):
+        response, lines = self.get('/inspect', [('pdes', '2020 AY1'), ('verbose', '')])
+        self.assertEqual(response.status, 200)
+        neo = self.db.get_neo_by_designation('2020 AY1')
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['designation'], '2020 AY1')
+        self.assertEqual(len(record['approaches']), len(neo.approaches))
+
+    def test_inspect_missing_neo_is_not_found(self):
+        response, _ = self.get('/inspect', [('name', 'not a real name')])
+        self.assertEqual(response.status, 404)
+
+    def test_concurrent_clients(self):
+        params = [('start-date', '2020-06-01'), ('end-date', '2020-06-30')]
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(lambda _: self.get('/query', params), range(16)))
+        _, expected = responses[0]
+        self.assertTrue(expected)
+        for response, lines in responses:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(lines, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
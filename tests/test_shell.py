@@ -0,0 +1,280 @@
+"""Check the interactive shell's loading of the data files in the background,
+its reloading of changed data files, and its `timing`, `profile` and `explain`
+commands.
+
+For the reloading tests, the data files are copied to a temporary directory,
+so that they can be modified while a shell is watching them.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_shell
+"""
+import contextlib
+import datetime
+import io
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+
+from extract import load_neos, load_approaches, load_approaches_in_chunks
+from database import NEODatabase
+from filters import create_filters
+from main import NEOShell, DataLoader, DataReloader, make_parser
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestBackgroundLoad(unittest.TestCase):
+    def setUp(self):
+        # load the first 1000 close approaches, and the rest only once resumed
+        self.resumed = threading.Event()
+
+        def paused_chunks(cadfile):
+            chunks = load_approaches_in_chunks(cadfile, chunk_size=1000)
+            yield next(chunks)
+            self.resumed.wait()
+            yield from chunks
+
+        patcher = unittest.mock.patch('main.load_approaches_in_chunks', paused_chunks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_shell(self, cadfile=TEST_CAD_FILE, partial=False):
+        loader = DataLoader(TEST_NEO_FILE, cadfile)
+        _, inspect_parser, query_parser = make_parser()
+        self.shell = NEOShell(loader.database, inspect_parser, query_parser,
+                              loader=loader, partial=partial)
+        self.addCleanup(self.shell.postloop)
+        self.addCleanup(self.resumed.set)
+        self.shell.preloop()
+        return loader
+
+    def run_command(self, line):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            self.shell.onecmd(self.shell.precmd(line))
+        return stdout.getvalue(), stderr.getvalue()
+
+    def wait_for_first_chunk(self, loader):
+        deadline = time.monotonic() + 30
+        while loader.count < 1000 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_inspect_runs_once_the_neos_are_loaded(self):
+        loader = self.start_shell()
+        # the close approaches are still paused, so this only waits for the NEOs
+        self.assertTrue(loader.neos_loaded.wait(30))
+        stdout, stderr = self.run_command('inspect --pdes "2020 AY1"')
+        self.assertTrue(stdout.startswith('A NearEarthObject 2020 AY1'))
+        self.assertNotIn('Waiting', stderr)
+
+    def test_queries_wait_for_the_close_approaches(self):
+        loader = self.start_shell()
+        self.wait_for_first_chunk(loader)
+        threading.Timer(0.5, self.resumed.set).start()
+        stdout, stderr = self.run_command('query --limit 5000')
+        self.assertIn('Waiting for the data files: ', stderr)
+        self.assertEqual(len(stdout.splitlines()), 4700)
+
+        _, stderr = self.run_command('partial')
+        self.assertRegex(stderr, r'Loaded 4,700 close approaches in \d+\.\d s\.')
+        self.assertIsNone(self.shell.loader)
+
+    def test_partial_queries_run_against_the_close_approaches_loaded_so_far(self):
+        loader = self.start_shell(partial=True)
+        self.wait_for_first_chunk(loader)
+        stdout, stderr = self.run_command('query --limit 5000')
+        approaches = load_approaches(TEST_CAD_FILE)[:1000]
+        self.assertEqual(len(stdout.splitlines()), 1000)
+        latest = max(approach.time for approach in approaches)
+        self.assertRegex(stderr, rf'Partial results: \d+% \(1,000 close approaches, '
+                                 rf'through {latest:%Y-%m-%d %H:%M}\)\.')
+
+        self.assertEqual(self.run_command('partial off'), ("Partial results are off.\n", ''))
+        self.resumed.set()
+        stdout, stderr = self.run_command('query --limit 5000')
+        self.assertEqual(len(stdout.splitlines()), 4700)
+        self.assertNotIn('Partial results', stderr)
+
+    def test_unreadable_files_are_reported(self):
+        self.start_shell(cadfile=TEST_CAD_FILE.with_name('missing.json'))
+        stdout, stderr = self.run_command('query')
+        self.assertEqual(stdout, '')
+        self.assertIn('Unable to load the data files', stderr)
+
+
+class TestDataReload(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.neofile = pathlib.Path(self.tmpdir.name) / 'neos.csv'
+        self.cadfile = pathlib.Path(self.tmpdir.name) / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neofile)
+        shutil.copy(TEST_CAD_FILE, self.cadfile)
+        self.db = NEODatabase(load_neos(self.neofile), load_approaches(self.cadfile))
+        _, inspect_parser, query_parser = make_parser()
+        self.shell = NEOShell(self.db, inspect_parser, query_parser,
+                              data_files=(self.neofile, self.cadfile))
+        self.shell.reloader.interval = 0.01
+
+    def tearDown(self):
+        self.shell.postloop()
+        self.tmpdir.cleanup()
+
+    def keep_january(self):
+        """Rewrite the close approach file with only the close approaches in January."""
+        with open(self.cadfile) as infile:
+            data = json.load(infile)
+        data['data'] = [row for row in data['data'] if '-Jan-' in row[3]]
+        with open(self.cadfile, 'w') as outfile:
+            json.dump(data, outfile)
+        # make sure that the change is seen, however coarse the file system's clock
+        os.utime(self.cadfile, ns=(0, 0))
+        return len(data['data'])
+
+    def swap(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.shell.precmd('')
+        return stderr.getvalue()
+
+    def test_changed_files_are_reloaded_in_the_background(self):
+        self.shell.preloop()
+        count = self.keep_january()
+        deadline = time.monotonic() + 30
+        while self.shell.reloader.result is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # the database is only replaced between commands
+        self.assertIs(self.shell.db, self.db)
+
+        self.assertRegex(self.swap(), r'Reloaded the data files in \d+\.\d s\.')
+        self.assertIsNot(self.shell.db, self.db)
+        self.assertEqual(len(list(self.shell.db.query())), count)
+        self.assertEqual(self.swap(), '')
+
+    def test_unchanged_files_are_not_reloaded(self):
+        self.shell.preloop()
+        time.sleep(0.1)
+        self.assertEqual(self.swap(), '')
+        self.assertIs(self.shell.db, self.db)
+
+    def test_standing_queries_are_kept(self):
+        filters = create_filters(hazardous=True)
+        self.db.register_standing_query('hazardous', filters)
+        self.keep_january()
+        self.shell.reloader.offer(self.shell.reloader.reload())
+        self.swap()
+        standing_query = self.shell.db.get_standing_query('hazardous')
+        self.assertEqual(list(standing_query), list(self.shell.db.query(filters)))
+
+    def test_standing_queries_changed_while_reloading_are_carried_over(self):
+        self.db.register_standing_query('kept', create_filters(hazardous=True))
+        self.db.register_standing_query('dropped', create_filters(hazardous=False))
+        self.keep_january()
+        result = self.shell.reloader.reload()
+        self.db.unregister_standing_query('dropped')
+        filters = create_filters(distance_max=0.1)
+        self.db.register_standing_query('added', filters)
+        self.shell.reloader.offer(result)
+        self.swap()
+
+        self.assertEqual(set(self.shell.db.standing_queries), {'kept', 'added'})
+        self.assertEqual(list(self.shell.db.get_standing_query('added')),
+                         list(self.shell.db.query(filters)))
+
+    def test_reloads_offered_while_taking_are_not_lost(self):
+        reloader = self.shell.reloader
+        results = [DataReloader.Result(None, {}, 0, number) for number in range(20000)]
+        offering = threading.Thread(target=lambda: [reloader.offer(result) for result in results])
+        offering.start()
+        taken = []
+        while offering.is_alive():
+            taken.append(reloader.take())
+        offering.join()
+        taken.append(reloader.take())
+        # the latest reload is always taken, however the threads interleave
+        self.assertIs([result for result in taken if result is not None][-1], results[-1])
+
+    def test_unreadable_files_keep_the_old_database(self):
+        with open(self.cadfile, 'w') as outfile:
+            outfile.write('{"data": [')
+        self.shell.reloader.offer(self.shell.reloader.reload())
+        self.assertIn('Unable to reload the data files', self.swap())
+        self.assertIs(self.shell.db, self.db)
+
+
+class TestTimingAndProfiling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def setUp(self):
+        _, inspect_parser, query_parser = make_parser()
+        self.shell = NEOShell(self.db, inspect_parser, query_parser)
+
+    def run_command(self, line):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            self.shell.onecmd(line)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_timing_is_off_by_default(self):
+        self.assertEqual(self.run_command('timing'), ("Timing is off.\n", ''))
+        _, stderr = self.run_command('query --date 2020-01-01')
+        self.assertNotIn('Time:', stderr)
+
+    def test_timing_reports_rows_scanned_and_returned(self):
+        self.run_command('timing on')
+        _, stderr = self.run_command('query --date 2020-01-01 --max-distance 0.1 --limit 0')
+        january_first = [approach for approach in self.db.query()
+                         if approach.time.date() == datetime.date(2020, 1, 1)]
+        matches = [approach for approach in january_first if approach.distance <= 0.1]
+        self.assertRegex(stderr, rf'Time: \d+\.\d{{3}} s, {len(january_first)} rows scanned, '
+                                 rf'{len(matches)} rows returned\.')
+
+        _, stderr = self.run_command('inspect --verbose --pdes "2020 AY1"')
+        self.assertIn('3 rows scanned, 3 rows returned', stderr)
+
+        self.run_command('timing off')
+        _, stderr = self.run_command('query --date 2020-01-01')
+        self.assertNotIn('Time:', stderr)
+
+    def test_timing_rejects_other_arguments(self):
+        self.assertIn('Usage', self.run_command('timing sometimes')[1])
+
+    def test_explain_prints_the_plan_instead_of_results(self):
+        for line in ('explain --date 2020-01-01 --max-distance 0.1',
+                     'query --date 2020-01-01 --max-distance 0.1 --explain'):
+            with self.subTest(line=line):
+                stdout, _ = self.run_command(line)
+                self.assertNotIn('On 2020-', stdout)
+                self.assertIn('Access path: time slice', stdout)
+                self.assertIn('1. DateFilter(op=operator.eq, value=2020-01-01)', stdout)
+                self.assertRegex(stdout, r'Rows scanned: (\d+) estimated, \1 actual')
+                self.assertRegex(stdout, r'Time: plan \d+\.\d{3} s, .*scan \d+\.\d{3} s')
+
+    def test_explain_rejects_batches(self):
+        self.assertIn('Unable to explain', self.run_command('explain --batch queries.txt')[1])
+
+    def test_profile_lists_hot_functions(self):
+        stdout, _ = self.run_command('profile query --start-date 2020-01-01 --limit 0 --hazardous')
+        self.assertIn('On 2020-', stdout)
+        self.assertIn('Ordered by: internal time', stdout)
+        self.assertIn('function calls', stdout)
+
+    def test_profile_needs_a_command(self):
+        for line in ('profile', 'profile profile query'):
+            self.assertIn('Usage', self.run_command(line)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
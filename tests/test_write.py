@@ -13,21 +13,30 @@ To run these tests from the project root, run:
 
 These tests should pass when Task 4 is complete.
 """
+import bz2
 import collections
 import collections.abc
 import contextlib
+import copy
 import csv
 import datetime
+import gzip
 import io
 import json
+import lzma
+import math
 import pathlib
+import tempfile
 import unittest
 import unittest.mock
+from itertools import chain
 
 
 from extract import load_neos, load_approaches
 from database import NEODatabase
-from write import write_to_csv, write_to_json
+from write import (write_to_csv, write_to_json, write_to_ndjson, write_to_npz, write_to_arrow,
+                   write_in_background, write_shards, writer_for, render, COMPRESSORS, np, pa,
+                   zstandard)
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -131,6 +140,13 @@ class TestWriteToCSV(unittest.TestCase):
         self.assertGreater(len(rows), 0)
         self.assertSetEqual(set(fieldnames), set(rows[0].keys()))
 
+    def test_csv_rows_match_serialized_approaches(self):
+        rows = tuple(csv.DictReader(io.StringIO(self.value)))
+        for row, approach in zip(rows, build_results(5)):
+            data = approach.serialize()
+            data.update(data.pop('neo'))
+            self.assertEqual(row, {key: '' if value is None else str(value) for key, value in data.items()})
+
 
 class TestWriteToJSON(unittest.TestCase):
     @classmethod
@@ -226,5 +242,310 @@ class TestWriteToJSON(unittest.TestCase):
         self.assertIsInstance(approach['neo']['potentially_hazardous'], bool)
 
 
+class TestStreamingJSON(unittest.TestCase):
+    @unittest.mock.patch('write.open')
+    def write(self, results, mock_file):
+        with UncloseableStringIO() as buf:
+            mock_file.return_value = buf
+            write_to_json(results, None)
+            return buf.getvalue()
+
+    def test_streamed_output_matches_json_dump(self):
+        results = build_results(50)
+        value = self.write(iter(results))
+        self.assertEqual(value, json.dumps(json.loads(value)))
+        self.assertEqual(len(json.loads(value)), 50)
+        self.assertEqual(json.loads(value)[0]['datetime_utc'], results[0].serialize()['datetime_utc'])
+
+    def test_empty_results_are_an_empty_list(self):
+        self.assertEqual(self.write(iter(())), '[]')
+
+
+class TestColumnarWriters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(100)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def assertColumnsMatch(self, columns):
+        self.assertEqual(columns['time'], [approach.time_key for approach in self.results])
+        self.assertEqual(columns['velocity'], [approach.velocity for approach in self.results])
+        self.assertEqual(columns['hazardous'], [approach.neo.hazardous for approach in self.results])
+        self.assertEqual(columns['designation'], [approach.neo.designation for approach in self.results])
+        self.assertEqual(columns['name'], [approach.neo.name or '' for approach in self.results])
+        for diameter, approach in zip(columns['diameter'], self.results):
+            self.assertTrue(diameter == approach.neo.diameter
+                            or math.isnan(diameter) and math.isnan(approach.neo.diameter))
+
+    @unittest.skipIf(np is None, "NumPy isn't installed")
+    def test_npz_holds_typed_columns(self):
+        path = pathlib.Path(self.tmpdir.name) / 'results.npz'
+        with unittest.mock.patch('write.BATCH_SIZE', 30):
+            write_to_npz(iter(self.results), path)
+        with np.load(path) as data:
+            self.assertEqual(data['time'].dtype, np.int64)
+            self.assertEqual(data['hazardous'].dtype, np.bool_)
+            columns = {column: data[column].tolist() for column in data.files}
+        for column in ('designation', 'name'):
+            dictionary = columns.pop(f'{column}_dictionary')
+            self.assertEqual(len(set(dictionary)), len(dictionary))
+            columns[column] = [dictionary[index] for index in columns[column]]
+        self.assertColumnsMatch(columns)
+
+    @unittest.skipIf(np is None, "NumPy isn't installed")
+    def test_npz_of_no_results(self):
+        path = pathlib.Path(self.tmpdir.name) / 'results.npz'
+        write_to_npz(iter(()), path)
+        with np.load(path) as data:
+            self.assertEqual(len(data['time']), 0)
+
+    @unittest.skipIf(np is None, "NumPy isn't installed")
+    def test_compressed_npz_round_trips(self):
+        path = pathlib.Path(self.tmpdir.name) / 'results.npz.gz'
+        writer_for(path)(iter(self.results), path)
+        with gzip.open(path) as file, np.load(io.BytesIO(file.read())) as data:
+            self.assertEqual(data['time'].tolist(), [approach.time_key for approach in self.results])
+            self.assertEqual(data['velocity'].tolist(), [approach.velocity for approach in self.results])
+
+    @unittest.skipIf(pa is None, "PyArrow isn't installed")
+    def test_arrow_stream_holds_typed_columns(self):
+        path = pathlib.Path(self.tmpdir.name) / 'results.arrow'
+        with unittest.mock.patch('write.BATCH_SIZE', 30):
+            write_to_arrow(iter(self.results), path)
+        with pa.ipc.open_stream(path.read_bytes()) as reader:
+            table = reader.read_all()
+        self.assertEqual(table.schema.field('time').type, pa.int64())
+        self.assertColumnsMatch({name: table.column(name).to_pylist() for name in table.column_names})
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_output_matches_writing_in_the_foreground(self):
+        results = build_results(1000)
+        for writer, name in ((write_to_csv, 'results.csv'), (write_to_json, 'results.json')):
+            foreground = pathlib.Path(self.tmpdir.name) / name
+            background = pathlib.Path(self.tmpdir.name) / ('background-' + name)
+            writer(results, foreground)
+            timings = collections.defaultdict(float)
+            with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 64):
+                write_in_background(writer, iter(results), background, timings)
+            self.assertEqual(foreground.read_text(), background.read_text())
+            self.assertGreater(timings['write'], 0)
+
+    def test_producer_waits_for_slow_writer(self):
+        produced = []
+
+        def results():
+            for n in range(1000):
+                produced.append(n)
+                yield n
+
+        lags = []
+
+        def writer(stream, filename):
+            for consumed, _ in enumerate(stream, start=1):
+                lags.append(len(produced) - consumed)
+
+        with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 10), \
+                unittest.mock.patch('write.PIPELINE_DEPTH', 2):
+            write_in_background(writer, results(), None)
+        self.assertEqual(len(lags), 1000)
+        # at most the queued batches, the one being written and the one being produced
+        self.assertLessEqual(max(lags), 4 * 10)
+
+    def test_writer_errors_are_raised(self):
+        def writer(stream, filename):
+            next(iter(stream))
+            raise OSError("disk full")
+
+        with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 1), \
+                unittest.mock.patch('write.PIPELINE_DEPTH', 1):
+            with self.assertRaises(OSError):
+                write_in_background(writer, iter(range(100)), None)
+
+    def test_query_errors_are_raised(self):
+        def results():
+            yield from range(10)
+            raise ValueError("bad query")
+
+        written = []
+        with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 5), self.assertRaises(ValueError):
+            write_in_background(lambda stream, filename: written.extend(stream), results(), None)
+        self.assertEqual(written, list(range(10)))
+
+
+class TestCompressedOutput(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(500)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name):
+        return pathlib.Path(self.tmpdir.name) / name
+
+    def test_writer_for_skips_compression_extension(self):
+        self.assertIs(writer_for(pathlib.Path('results.csv')), write_to_csv)
+        self.assertIs(writer_for(pathlib.Path('results.csv.gz')), write_to_csv)
+        self.assertIs(writer_for(pathlib.Path('results.v2.json.xz')), write_to_json)
+        self.assertIsNone(writer_for(pathlib.Path('results.gz')))
+        self.assertIsNone(writer_for(pathlib.Path('results.txt.bz2')))
+
+    def test_compressed_output_decompresses_to_plain_output(self):
+        for writer, name in ((write_to_csv, 'results.csv'), (write_to_json, 'results.json'),
+                             (write_to_ndjson, 'results.jsonl')):
+            writer(self.results, self.path(name))
+            expected = self.path(name).read_bytes()
+            for extension in COMPRESSORS:
+                for threaded in (False, True):
+                    compressed = self.path(name + extension)
+                    writer(iter(self.results), compressed, threaded=threaded)
+                    self.assertEqual(self.decompress(compressed), expected)
+
+    def test_compression_level(self):
+        write_to_csv(self.results, self.path('fast.csv.gz'), level=1)
+        write_to_csv(self.results, self.path('small.csv.gz'), level=9)
+        self.assertEqual(self.decompress(self.path('fast.csv.gz')),
+                         self.decompress(self.path('small.csv.gz')))
+        self.assertGreater(self.path('fast.csv.gz').stat().st_size,
+                           self.path('small.csv.gz').stat().st_size)
+
+    def test_compression_thread_errors_are_raised(self):
+        with unittest.mock.patch.dict(COMPRESSORS, {'.gz': lambda filename, level: FailingFile()}):
+            with self.assertRaises(OSError):
+                write_to_csv(self.results * 50, self.path('results.csv.gz'), threaded=True)
+
+    @staticmethod
+    def decompress(path):
+        if path.suffix == '.zst':
+            return zstandard.ZstdDecompressor().stream_reader(path.read_bytes()).read()
+        decompressors = {'.gz': gzip.decompress, '.xz': lzma.decompress, '.bz2': bz2.decompress}
+        return decompressors[path.suffix](path.read_bytes())
+
+
+class TestShards(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(1000)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.outfile = pathlib.Path(self.tmpdir.name) / 'results.csv.gz'
+
+    def read_shards(self):
+        with open(pathlib.Path(self.tmpdir.name) / 'results-manifest.json') as file:
+            manifest = json.load(file)
+        rows = []
+        for shard in manifest['shards']:
+            with gzip.open(pathlib.Path(self.tmpdir.name) / shard['path'], 'rt', newline='') as file:
+                shard_rows = list(csv.DictReader(file))
+            self.assertEqual(len(shard_rows), shard['rows'])
+            self.assertEqual(shard_rows[0]['datetime_utc'], shard['start'])
+            self.assertEqual(shard_rows[-1]['datetime_utc'], shard['end'])
+            rows.extend(shard_rows)
+        self.assertEqual(manifest['rows'], len(rows))
+        return manifest, rows
+
+    def test_shard_by_count(self):
+        shards = write_shards(write_to_csv, iter(self.results), self.outfile, 'count', 300, workers=2)
+        self.assertEqual([shard['path'] for shard in shards],
+                         [f'results-000{n}.csv.gz' for n in range(1, 5)])
+        self.assertEqual([shard['rows'] for shard in shards], [300, 300, 300, 100])
+        manifest, rows = self.read_shards()
+        self.assertEqual(manifest['shard_by'], 'count')
+        self.assertEqual([row['datetime_utc'] for row in rows],
+                         [approach.serialize()['datetime_utc'] for approach in self.results])
+
+    def test_shard_by_year(self):
+        later = [copy.copy(approach) for approach in self.results[600:]]
+        for approach in later:
+            approach.time = approach.time.replace(year=2024)
+        write_shards(write_to_csv, list(self.results[:600]) + later, self.outfile, 'year')
+        manifest, rows = self.read_shards()
+        self.assertEqual([(shard['path'], shard['rows']) for shard in manifest['shards']],
+                         [('results-2020.csv.gz', 600), ('results-2024.csv.gz', 400)])
+
+    def test_shard_by_size(self):
+        size = 3000
+        shards = write_shards(write_to_csv, iter(self.results), self.outfile, 'size', size)
+        self.assertGreater(len(shards), 2)
+        for shard in shards:
+            self.assertLess(shard['bytes'], size * 1.5)
+        _, rows = self.read_shards()
+        self.assertEqual(len(rows), len(self.results))
+
+    def test_shards_are_written_while_they_are_split(self):
+        pulled = []
+
+        def results():
+            for approach in self.results:
+                pulled.append(approach)
+                yield approach
+
+        pulled_before_writing = []
+
+        def writer(rows, path, **options):
+            rows = iter(rows)
+            first = next(rows)
+            pulled_before_writing.append(len(pulled))
+            write_to_csv(chain((first,), rows), path, **options)
+
+        with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 50):
+            shards = write_shards(writer, results(), self.outfile, 'count', len(self.results))
+        self.assertEqual([shard['rows'] for shard in shards], [len(self.results)])
+        self.assertLess(pulled_before_writing[0], len(self.results))
+
+    def test_failed_shard_writer_is_reported(self):
+        def writer(rows, path, **options):
+            raise OSError("disk full")
+
+        with unittest.mock.patch('write.PIPELINE_BATCH_SIZE', 50):
+            with self.assertRaises(OSError):
+                write_shards(writer, iter(self.results), self.outfile, 'count', 300, workers=2)
+
+
+class TestRender(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(300)
+
+    def test_sentences_match_str(self):
+        buf = io.StringIO()
+        render(iter(self.results), buf, prefix='- ')
+        self.assertEqual(buf.getvalue().splitlines(), [f"- {approach}" for approach in self.results])
+
+    def test_tsv_matches_csv(self):
+        buf = io.StringIO()
+        render(self.results, buf, tsv=True)
+        with UncloseableStringIO() as csv_buf:
+            with unittest.mock.patch('write.open', return_value=csv_buf):
+                write_to_csv(self.results, None)
+            expected = list(csv.reader(io.StringIO(csv_buf.getvalue())))
+        self.assertEqual(list(csv.reader(io.StringIO(buf.getvalue()), dialect='excel-tab')), expected)
+
+    def test_one_write_per_batch(self):
+        stream = unittest.mock.Mock()
+        with unittest.mock.patch('write.RENDER_BATCH_SIZE', 100):
+            render(self.results, stream)
+        self.assertEqual(stream.write.call_count, 3)
+
+
+class FailingFile(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        raise OSError("disk full")
+
+
 if __name__ == '__main__':
     unittest.main()
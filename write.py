@@ -1,52 +1,194 @@
-"""Write a stream of close approaches to CSV or to JSON.
+"""Write a stream of close approaches to CSV, to JSON, to JSON Lines or to
+binary columnar formats.
 
-This module exports two functions: `write_to_csv` and `write_to_json`, each of
-which accept an `results` stream of close approaches and a path to which to
-write the data.
+This module exports the functions `write_to_csv`, `write_to_json` and
+`write_to_ndjson`, as well as `write_to_npz` (with NumPy) and `write_to_arrow`
+(with PyArrow), each of which accept an `results` stream of close approaches
+and a path to which to write the data.
 
 These functions are invoked by the main module with the output of the `limit`
 function and the filename supplied by the user at the command line. The file's
-extension determines which of these functions is used.
+extension determines which of these functions is used, as listed in `WRITERS`.
+A further extension (such as `.csv.gz` or `.json.xz`) compresses the output,
+with one of the `COMPRESSORS` - see `open_output` and `writer_for`.
+
+Large outputs can be split into shards by `write_shards`, which writes them
+with a pool of writers and lists them in a manifest.
+
+The `render` function writes close approaches to a text stream such as stdout,
+as sentences or as tab-separated values, in chunks.
 
 You'll edit this file in Part 4.
 """
+import bz2
+import collections
 import csv
+import gzip
+import io
 import json
+import lzma
 import math
+import os
+import pathlib
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, count, groupby, islice
+
+from helpers import datetime_to_str
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it, results can't be saved as .npz.
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # PyArrow is optional; without it, results can't be saved as .arrow.
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; without it, results can't be compressed to .zst.
+    zstandard = None
+
+
+# The size of the buffer of every output file, so that data is written to disk
+# in large chunks.
+BUFFER_SIZE = 2 ** 20
+# The number of close approaches converted to columns at a time by the
+# columnar writers.
+BATCH_SIZE = 65536
+# The number of close approaches formatted by `render` for each write.
+RENDER_BATCH_SIZE = 1024
+# The number of close approaches handed to a background writer at a time, and
+# the most batches that can be waiting for it.
+PIPELINE_BATCH_SIZE = 4096
+PIPELINE_DEPTH = 8
+# The ways in which `write_shards` can split results, and the default size of
+# a shard for each (in close approaches for 'count', in bytes for 'size').
+SHARD_SIZES = {'year': None, 'count': 1000000, 'size': 256 * 2 ** 20}
+# The number of shards written at once, and the number of close approaches
+# written to estimate the size of the shards split by size.
+SHARD_WORKERS = 4
+SHARD_SAMPLE_SIZE = 1000
+
 
+# The columns of CSV and TSV output.
+FIELDNAMES = ('datetime_utc', 'distance_au', 'velocity_km_s', 'designation', 'name',
+              'diameter_km', 'potentially_hazardous')
 
-def write_to_csv(results, filename):
+
+def write_to_csv(results, filename, **options):
     """Write an iterable of `CloseApproach` objects to a CSV file.
 
     The precise output specification is in `README.md`. Roughly, each output row
     corresponds to the information in a single close approach from the `results`
     stream and its associated near-Earth object.
 
+    The rows are built as tuples, straight from the attributes of each close
+    approach, and written in batches; the NEO columns are formatted once per
+    NEO rather than once per row.
+
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data should be saved.
+    :param options: Options for `open_output`, such as the compression level.
     """
-    fieldnames = ('datetime_utc', 'distance_au', 'velocity_km_s', 'designation', 'name', 'diameter_km', 'potentially_hazardous')
-    with open(filename, 'w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
+    neo_columns = {}
+    results = iter(results)
+    with open_output(filename, 'w', newline='', **options) as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDNAMES)
+        while True:
+            batch = list(islice(results, BATCH_SIZE))
+            if not batch:
+                break
+            writer.writerows(_csv_rows(batch, neo_columns))
 
-        for result in results:
-            data = result.serialize()  # serialize CloseApproach
-            neo = data['neo']
-            # flatten nested dictionary (NEO attributes are nested) into a single dictionary row
-            row = {
-                'datetime_utc': data['datetime_utc'],
-                'distance_au': data['distance_au'],
-                'velocity_km_s': data['velocity_km_s'],
-                'designation': neo['designation'],
-                'name': neo['name'],
-                'diameter_km': neo['diameter_km'],
-                'potentially_hazardous': neo['potentially_hazardous']
-            }
-            writer.writerow(row)
-
-
-def write_to_json(results, filename):
+
+def _csv_rows(results, neo_columns):
+    """Generate the CSV rows of close approaches, as tuples.
+
+    Each row has the same values as the serialized close approach and NEO.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param neo_columns: A dictionary caching the (serialized) NEO columns of
+    each `NearEarthObject`, which is filled in as NEOs are first seen.
+    :return: A generator of row tuples, in the order of the CSV header.
+    """
+    for approach in results:
+        neo = approach.neo
+        columns = neo_columns.get(neo)
+        if columns is None:
+            columns = neo_columns[neo] = tuple(neo.serialize().values())
+        yield (_format_time(approach.time), approach.distance, approach.velocity) + columns
+
+
+def _format_time(time):
+    """Format a datetime like `datetime_to_str`, but faster.
+
+    :param time: A naive Python datetime.
+    :return: That datetime, as a YYYY-MM-DD HH:MM string.
+    """
+    # `isoformat` only differs from `datetime_to_str` for years before 1000,
+    # which it pads to 4 digits
+    return time.isoformat(' ', 'minutes') if time.year >= 1000 else datetime_to_str(time)
+
+
+def render(results, stream, tsv=False, prefix=''):
+    """Write an iterable of `CloseApproach` objects to a text stream, such as stdout.
+
+    Each close approach is written on its own line, either as its `str` or,
+    with `tsv`, as tab-separated values with the same columns as a CSV file
+    (after a header line). The lines are formatted `RENDER_BATCH_SIZE` at a
+    time, and each batch is written with one call. The text that depends on the
+    NEO only is formatted once per NEO.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param stream: A text stream to which to write.
+    :param tsv: Whether to write tab-separated values rather than sentences.
+    :param prefix: A string to write at the start of each sentence.
+    """
+    cache = {}
+    results = iter(results)
+    if tsv:
+        stream.write('\t'.join(FIELDNAMES) + '\n')
+    while True:
+        batch = list(islice(results, RENDER_BATCH_SIZE))
+        if not batch:
+            break
+        if tsv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, dialect='excel-tab', lineterminator='\n')
+            writer.writerows(_csv_rows(batch, cache))
+            stream.write(buffer.getvalue())
+        else:
+            stream.write(''.join(_sentences(batch, cache, prefix)))
+
+
+def _sentences(results, neo_text, prefix):
+    """Generate the lines of text of close approaches, the same as their `str`.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param neo_text: A dictionary caching the text about each `NearEarthObject`
+    before and after the distance and velocity.
+    :param prefix: A string to start each line with.
+    :return: A generator of lines, ending with a newline.
+    """
+    for approach in results:
+        neo = approach.neo
+        text = neo_text.get(neo)
+        if text is None:
+            text = neo_text[neo] = (
+                f"a NEO {neo.fullname} approaches Earth at a distance of",
+                f"km/s and is {'' if neo.hazardous else 'not '}hazardous.\n")
+        yield (f"{prefix}On {_format_time(approach.time)}, {text[0]} {approach.distance} au "
+               f"and a velocity of {approach.velocity} {text[1]}")
+
+
+def write_to_json(results, filename, **options):
     """Write an iterable of `CloseApproach` objects to a JSON file.
 
     The precise output specification is in `README.md`. Roughly, the output is a
@@ -54,21 +196,498 @@ def write_to_json(results, filename):
     their values and the 'neo' key mapping to a dictionary of the associated
     NEO's attributes.
 
+    The list is written incrementally - each close approach is encoded as soon
+    as it comes off the `results` stream - so memory use doesn't grow with the
+    number of results. The output is the same as `json.dump` of the whole list.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param options: Options for `open_output`, such as the compression level.
+    """
+    encode = json.JSONEncoder().encode
+    with open_output(filename, 'w', **options) as file:
+        file.write('[')
+        separator = ''
+        for result in results:
+            file.write(separator)
+            file.write(encode(serialize_for_json(result)))
+            separator = ', '
+        file.write(']')
+
+
+def write_to_ndjson(results, filename, **options):
+    """Write an iterable of `CloseApproach` objects to a JSON Lines file.
+
+    Each line of the output holds one close approach, serialized to a JSON
+    object exactly like an element of the list written by `write_to_json`.
+    Unlike a single JSON list, the file can be split between lines and read in
+    parallel. The lines are written as the results stream in.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param options: Options for `open_output`, such as the compression level.
+    """
+    encode = json.JSONEncoder().encode
+    with open_output(filename, 'w', **options) as file:
+        for result in results:
+            file.write(encode(serialize_for_json(result)))
+            file.write('\n')
+
+
+def write_to_npz(results, filename, **options):
+    """Write an iterable of `CloseApproach` objects to a NumPy `.npz` file.
+
+    The file holds one typed array per column: `time` (int64 minutes since the
+    epoch), `distance`, `velocity` and `diameter` (float64, NaN if missing) and
+    `hazardous` (bool). The `designation` and `name` columns are dictionary
+    encoded, as int32 indices into the string arrays `designation_dictionary`
+    and `name_dictionary`. The columns are filled in batches straight from the
+    attributes of the results.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param options: Options for `open_output`, such as the compression level.
+    """
+    dtypes = {'time': np.int64, 'distance': np.float64, 'velocity': np.float64,
+              'diameter': np.float64, 'hazardous': np.bool_,
+              'designation': np.int32, 'name': np.int32}
+    chunks = {column: [] for column in dtypes}
+    dictionaries = {'designation': {}, 'name': {}}
+    for batch in _column_batches(results, dictionaries):
+        for column, values in batch.items():
+            chunks[column].append(np.array(values, dtype=dtypes[column]))
+    arrays = {column: np.concatenate(chunks[column]) if chunks[column]
+              else np.empty(0, dtype=dtypes[column]) for column in dtypes}
+    for column, dictionary in dictionaries.items():
+        arrays[f'{column}_dictionary'] = np.array(list(dictionary), dtype=str)
+    # `np.savez` writes a zip archive, which seeks back to patch its headers -
+    # which compressed streams can't do - so the archive is built in memory.
+    archive = io.BytesIO()
+    np.savez(archive, **arrays)
+    with open_output(filename, 'wb', **options) as file:
+        file.write(archive.getbuffer())
+
+
+def write_to_arrow(results, filename, **options):
+    """Write an iterable of `CloseApproach` objects to an Arrow IPC stream file.
+
+    The columns and their types are those of `write_to_npz`, except that the
+    `designation` and `name` columns are Arrow dictionary arrays. Each batch of
+    results is written as a record batch as soon as it's filled, and only the
+    strings that are new in a batch are written, as a dictionary delta.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param options: Options for `open_output`, such as the compression level.
+    """
+    strings = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([('time', pa.int64()), ('distance', pa.float64()),
+                        ('velocity', pa.float64()), ('diameter', pa.float64()),
+                        ('hazardous', pa.bool_()), ('designation', strings), ('name', strings)])
+    ipc_options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    dictionaries = {'designation': {}, 'name': {}}
+    with open_output(filename, 'wb', **options) as file, \
+            pa.ipc.new_stream(file, schema, options=ipc_options) as writer:
+        for batch in _column_batches(results, dictionaries):
+            arrays = []
+            for field in schema:
+                if field.name in dictionaries:
+                    # each batch's dictionary extends the previous one
+                    arrays.append(pa.DictionaryArray.from_arrays(
+                        pa.array(batch[field.name], type=pa.int32()),
+                        pa.array(list(dictionaries[field.name]), type=pa.string())))
+                else:
+                    arrays.append(pa.array(batch[field.name], type=field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+
+def write_in_background(writer, results, filename, timings=None, **options):
+    """Write an iterable of `CloseApproach` objects with a writer on a background thread.
+
+    The calling thread evaluates the `results` stream and hands it over in
+    batches, through a bounded queue, to a thread that runs the writer - so the
+    results are written while the rest of them are evaluated. Whenever the
+    writer falls `PIPELINE_DEPTH` batches behind, the calling thread waits for
+    it, which keeps memory use bounded.
+
+    :param writer: A function that writes results to a file, like `write_to_csv`.
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data should be saved.
+    :param timings: A `collections.defaultdict(float)` to which to add the time
+    in seconds that the writer spent writing (`'write'`) and that the calling
+    thread spent waiting for the writer (`'wait'`), or `None`.
+    :param options: Options for the writer, such as the compression level.
+    :raises: Any exception raised by the writer.
     """
-    # create a list of serialized Close Approach dictionaries
-    data = [result.serialize() for result in results]
+    batches = queue.Queue(PIPELINE_DEPTH)
+    failures = []
+    idle = []
+    drained = threading.Event()
 
+    def drain():
+        # generate the results from the batches, until the `None` sentinel
+        while True:
+            start = time.perf_counter()
+            batch = batches.get()
+            idle.append(time.perf_counter() - start)
+            if batch is None:
+                drained.set()
+                return
+            yield from batch
+
+    def run():
+        start = time.perf_counter()
+        try:
+            writer(drain(), filename, **options)
+        except Exception as err:
+            failures.append(err)
+            # keep accepting batches, so that the calling thread doesn't block
+            while not drained.is_set() and batches.get() is not None:
+                pass
+        if timings is not None:
+            timings['write'] += time.perf_counter() - start - sum(idle)
+
+    thread = threading.Thread(target=run, name='writer')
+    thread.start()
+    results = iter(results)
+    waiting = 0
+    try:
+        while not failures:
+            batch = list(islice(results, PIPELINE_BATCH_SIZE))
+            if not batch:
+                break
+            start = time.perf_counter()
+            batches.put(batch)
+            waiting += time.perf_counter() - start
+    finally:
+        batches.put(None)
+        thread.join()
+    if timings is not None:
+        timings['wait'] += waiting
+    if failures:
+        raise failures[0]
+
+
+def write_shards(writer, results, filename, shard_by, shard_size=None, workers=SHARD_WORKERS,
+                 **options):
+    """Write an iterable of `CloseApproach` objects to a set of shards, and a manifest.
+
+    The results are split into consecutive shards, by the year of the close
+    approach (`results-2020.csv`, ...), by a number of close approaches or by
+    the approximate size in bytes of each file (`results-0001.csv`, ...). Each
+    shard is written by `writer` on one of a pool of `workers` threads, which
+    is handed the close approaches in batches, through a bounded queue, as
+    they're split off - so no shard is ever held in memory whole. At most
+    `workers` shards, counting the one being filled, are written at a time.
+
+    The manifest, `results-manifest.json`, lists the file name, number of close
+    approaches, time range and size of each shard.
+
+    :param writer: A function that writes results to a file, like `write_to_csv`.
+    :param results: An iterable of `CloseApproach` objects, in time order.
+    :param filename: A Path-like object from which to name the shards and the manifest.
+    :param shard_by: One of `SHARD_SIZES`: 'year', 'count' or 'size'.
+    :param shard_size: The number of close approaches (for 'count') or bytes
+    (for 'size') per shard, or `None` for the default in `SHARD_SIZES`.
+    :param workers: The number of shards written at the same time.
+    :param options: Options for the writer, such as the compression level.
+    :return: The manifest's list of shards, as dictionaries.
+    """
+    stem, extension = split_extension(filename)
+    shard_size = shard_size or SHARD_SIZES[shard_by]
+    results = iter(results)
+    if shard_by == 'size':
+        # estimate how many close approaches fit in a shard from a sample
+        sample = list(islice(results, SHARD_SAMPLE_SIZE))
+        shard_size = max(int(shard_size / _bytes_per_result(writer, sample, extension, options)), 1)
+        results = chain(sample, results)
+
+    shards = []
+    with ThreadPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for label, rows in _split_shards(results, shard_by, shard_size):
+            # the new shard must get a thread right away, or filling it would block
+            while pending and (len(pending) >= workers or pending[0].done()):
+                shards.append(pending.popleft().result())
+            path = stem.with_name(f'{stem.name}-{label}{extension}')
+            batches = queue.Queue(PIPELINE_DEPTH)
+            pending.append(executor.submit(_write_shard, writer, batches, path, options))
+            try:
+                while True:
+                    batch = list(islice(rows, PIPELINE_BATCH_SIZE))
+                    if not batch:
+                        break
+                    batches.put(batch)
+            finally:
+                batches.put(None)
+        shards.extend(future.result() for future in pending)
+
+    manifest = {'shard_by': shard_by, 'rows': sum(shard['rows'] for shard in shards),
+                'shards': shards}
+    with open(stem.with_name(f'{stem.name}-manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return shards
+
+
+def _split_shards(results, shard_by, shard_size):
+    """Split a stream of close approaches, in time order, into shards.
+
+    :param results: An iterator of `CloseApproach` objects.
+    :param shard_by: 'year', or 'count' or 'size' to split every `shard_size`.
+    :param shard_size: The number of close approaches per shard.
+    :return: A generator of (label, iterator of close approaches) tuples, each
+    non-empty; every iterator must be exhausted before the next tuple is taken.
+    """
+    if shard_by == 'year':
+        for year, rows in groupby(results, key=lambda approach: approach.time.year):
+            yield str(year), rows
+        return
+    for number in count(1):
+        first = next(results, None)
+        if first is None:
+            return
+        yield f'{number:04d}', chain((first,), islice(results, shard_size - 1))
+
+
+def _write_shard(writer, batches, path, options):
+    """Write one shard from a queue of batches, and describe it for the manifest.
+
+    :param batches: A `queue.Queue` of lists of close approaches, ending with `None`.
+    :return: A dictionary of the name, row count, time range and size of the shard.
+    """
+    shard = {'path': path.name, 'rows': 0}
+    finished = False
+
+    def drain():
+        nonlocal finished
+        while True:
+            batch = batches.get()
+            if batch is None:
+                finished = True
+                return
+            shard.setdefault('start', datetime_to_str(batch[0].time))
+            shard['end'] = datetime_to_str(batch[-1].time)
+            shard['rows'] += len(batch)
+            yield from batch
+
+    try:
+        writer(drain(), path, **options)
+    finally:
+        # keep accepting batches, so that splitting doesn't block
+        while not finished and batches.get() is not None:
+            pass
+    shard['bytes'] = os.path.getsize(path)
+    return shard
+
+
+def _bytes_per_result(writer, sample, extension, options):
+    """Measure the average size of a close approach in the output of a writer.
+
+    :return: The size in bytes, from writing the sample to a temporary file.
+    """
+    if not sample:
+        return 1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / f'sample{extension}'
+        writer(sample, path, **options)
+        return max(path.stat().st_size / len(sample), 1)
+
+
+def _column_batches(results, dictionaries):
+    """Convert a stream of close approaches into batches of columns.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param dictionaries: A dictionary mapping the names of the string columns
+    to encode to (initially empty) dictionaries, which are extended with the
+    index of each new string as it's seen.
+    :return: A generator of dictionaries mapping column names to lists of
+    values, with at most `BATCH_SIZE` close approaches per batch.
+    """
+    nan = float('nan')
+    designations, names = dictionaries['designation'], dictionaries['name']
+    results = iter(results)
+    while True:
+        batch = list(islice(results, BATCH_SIZE))
+        if not batch:
+            return
+        neos = [approach.neo for approach in batch]
+        yield {
+            'time': [approach.time_key for approach in batch],
+            'distance': [nan if approach.distance is None else approach.distance
+                         for approach in batch],
+            'velocity': [nan if approach.velocity is None else approach.velocity
+                         for approach in batch],
+            'diameter': [neo.diameter for neo in neos],
+            'hazardous': [neo.hazardous for neo in neos],
+            'designation': [designations.setdefault(neo.designation, len(designations))
+                            for neo in neos],
+            'name': [names.setdefault(neo.name or '', len(names)) for neo in neos],
+        }
+
+
+def serialize_for_json(result):
+    """Serialize a `CloseApproach` into a dictionary for JSON output.
+
+    :param result: A `CloseApproach`.
+    :return: A dictionary with a float `diameter_km` and a boolean
+    `potentially_hazardous` for the NEO.
+    """
+    row = result.serialize()
     # make diameter a float and potentially_hazardous a boolean
-    for row in data:
+    try:
+        diameter = float(row['neo']['diameter_km'])
+        row['neo']['diameter_km'] = diameter if not math.isnan(diameter) else float('nan')
+    except ValueError:
+        row['neo']['diameter_km'] = float('nan')
+    row['neo']['potentially_hazardous'] = (
+            row['neo']['potentially_hazardous'].strip().lower() == 'true'
+    )
+    return row
+
+
+def open_output(filename, mode='w', newline=None, level=None, threaded=False):
+    """Open an output file for writing, compressed according to its extension.
+
+    Uncompressed files are opened with a buffer of `BUFFER_SIZE` bytes. If the
+    extension of the file is one of `COMPRESSORS`, what's written is compressed
+    as it's written, in chunks of `BUFFER_SIZE` bytes - optionally, on a
+    separate thread, so that the writer doesn't wait for the compression.
+
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param mode: `'w'` to open the file in text mode, or `'wb'` in binary mode.
+    :param newline: How to translate newlines, in text mode (see `open`).
+    :param level: The compression level, or `None` for the compressor's default.
+    :param threaded: Whether to compress on a background thread.
+    :return: A file object.
+    """
+    compressor = None
+    if isinstance(filename, (str, os.PathLike)):
+        compressor = COMPRESSORS.get(pathlib.Path(filename).suffix)
+    if compressor is None:
+        if 'b' in mode:
+            return open(filename, mode, buffering=BUFFER_SIZE)
+        return open(filename, mode, buffering=BUFFER_SIZE, newline=newline)
+    file = compressor(filename, level)
+    if threaded:
+        file = _CompressionThread(file)
+    file = io.BufferedWriter(file, BUFFER_SIZE)
+    if 'b' in mode:
+        return file
+    return io.TextIOWrapper(file, newline=newline)
+
+
+def writer_for(filename):
+    """Find the writer for an output file, from its extension.
+
+    A compression extension (one of `COMPRESSORS`) is skipped, so that, for
+    example, a `.csv.gz` file is written by `write_to_csv`.
+
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :return: The writer from `WRITERS`, or `None` if the format is unsupported.
+    """
+    suffixes = pathlib.Path(filename).suffixes
+    if suffixes and suffixes[-1] in COMPRESSORS:
+        suffixes.pop()
+    return WRITERS.get(suffixes[-1]) if suffixes else None
+
+
+def split_extension(filename):
+    """Split an output file name into a stem and its (possibly compressed) extension.
+
+    :param filename: A Path-like object, such as `results.csv.gz`.
+    :return: A tuple of the path without the extension, such as `results`, and
+    the extension, such as `.csv.gz`.
+    """
+    path = pathlib.Path(filename)
+    extension = ''
+    if path.suffix in COMPRESSORS:
+        extension = path.suffix
+        path = path.with_suffix('')
+    return path.with_suffix(''), path.suffix + extension
+
+
+class _CompressionThread(io.RawIOBase):
+    """A binary file that hands the data written to it to a background thread,
+    which writes it to another (compressing) file.
+
+    The standard compressors release the GIL while they compress a chunk, so
+    the compression runs in parallel with whatever produces the data. At most
+    `PIPELINE_DEPTH` chunks wait for the thread at a time.
+    """
+
+    def __init__(self, file):
+        """Start a thread that writes to a file.
+
+        :param file: A binary file object, which is closed along with this one.
+        """
+        super().__init__()
+        self.file = file
+        self.chunks = queue.Queue(PIPELINE_DEPTH)
+        self.failures = []
+        self.thread = threading.Thread(target=self._run, name='compressor')
+        self.thread.start()
+
+    def writable(self):
+        """Return whether the file can be written to - it can."""
+        return True
+
+    def write(self, data):
+        """Hand a chunk of data to the thread.
+
+        :param data: A bytes-like object.
+        :return: The number of bytes written.
+        :raises: The first exception raised by the thread.
+        """
+        if self.failures:
+            raise self.failures[0]
+        chunk = bytes(data)
+        self.chunks.put(chunk)
+        return len(chunk)
+
+    def close(self):
+        """Wait for the thread to write everything, and close both files."""
+        if self.closed:
+            return
+        super().close()
+        self.chunks.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.failures:
+            raise self.failures[0]
+
+    def _run(self):
+        """Write each chunk to the file, until the `None` sentinel."""
         try:
-            diameter = float(row['neo']['diameter_km'])
-            row['neo']['diameter_km'] = diameter if not math.isnan(diameter) else float('nan')
-        except ValueError:
-            row['neo']['diameter_km'] = float('nan')
-        row['neo']['potentially_hazardous'] = (
-                row['neo']['potentially_hazardous'].strip().lower() == 'true'
-        )
-    with open(filename, 'w') as file:
-        json.dump(data, file)
+            for chunk in iter(self.chunks.get, None):
+                self.file.write(chunk)
+        except Exception as err:
+            self.failures.append(err)
+            # keep accepting chunks, so that writers don't block
+            while self.chunks.get() is not None:
+                pass
+
+
+# The compressed binary file for each supported compression extension, given
+# a path and a compression level.
+COMPRESSORS = {
+    '.gz': lambda filename, level: gzip.GzipFile(
+        filename, 'wb', compresslevel=9 if level is None else level),
+    '.xz': lambda filename, level: lzma.LZMAFile(filename, 'wb', preset=level),
+    '.bz2': lambda filename, level: bz2.BZ2File(
+        filename, 'wb', compresslevel=9 if level is None else level),
+}
+if zstandard is not None:
+    COMPRESSORS['.zst'] = lambda filename, level: zstandard.ZstdCompressor(
+        level=3 if level is None else level).stream_writer(open(filename, 'wb'), write_return_read=True)
+
+# The writer for each supported output file extension.
+WRITERS = {
+    '.csv': write_to_csv,
+    '.json': write_to_json,
+    '.jsonl': write_to_ndjson,
+    '.ndjson': write_to_ndjson,
+}
+if np is not None:
+    WRITERS['.npz'] = write_to_npz
+if pa is not None:
+    WRITERS['.arrow'] = write_to_arrow